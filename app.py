@@ -3,10 +3,15 @@ from __future__ import annotations
 
 import os
 import re
+import hashlib
+import importlib
+import json
+import threading
+import uuid
 from io import BytesIO
 from datetime import datetime
+from typing import TYPE_CHECKING, NamedTuple
 
-import pandas as pd
 from flask import (
     Flask,
     render_template,
@@ -16,12 +21,55 @@ from flask import (
     flash,
     send_file,
     jsonify,
+    g,
+    Response,
 )
 
 from dotenv import load_dotenv
-from supabase import create_client, Client
 
-from comissoes_backend import calcular_comissoes
+from regras_assessores import carregar_regras
+from cache_dfs import CacheDataFrames
+from indice_versoes import IndiceIndisponivel, IndiceVersoes, chave_ordem_versao, indice_vazio
+from armazenamento import TransferenciasStorage, ResultadoTransferencia
+import pacote_zip
+import perfil
+from tarefas import CONCLUIDA, ERRO, FilaTarefas
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+class ModuloTardio:
+    """
+    Importa o módulo `nome` no primeiro acesso a um atributo. pandas, o motor e a
+    leitura das planilhas (mais o pacote do Supabase, ver _SupabaseTardio) levam perto
+    de 1s para importar: numa instância nova da Vercel, / e /api/arquivos respondem
+    sem carregar nada disso. `python benchmarks/bench_partida.py` mede.
+    """
+
+    def __init__(self, nome: str):
+        self._nome = nome
+        self._modulo = None
+
+    def __getattr__(self, atributo):
+        modulo = self._modulo
+        if modulo is None:
+            # import_module segura o lock do import: duas threads não carregam duas vezes
+            modulo = self._modulo = importlib.import_module(self._nome)
+        return getattr(modulo, atributo)
+
+    def __repr__(self) -> str:
+        return f"<ModuloTardio {self._nome} {'carregado' if self._modulo is not None else 'pendente'}>"
+
+
+pd = ModuloTardio("pandas")
+backend = ModuloTardio("comissoes_backend")
+consultas_juntar = ModuloTardio("consultas_juntar")
+formatacao = ModuloTardio("formatacao")
+ingestao = ModuloTardio("ingestao")
+memo_resultados = ModuloTardio("memo_resultados")
+planilhas = ModuloTardio("planilhas")
+ramos_salvos = ModuloTardio("ramos_salvos")
 
 # =====================================================================
 # 0) MAPA: UNIQUE ID (URL) -> CÓDIGO A (ASSSESSOR)
@@ -197,6 +245,9 @@ app.secret_key = "segredo-muito-simples-so-pra-flash"
 
 load_dotenv()
 
+# fila do /processar (tarefas.py): TAREFAS_WORKERS threads; 0 roda dentro da requisição
+TAREFAS = FilaTarefas()
+
 # =====================================================================
 # 2) CONFIGURAÇÃO DO SUPABASE
 # =====================================================================
@@ -205,13 +256,38 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "comissoes")
 
-supabase: Client | None = None
+
+class _SupabaseTardio:
+    """
+    O client do Supabase, criado (e o pacote importado) no primeiro uso. Erro ao criar
+    sobe nesse uso, como um erro de rede: as rotas já tratam falhas do storage.
+    """
+
+    def __init__(self, url: str, key: str):
+        self._url = url
+        self._key = key
+        self._cliente: Client | None = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, atributo):
+        cliente = self._cliente
+        if cliente is None:
+            with self._lock:
+                if self._cliente is None:
+                    from supabase import create_client
+
+                    try:
+                        self._cliente = create_client(self._url, self._key)
+                    except Exception as e:
+                        print("Erro ao criar client do Supabase:", e)
+                        raise
+                cliente = self._cliente
+        return getattr(cliente, atributo)
+
+
+supabase: Client | _SupabaseTardio | None = None
 if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    except Exception as e:
-        print("Erro ao criar client do Supabase:", e)
-        supabase = None
+    supabase = _SupabaseTardio(SUPABASE_URL, SUPABASE_KEY)
 else:
     print("⚠️ SUPABASE_URL ou SUPABASE_KEY não configurados. Upload ficará desativado.")
 
@@ -324,56 +400,31 @@ def classificar_arquivos(uploaded_files):
     return slots, faltando
 
 
-def brl(valor: float) -> str:
-    if pd.isna(valor):
-        valor = 0.0
-    return f"R$ {valor:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
-
-
-def _supabase_list(path: str):
+def listar_competencias() -> list[str]:
     if supabase is None:
         return []
     try:
-        return supabase.storage.from_(SUPABASE_BUCKET).list(path=path)
-    except Exception as e:
-        print("Erro listando no Supabase:", e)
+        return indice().competencias()
+    except IndiceIndisponivel as e:
+        print("Erro lendo o índice de versões:", e)
         return []
 
 
-def listar_competencias() -> list[str]:
-    itens = _supabase_list("")
-    comps = []
-    for it in itens:
-        nome = it.get("name", "")
-        if re.match(r"^\d{4}-\d{2}$", nome):
-            comps.append(nome)
-    return sorted(comps, reverse=True)
-
-
 _RE_DF_FINAL_TS = re.compile(r"^df_final_(\d{8}_\d{6})\.xlsx$")
 _RE_DF_FINAL_V = re.compile(r"^df_final_v(\d+)\.xlsx$")
 
 
 def listar_df_final_por_competencia(competencia: str) -> list[str]:
-    itens = _supabase_list(competencia)
-    arquivos = []
-    for it in itens:
-        nome = it.get("name", "")
-        if _RE_DF_FINAL_TS.match(nome) or _RE_DF_FINAL_V.match(nome):
-            arquivos.append(f"{competencia}/{nome}")
-
-    def sort_key(path: str):
-        base = path.split("/")[-1]
-        mv = _RE_DF_FINAL_V.match(base)
-        if mv:
-            return (2, int(mv.group(1)))
-        mt = _RE_DF_FINAL_TS.match(base)
-        if mt:
-            return (1, mt.group(1))
-        return (0, base)
-
-    arquivos.sort(key=sort_key, reverse=True)
-    return arquivos
+    """df_final das versões da competência, da mais recente para a mais antiga (do índice)."""
+    if supabase is None:
+        return []
+    idx = indice()
+    try:
+        entradas = [idx.versao(competencia, v) for v in idx.versoes(competencia)]
+    except IndiceIndisponivel as e:
+        print("Erro lendo o índice de versões:", e)
+        return []
+    return [e["df_final"]["path"] for e in entradas if e.get("df_final")]
 
 
 def escolher_mais_recente_df_final(competencia: str) -> str | None:
@@ -396,29 +447,686 @@ def supabase_download_bytes(path: str) -> bytes | None:
         return None
 
 
+CONTENT_TYPE_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CONTENT_TYPE_PARQUET = "application/vnd.apache.parquet"
+
+
+def caminho_parquet(path: str) -> str:
+    """Caminho do "gêmeo" Parquet que fica ao lado de cada .xlsx no bucket."""
+    return re.sub(r"\.xlsx$", "", path) + ".parquet"
+
+
+def df_para_parquet_bytes(df: pd.DataFrame) -> bytes | None:
+    # colunas com tipos misturados (ex.: int e texto) não viram Parquet -> fica só o .xlsx
+    try:
+        buf = BytesIO()
+        df.to_parquet(buf, index=False, compression="zstd")
+        return buf.getvalue()
+    except Exception as e:
+        print("Não consegui gerar Parquet, mantendo só o Excel:", e)
+        return None
+
+
+# cache dos DataFrames lidos do Supabase (chave: caminho + ETag/updated_at)
+CACHE_DFS = CacheDataFrames(limite_bytes=int(os.getenv("CACHE_DFS_MB", "256")) * 1024 * 1024)
+
+_transferencias: TransferenciasStorage | None = None
+
+
+def transferencias() -> TransferenciasStorage | None:
+    """Camada de transferências em lote; reaproveita o mesmo bucket/sessão HTTP."""
+    global _transferencias
+    if supabase is None:
+        return None
+    if _transferencias is None:
+        _transferencias = TransferenciasStorage(
+            supabase.storage.from_(SUPABASE_BUCKET),
+            max_paralelo=int(os.getenv("SUPABASE_PARALELO", "6")),
+        )
+    return _transferencias
+
+
+def _itens_da_pasta(pasta: str, busca: str = "") -> list[dict] | None:
+    """Itens (com metadados) de uma pasta do bucket, list paginado. None se não der pra consultar."""
+    if supabase is None:
+        return None
+    todos = []
+    offset = 0
+    try:
+        while True:
+            itens = supabase.storage.from_(SUPABASE_BUCKET).list(
+                path=pasta,
+                options={"search": busca, "limit": 1000, "offset": offset},
+            ) or []
+            todos.extend(itens)
+            if len(itens) < 1000:
+                return todos
+            offset += 1000
+    except Exception as e:
+        print("Erro lendo metadados no Supabase:", e)
+        return None
+
+
+def _versoes_da_pasta(pasta: str, busca: str = "") -> dict[str, object] | None:
+    """
+    nome do arquivo -> versão (ETag ou updated_at), só com metadados (list paginado).
+    None se não der pra consultar.
+    """
+    itens = _itens_da_pasta(pasta, busca)
+    if itens is None:
+        return None
+    return {
+        it.get("name", ""): (it.get("metadata") or {}).get("eTag") or it.get("updated_at")
+        for it in itens
+    }
+
+
+def _separa_pasta(path: str) -> tuple[str, str]:
+    if "/" not in path:
+        return "", path
+    pasta, nome = path.rsplit("/", 1)
+    return pasta, nome
+
+
+def carregar_varios_do_supabase(
+    caminhos: dict[str, str],
+    versoes_conhecidas: dict[str, object] | None = None,
+) -> dict[str, pd.DataFrame | None]:
+    """
+    chave -> caminho .xlsx no bucket; devolve chave -> DataFrame (None se não achou).
+
+    1) uma listagem de metadados por pasta (versão de cada objeto); caminhos com a
+       versão em `versoes_conhecidas` (caminho -> versão, do índice) não são listados
+    2) o que estiver no CACHE_DFS com a mesma versão não é baixado
+    3) o resto é baixado em paralelo, preferindo o gêmeo .parquet
+    """
+    resultado: dict[str, pd.DataFrame | None] = {chave: None for chave in caminhos}
+    if supabase is None or not caminhos:
+        return resultado
+    versoes_conhecidas = versoes_conhecidas or {}
+
+    por_pasta: dict[str, list[str]] = {}
+    for path in caminhos.values():
+        if path in versoes_conhecidas:
+            continue
+        pasta, nome = _separa_pasta(path)
+        por_pasta.setdefault(pasta, []).append(re.sub(r"\.xlsx$", "", nome) + ".")
+
+    versoes_pasta = {
+        pasta: _versoes_da_pasta(pasta, busca=os.path.commonprefix(bases))
+        for pasta, bases in por_pasta.items()
+    }
+
+    versoes = {}
+    pendentes = {}
+    for chave, path in caminhos.items():
+        pasta, nome = _separa_pasta(path)
+        if path in versoes_conhecidas:
+            listagem = None
+            versao = versoes_conhecidas[path]
+        else:
+            listagem = versoes_pasta.get(pasta)
+            if listagem is not None and nome not in listagem:
+                continue  # não existe no bucket
+
+            versao = None
+            if listagem is not None and listagem[nome] is not None:
+                versao = (listagem[nome], listagem.get(caminho_parquet(nome)))
+        versoes[chave] = versao
+
+        df = CACHE_DFS.obter(path, versao)
+        if df is not None:
+            resultado[chave] = df
+            continue
+
+        # sem listagem não sabemos se há Parquet: tenta ele primeiro
+        tem_parquet = listagem is None or caminho_parquet(nome) in listagem
+        pendentes[chave] = caminho_parquet(path) if tem_parquet else path
+
+    baixados = transferencias().baixar_varios(list(pendentes.values()))
+
+    # Parquet que falhou -> segunda rodada com o .xlsx
+    refazer = {
+        chave: caminhos[chave]
+        for chave, alvo in pendentes.items()
+        if alvo != caminhos[chave] and not baixados[alvo].ok
+    }
+    baixados.update(transferencias().baixar_varios(list(refazer.values())))
+    pendentes.update(refazer)
+
+    for chave, alvo in pendentes.items():
+        r = baixados[alvo]
+        if not r.ok or not r.dados:
+            print(f"Erro no download do Supabase ({alvo}):", r.erro)
+            continue
+        try:
+            if alvo.endswith(".parquet"):
+                df = pd.read_parquet(BytesIO(r.dados))
+            else:
+                df = planilhas.ler_xlsx(r.dados)
+        except Exception as e:
+            print(f"Não consegui ler {alvo}:", e)
+            continue
+        CACHE_DFS.guardar(caminhos[chave], versoes.get(chave), df)
+        resultado[chave] = df
+
+    return resultado
+
+
 def carregar_excel_do_supabase(path: str) -> pd.DataFrame | None:
+    return carregar_varios_do_supabase({path: path})[path]
+
+
+class FonteEnviada(NamedTuple):
+    """
+    .xlsx já pronto (o arquivo como veio do upload, ou um df já escrito com o planilhas)
+    que sobe byte a byte, e o df dele (vira o gêmeo Parquet).
+    """
+    conteudo: bytes
+    df: pd.DataFrame | None
+
+
+def supabase_upload_varios(dfs: dict[str, pd.DataFrame | ingestao.FonteEmBlocos | FonteEnviada]) -> dict[str, ResultadoTransferencia]:
+    """
+    caminho .xlsx -> DataFrame. Envia o Excel e o gêmeo Parquet de cada um em paralelo.
+    Fonte em blocos vai como o .xlsx enviado, sem Parquet (não é montada inteira na memória);
+    FonteEnviada vai com os bytes que já tem e o Parquet do df. Os demais dfs viram
+    .xlsx juntos (planilhas.xlsx_varios).
+    Devolve o resultado por caminho .xlsx (falhas não interrompem os demais envios).
+    """
+    if supabase is None:
+        raise RuntimeError("Supabase não configurado")
+
+    xlsx = planilhas.xlsx_varios({
+        path: df for path, df in dfs.items() if not isinstance(df, (ingestao.FonteEmBlocos, FonteEnviada))
+    })
+    itens = []
+    sem_parquet = []
+    for path, df in dfs.items():
+        CACHE_DFS.invalidar(path)
+
+        if isinstance(df, ingestao.FonteEmBlocos):
+            itens.append((path, df.conteudo, CONTENT_TYPE_XLSX))
+            sem_parquet.append(caminho_parquet(path))
+            continue
+
+        if isinstance(df, FonteEnviada):
+            itens.append((path, df.conteudo, CONTENT_TYPE_XLSX))
+            df = df.df
+            if df is None:
+                sem_parquet.append(caminho_parquet(path))
+                continue
+        else:
+            itens.append((path, xlsx[path], CONTENT_TYPE_XLSX))
+
+        parquet = df_para_parquet_bytes(df)
+        if parquet is not None:
+            itens.append((caminho_parquet(path), parquet, CONTENT_TYPE_PARQUET))
+        else:
+            sem_parquet.append(caminho_parquet(path))
+
+    resultados = transferencias().enviar_varios(itens)
+
+    # não deixa um Parquet antigo "ganhar" do Excel que acabou de ser atualizado
+    sem_parquet += [
+        caminho_parquet(path) for path in dfs
+        if caminho_parquet(path) in resultados and not resultados[caminho_parquet(path)].ok
+    ]
+    if sem_parquet:
+        try:
+            supabase.storage.from_(SUPABASE_BUCKET).remove(sem_parquet)
+        except Exception as e:
+            print("Erro removendo Parquet desatualizado:", e)
+
+    return {path: resultados[path] for path in dfs}
+
+
+def supabase_upload_df_upsert(df: pd.DataFrame, path: str):
+    r = supabase_upload_varios({path: df})[path]
+    if not r.ok:
+        raise RuntimeError(f"Falha ao enviar {path}: {r.erro}")
+
+
+def caminhos_da_versao(comp: str, version_id: str) -> dict[str, str]:
+    """df_final, df_juntar e as dez fontes de uma versão (caminhos .xlsx no bucket)."""
+    caminhos = {
+        "df_final": f"{comp}/df_final_{version_id}.xlsx",
+        "df_juntar": f"{comp}/df_juntar_{version_id}.xlsx",
+    }
+    for chave, prefixo in FONTE_ARQUIVOS_PREFIXO.items():
+        caminhos[chave] = f"{comp}/{prefixo}_{version_id}.xlsx"
+    return caminhos
+
+
+def caminho_ramos(comp: str, version_id: str) -> str:
+    """Resultados por fonte (ramos do cálculo) de uma versão, pra recálculo incremental."""
+    return f"{comp}/ramos_{version_id}.zip"
+
+
+def salvar_ramos(path: str, ramos: dict[str, dict]):
+    cabecalho = {"versao": backend.VERSAO_RAMOS, "regras": carregar_regras().assinatura}
+    try:
+        conteudo = ramos_salvos.ramos_para_bytes(ramos, cabecalho)
+    except Exception as e:
+        # ex.: coluna com tipos misturados que não vira Parquet; o próximo recálculo é completo
+        print("Não consegui gerar os ramos, recálculos desta versão serão completos:", e)
+        descartar_ramos(path)
+        return
+    r = transferencias().enviar_varios([(path, conteudo, "application/zip")])[path]
+    if not r.ok:
+        print("Erro ao salvar ramos no Supabase:", r.erro)
+        descartar_ramos(path)
+
+
+def descartar_ramos(path: str):
+    # ramos desatualizados dariam recálculo errado: melhor não ter nenhum (próximo recálculo é completo)
+    try:
+        supabase.storage.from_(SUPABASE_BUCKET).remove([path])
+    except Exception as e:
+        print("Erro removendo ramos desatualizados:", e)
+
+
+def carregar_ramos(path: str) -> dict[str, dict] | None:
     b = supabase_download_bytes(path)
     if not b:
         return None
-    return pd.read_excel(BytesIO(b))
+    try:
+        cabecalho, ramos = ramos_salvos.ramos_de_bytes(b)
+    except Exception as e:
+        print("Ramos ilegíveis, recalculando tudo:", e)
+        return None
+    if cabecalho.get("versao") != backend.VERSAO_RAMOS:
+        return None
+    # ramos calculados com outras regras de assessores (mesas, líder...) não servem
+    if cabecalho.get("regras") != carregar_regras().assinatura:
+        return None
+    return ramos
 
 
-def supabase_upload_df_upsert(df: pd.DataFrame, path: str):
+# ---------------------------------------------------------------------
+# Fontes guardadas pelo conteúdo: cada arquivo enviado fica uma vez só no bucket, em
+# fontes/<chave>/<sha256>.xlsx (os bytes do upload + o gêmeo .parquet com o df lido),
+# e cada versão tem um manifesto {chave: sha256}. Versões sem manifesto (antigas)
+# continuam com as fontes em <comp>/<prefixo>_<versão>.xlsx.
+# ---------------------------------------------------------------------
+
+PASTA_FONTES = "fontes"
+VERSAO_MANIFESTO = 1
+
+
+def hash_conteudo(conteudo: bytes) -> str:
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def caminho_blob(fonte_key: str, sha: str) -> str:
+    return f"{PASTA_FONTES}/{fonte_key}/{sha}.xlsx"
+
+
+def caminho_manifesto(comp: str, version_id: str) -> str:
+    return f"{comp}/manifesto_{version_id}.json"
+
+
+class ManifestoIndisponivel(RuntimeError):
+    """O manifesto existe, mas não deu pra baixar ou ler (não é o mesmo que não ter manifesto)."""
+
+
+def carregar_manifesto(comp: str, version_id: str) -> dict[str, str] | None:
+    """
+    chave -> sha256 das fontes da versão; None só se a versão não tem manifesto (404).
+    ManifestoIndisponivel se o download falhar ou o conteúdo não servir.
+    """
     if supabase is None:
-        raise RuntimeError("Supabase não configurado")
+        return None
+    path = caminho_manifesto(comp, version_id)
+    r = transferencias().baixar_varios([path])[path]
+    if not r.ok and r.status == 404:
+        return None
+    if not r.ok:
+        raise ManifestoIndisponivel(f"{path}: {r.erro}")
+    try:
+        salvo = json.loads(r.dados)
+    except ValueError as e:
+        raise ManifestoIndisponivel(f"{path} ilegível: {e}") from e
+    if not isinstance(salvo, dict) or salvo.get("versao") != VERSAO_MANIFESTO:
+        raise ManifestoIndisponivel(f"{path}: formato desconhecido")
+    return {k: v for k, v in salvo.get("fontes", {}).items() if k in FONTE_KEYS}
+
+
+def salvar_manifesto(comp: str, version_id: str, fontes: dict[str, str]) -> bool:
+    path = caminho_manifesto(comp, version_id)
+    conteudo = json.dumps({"versao": VERSAO_MANIFESTO, "fontes": fontes}, indent=1).encode("utf-8")
+    r = transferencias().enviar_varios([(path, conteudo, "application/json")])[path]
+    if not r.ok:
+        print("Erro ao salvar o manifesto no Supabase:", r.erro)
+    return r.ok
+
+
+def reservar_manifesto(comp: str, version_id: str) -> bool:
+    """
+    Cria o manifesto (ainda sem fontes) da versão sem sobrescrever: False se ele já
+    existe, i.e. outra instância já usou esse número. O manifesto de verdade é gravado
+    por cima quando a versão termina.
+    """
+    path = caminho_manifesto(comp, version_id)
+    conteudo = json.dumps({"versao": VERSAO_MANIFESTO, "fontes": {}}, indent=1).encode("utf-8")
+    r = transferencias().enviar_varios([(path, conteudo, "application/json")], upsert=False)[path]
+    if r.ok:
+        return True
+    if r.status == 409:
+        return False
+    raise RuntimeError(f"não consegui reservar {path}: {r.erro}")
+
+
+def caminhos_com_fontes(comp: str, version_id: str) -> dict[str, str]:
+    """
+    caminhos_da_versao com as fontes apontando para os blobs da versão: pelo índice
+    (sem ir ao bucket) ou, se a versão não estiver nele, pelo manifesto.
+    """
+    caminhos = caminhos_da_versao(comp, version_id)
+    entrada = indice().versao(comp, version_id) if supabase is not None else None
+    if entrada and entrada.get("fontes"):
+        for chave, fonte in entrada["fontes"].items():
+            caminhos[chave] = fonte["path"]
+        return caminhos
+    try:
+        manifesto = carregar_manifesto(comp, version_id) or {}
+    except ManifestoIndisponivel as e:
+        print("Erro lendo o manifesto, usando os caminhos da versão:", e)
+        manifesto = {}
+    for chave, sha in manifesto.items():
+        caminhos[chave] = caminho_blob(chave, sha)
+    return caminhos
+
+
+def blobs_existentes(hashes: dict[str, str]) -> dict[str, bool]:
+    """Das fontes com esses sha256, as que já estão no bucket -> se têm o gêmeo Parquet."""
+    existentes = {}
+    for chave, sha in hashes.items():
+        listagem = _versoes_da_pasta(f"{PASTA_FONTES}/{chave}", busca=sha) or {}
+        if f"{sha}.xlsx" in listagem:
+            existentes[chave] = f"{sha}.parquet" in listagem
+    return existentes
+
+
+def _chave_lida(fonte_key: str, sha: str) -> str:
+    # df lido de um blob no CACHE_DFS: o conteúdo não muda (o caminho é o hash), versão fixa
+    return caminho_parquet(caminho_blob(fonte_key, sha))
+
+
+def ler_blobs_parquet(hashes: dict[str, str]) -> dict[str, pd.DataFrame]:
+    """
+    chave -> sha256 de fontes já no bucket; lê o df de cada uma pelo gêmeo Parquet
+    (sem abrir o .xlsx de novo). O que não der pra baixar/ler fica de fora.
+    """
+    paths = {chave: _chave_lida(chave, sha) for chave, sha in hashes.items()}
+    baixados = transferencias().baixar_varios(list(paths.values())) if paths else {}
+    dfs = {}
+    for chave, path in paths.items():
+        r = baixados[path]
+        if not r.ok or not r.dados:
+            print(f"Erro no download do Supabase ({path}):", r.erro)
+            continue
+        try:
+            dfs[chave] = pd.read_parquet(BytesIO(r.dados))
+        except Exception as e:
+            print(f"Não consegui ler {path}:", e)
+    return dfs
 
-    buf = BytesIO()
-    df.to_excel(buf, index=False)
-    buf.seek(0)
-
-    supabase.storage.from_(SUPABASE_BUCKET).upload(
-        path=path,
-        file=buf.getvalue(),
-        file_options={
-            "content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            "upsert": "true",
-        },
-    )
+
+def ramos_reaproveitaveis(comp: str, anterior: str, hashes: dict[str, str]) -> dict[str, dict]:
+    """
+    Ramos da versão `anterior` cujas fontes têm o mesmo conteúdo das novas. Só valem
+    com o mesmo tim_rep (os ramos dependem dos repasses); carregar_ramos já descarta
+    ramos de outras regras ou de outro formato.
+    """
+    try:
+        manifesto = carregar_manifesto(comp, anterior)
+    except ManifestoIndisponivel as e:
+        print("Erro lendo o manifesto, recalculando todos os ramos:", e)
+        return {}
+    if not manifesto or manifesto.get("tim_rep") != hashes.get("tim_rep"):
+        return {}
+    iguais = [f for f in backend.FONTES_RAMOS if manifesto.get(f) == hashes.get(f)]
+    if not iguais:
+        return {}
+    ramos = carregar_ramos(caminho_ramos(comp, anterior))
+    if ramos is None:
+        return {}
+    return {f: ramos[f] for f in iguais}
+
+
+def enviar_fonte_versao(comp: str, version_id: str, fonte_key: str, conteudo: bytes, df) -> dict:
+    """
+    Sobe a fonte nova de uma versão já existente (substituir/deletar) e aponta o manifesto
+    pra ela. Devolve a entrada da fonte pro índice (path, sha, bytes, linhas);
+    RuntimeError se o envio falhar ou o manifesto atual não puder ser lido (gravar só
+    a fonte nova apagaria as outras do manifesto).
+    """
+    manifesto = carregar_manifesto(comp, version_id) or {}
+    sha = hash_conteudo(conteudo)
+    path = caminho_blob(fonte_key, sha)
+    if fonte_key not in blobs_existentes({fonte_key: sha}):
+        r = supabase_upload_varios({path: df if isinstance(df, ingestao.FonteEmBlocos) else FonteEnviada(conteudo, df)})[path]
+        if not r.ok:
+            raise RuntimeError(f"Falha ao enviar {path}: {r.erro}")
+    manifesto[fonte_key] = sha
+    if not salvar_manifesto(comp, version_id, manifesto):
+        raise RuntimeError(f"Falha ao salvar {caminho_manifesto(comp, version_id)}")
+    return entrada_fonte(fonte_key, sha, len(conteudo), df)
+
+
+# ---------------------------------------------------------------------
+# Índice das versões (indice_versoes.py): as listagens e os caminhos/versões das
+# páginas vêm dele, sem listar o bucket; toda gravação de versão atualiza o índice.
+# ---------------------------------------------------------------------
+
+_indice: IndiceVersoes | None = None
+
+
+def indice() -> IndiceVersoes | None:
+    global _indice
+    if supabase is None:
+        return None
+    if _indice is None:
+        _indice = IndiceVersoes(transferencias(), reconstruir_indice)
+    return _indice
+
+
+def entrada_fonte(fonte_key: str, sha: str, tamanho: int, df) -> dict:
+    return {
+        "path": caminho_blob(fonte_key, sha),
+        "sha": sha,
+        "bytes": tamanho,
+        "linhas": len(df) if isinstance(df, pd.DataFrame) else None,
+    }
+
+
+def registrar_no_indice(
+    comp: str,
+    version_id: str,
+    df_final=None,
+    df_juntar=None,
+    fontes: dict | None = None,
+    resultados: dict[str, ResultadoTransferencia] | None = None,
+):
+    """
+    Grava no índice o que mudou na versão (df_final/df_juntar recalculados, fontes novas).
+    `resultados` (os do upload) dão o tamanho em bytes de df_final/df_juntar.
+    """
+    caminhos = caminhos_da_versao(comp, version_id)
+    resultados = resultados or {}
+
+    def tamanho(chave: str) -> int | None:
+        r = resultados.get(caminhos[chave])
+        return r.tamanho if r is not None else None
+
+    entrada = {}
+    if df_final is not None:
+        total = df_final["Valor Total Assessor"].sum() if "Valor Total Assessor" in df_final.columns else None
+        entrada["df_final"] = {
+            "path": caminhos["df_final"],
+            "bytes": tamanho("df_final"),
+            "linhas": len(df_final),
+            "total": None if total is None else round(float(total), 2),
+        }
+    if df_juntar is not None:
+        entrada["df_juntar"] = {"path": caminhos["df_juntar"], "bytes": tamanho("df_juntar"), "linhas": len(df_juntar)}
+    if fontes:
+        entrada["fontes"] = fontes
+    if not indice().gravar_versao(comp, version_id, entrada):
+        print(f"Erro ao atualizar o índice com {comp}/{version_id}")
+
+
+def versoes_do_indice(comp: str, version_id: str) -> dict[str, object]:
+    """caminho -> versão pro CACHE_DFS, tiradas do índice (dispensa listar o bucket)."""
+    entrada = indice().versao(comp, version_id) if supabase is not None else None
+    if not entrada:
+        return {}
+    # cada gravação da versão muda a revisão (e a data) da entrada
+    revisao = (entrada.get("revisao"), entrada.get("atualizado_em"))
+    versoes = {}
+    for chave in ("df_final", "df_juntar"):
+        if chave in entrada:
+            versoes[entrada[chave]["path"]] = revisao
+    for fonte in entrada.get("fontes", {}).values():
+        # blob: o caminho já é o conteúdo
+        versoes[fonte["path"]] = fonte.get("sha") or revisao
+    return versoes
+
+
+def carregar_da_versao(comp: str, version_id: str, chaves: list[str]) -> dict[str, pd.DataFrame | None]:
+    """df_final/df_juntar/fontes de uma versão, com caminhos e versões do índice."""
+    caminhos = caminhos_com_fontes(comp, version_id)
+    return carregar_varios_do_supabase({k: caminhos[k] for k in chaves}, versoes_do_indice(comp, version_id))
+
+
+def reconstruir_indice() -> dict:
+    """
+    Índice montado pelas listagens do bucket (primeiro uso, ou se o objeto sumiu):
+    caminhos, tamanhos e datas de cada versão; linhas e totais ficam em branco.
+    Listagem ou manifesto que falha levanta IndiceIndisponivel: índice parcial repetiria
+    números de versão.
+    """
+    def tamanho_item(item: dict | None) -> int | None:
+        return ((item or {}).get("metadata") or {}).get("size")
+
+    def itens_da_pasta(pasta: str) -> list[dict]:
+        itens = _itens_da_pasta(pasta)
+        if itens is None:
+            raise IndiceIndisponivel(f"não consegui listar a pasta {pasta or '/'} do bucket")
+        return itens
+
+    novo = indice_vazio()
+    for it in itens_da_pasta(""):
+        comp = it.get("name", "")
+        if not re.match(r"^\d{4}-\d{2}$", comp):
+            continue
+        itens = {i.get("name", ""): i for i in itens_da_pasta(comp)}
+        versoes = {}
+        for nome, item in itens.items():
+            _, version_id = parse_comp_versionid_from_df_final_path(f"{comp}/{nome}")
+            if not version_id:
+                continue
+            caminhos = caminhos_da_versao(comp, version_id)
+            df_juntar = itens.get(_separa_pasta(caminhos["df_juntar"])[1])
+            try:
+                manifesto = carregar_manifesto(comp, version_id) or {}
+            except ManifestoIndisponivel as e:
+                raise IndiceIndisponivel(str(e)) from e
+            fontes = {}
+            for chave in FONTE_KEYS:
+                if chave in manifesto:
+                    fontes[chave] = {"path": caminho_blob(chave, manifesto[chave]), "sha": manifesto[chave], "bytes": None, "linhas": None}
+                else:
+                    legado = itens.get(_separa_pasta(caminhos[chave])[1])
+                    fontes[chave] = {"path": caminhos[chave], "sha": None, "bytes": tamanho_item(legado), "linhas": None}
+            versoes[version_id] = {
+                "criado_em": item.get("created_at") or item.get("updated_at"),
+                "atualizado_em": item.get("updated_at"),
+                "df_final": {"path": caminhos["df_final"], "bytes": tamanho_item(item), "linhas": None, "total": None},
+                "df_juntar": {"path": caminhos["df_juntar"], "bytes": tamanho_item(df_juntar), "linhas": None},
+                "fontes": fontes,
+            }
+        if versoes:
+            novo["competencias"][comp] = dict(sorted(versoes.items(), key=lambda kv: chave_ordem_versao(kv[0])))
+    return novo
+
+
+class FonteAusente(Exception):
+    def __init__(self, chave: str, path: str):
+        super().__init__(f"Não encontrei no Supabase a fonte '{chave}' desta versão ({path}).")
+        self.chave = chave
+        self.path = path
+
+
+def chave_memo(shas: dict[str, str | None], regras) -> str | None:
+    """
+    Chave do MEMO pelos sha256 dos dez arquivos de entrada (a leitura de um arquivo
+    sempre dá o mesmo df). None se faltar o hash de alguma fonte (versões antigas).
+    """
+    if not backend.MEMO.ativo or any(not shas.get(k) for k in FONTE_KEYS):
+        return None
+    return memo_resultados.chave_resultado({k: f"arquivo:{shas[k]}" for k in FONTE_KEYS}, backend.VERSAO_MOTOR, regras.assinatura)
+
+
+def recalcular_versao(
+    comp: str,
+    version_id: str,
+    fonte_key: str,
+    df_fonte: pd.DataFrame,
+    faltando_vazio: bool = False,
+    sha_fonte: str | None = None,
+):
+    """
+    Recalcula uma versão trocando só a fonte `fonte_key` por `df_fonte`.
+
+    Com os ramos salvos da versão, só o ramo dessa fonte é recalculado (mais a
+    consolidação final); sem eles (versões antigas) ou trocando tim_rep, recalcula tudo.
+    Com `sha_fonte` (hash do arquivo novo), entradas já calculadas antes vêm do backend.MEMO.
+    Retorna (df_final, df_juntar, ramos).
+    """
+    caminhos = caminhos_com_fontes(comp, version_id)
+    regras = carregar_regras()
+
+    entrada = indice().versao(comp, version_id) or {}
+    shas = {k: f.get("sha") for k, f in entrada.get("fontes", {}).items()}
+    chave = chave_memo({**shas, fonte_key: sha_fonte}, regras)
+    if chave is not None:
+        memo = backend.MEMO.obter(chave)
+        if memo is not None:
+            return memo
+
+    faltou = False
+    ramos = None
+    if fonte_key != "tim_rep":
+        ramos = carregar_ramos(caminho_ramos(comp, version_id))
+
+    versoes = versoes_do_indice(comp, version_id)
+    if ramos is not None:
+        tim_rep = carregar_varios_do_supabase({"tim_rep": caminhos["tim_rep"]}, versoes)["tim_rep"]
+        if tim_rep is None:
+            if not faltando_vazio:
+                raise FonteAusente("tim_rep", caminhos["tim_rep"])
+            tim_rep, faltou = pd.DataFrame(), True
+        tim_rep = ingestao.para_calculo("tim_rep", tim_rep)
+        ramos = backend.recalcular_ramos(ramos, fonte_key, ingestao.para_calculo(fonte_key, df_fonte), tim_rep, regras)
+    else:
+        dfs = carregar_varios_do_supabase({k: caminhos[k] for k in FONTE_KEYS if k != fonte_key}, versoes)
+        for k, df in dfs.items():
+            if df is None:
+                if not faltando_vazio:
+                    raise FonteAusente(k, caminhos[k])
+                dfs[k], faltou = pd.DataFrame(), True
+        dfs[fonte_key] = df_fonte
+        dfs = {k: ingestao.para_calculo(k, df) for k, df in dfs.items()}
+        tim_rep = dfs["tim_rep"]
+        ramos = backend.calcular_ramos(**dfs, regras=regras)
+
+    df_final, df_juntar = backend.consolidar_ramos(ramos, tim_rep, regras)
+    # fonte que faltou no bucket entrou vazia: o resultado não é o dos hashes
+    if chave is not None and not faltou:
+        backend.MEMO.guardar(chave, df_final, df_juntar, ramos)
+    return df_final, df_juntar, ramos
 
 
 def parse_comp_versionid_from_df_final_path(df_final_path: str) -> tuple[str | None, str | None]:
@@ -458,47 +1166,111 @@ def montar_links_fontes_local():
 
 
 def montar_links_fontes_supabase(comp: str, version_id: str):
+    caminhos = caminhos_com_fontes(comp, version_id)
     links = {}
     for nome_bonito, chave in FONTE_NOMES.items():
-        prefixo = FONTE_ARQUIVOS_PREFIXO[chave]
-        path = f"{comp}/{prefixo}_{version_id}.xlsx"
-        links[nome_bonito] = url_for("download_supabase", file=path)
+        links[nome_bonito] = url_for("download_supabase", file=caminhos[chave])
     return links
 
 
-def proxima_versao_da_competencia(comp: str) -> int:
-    itens = _supabase_list(comp)
-    max_v = 0
-    for it in itens:
-        nome = it.get("name", "")
-        mv = _RE_DF_FINAL_V.match(nome)
-        if mv:
-            max_v = max(max_v, int(mv.group(1)))
-    return max_v + 1
+def proxima_versao_da_competencia(comp: str, tentativas: int = 20) -> int:
+    """
+    Próximo vN (lido do índice no bucket e reservado até a versão ser gravada nele).
+    Antes de usar, confere no bucket que df_final_vN não existe e cria o manifesto_vN
+    sem sobrescrever: número já usado por outra instância fica reservado e tenta o próximo.
+    """
+    for _ in range(tentativas):
+        prox = indice().reservar_versao(comp)
+        nome_df_final = _separa_pasta(caminhos_da_versao(comp, f"v{prox}")["df_final"])[1]
+        existentes = _versoes_da_pasta(comp, busca=nome_df_final)
+        if existentes is None:
+            raise RuntimeError(f"não consegui conferir se {comp}/{nome_df_final} já existe")
+        if nome_df_final not in existentes and reservar_manifesto(comp, f"v{prox}"):
+            return prox
+        print(f"[indice] {comp}/v{prox} já existe no bucket, tentando o próximo número")
+    raise RuntimeError(f"não achei um número de versão livre em {comp}")
+
+
+# df_juntar e fontes de cada dashboard renderizado (a página busca linhas/resumos pela API)
+DFS_DASHBOARD = CacheDataFrames(limite_bytes=int(os.getenv("CACHE_DASHBOARD_MB", "256")) * 1024 * 1024)
+_VERSAO_DASHBOARD = "dashboard"
+
+
+def _chave_fonte_dashboard(dashboard_id: str, fonte_key: str) -> str:
+    return f"{dashboard_id}:{fonte_key}"
+
+
+def registrar_dashboard(
+    df_juntar: pd.DataFrame | None,
+    fontes_dfs: dict[str, pd.DataFrame] | None = None,
+) -> str:
+    """
+    Guarda o df_juntar (já preparado pros filtros) e as fontes que ainda não estão
+    no Supabase, e devolve o id do dashboard que vai pro template.
+    """
+    dashboard_id = uuid.uuid4().hex
+    if df_juntar is not None and not df_juntar.empty:
+        DFS_DASHBOARD.guardar(dashboard_id, _VERSAO_DASHBOARD, consultas_juntar.preparar_df_juntar(df_juntar))
+    for fonte_key, df in (fontes_dfs or {}).items():
+        if df is not None:
+            DFS_DASHBOARD.guardar(_chave_fonte_dashboard(dashboard_id, fonte_key), _VERSAO_DASHBOARD, df)
+    return dashboard_id
+
+
+def obter_df_juntar(dashboard_id: str, df_final_path: str = "") -> pd.DataFrame | None:
+    """
+    df_juntar do dashboard `dashboard_id`. Se não estiver mais em memória (outra instância,
+    LRU), recarrega do Supabase pela versão do df_final exibido.
+    """
+    df = DFS_DASHBOARD.obter(dashboard_id, _VERSAO_DASHBOARD, copiar=False) if dashboard_id else None
+    if df is not None:
+        return df
 
+    comp, version_id = parse_comp_versionid_from_df_final_path(df_final_path)
+    if not comp or not version_id:
+        return None
+    bruto = carregar_da_versao(comp, version_id, ["df_juntar"])["df_juntar"]
+    if bruto is None:
+        return None
+    df = consultas_juntar.preparar_df_juntar(bruto)
+    if dashboard_id:
+        DFS_DASHBOARD.guardar(dashboard_id, _VERSAO_DASHBOARD, df)
+    return df
 
-def montar_contexto_dashboard(
-    df_final: pd.DataFrame,
-    competencia_label: str,
-    caminho_df_final: str | None,
-    df_juntar: pd.DataFrame | None = None,
-    tabelas_fontes_dfs: dict[str, pd.DataFrame] | None = None,
-    fontes_keys: dict[str, str] | None = None,
-    links_fontes_override: dict[str, str] | None = None,
-):
-    colunas_numericas = df_final.select_dtypes(include=["number"]).columns
-    df_final[colunas_numericas] = df_final[colunas_numericas].round(2)
 
-    df_display = df_final.copy()
-    for col in colunas_numericas:
-        df_display[col] = df_display[col].apply(
-            lambda x: f"{x:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
-        )
+def obter_fonte_dashboard(dashboard_id: str, fonte_key: str, df_final_path: str = "") -> pd.DataFrame | None:
+    """Fonte `fonte_key` do dashboard: da memória (processar) ou do Supabase (versão do df_final)."""
+    if dashboard_id:
+        df = DFS_DASHBOARD.obter(_chave_fonte_dashboard(dashboard_id, fonte_key), _VERSAO_DASHBOARD, copiar=False)
+        if df is not None:
+            return df
 
-    tabela_html = df_display.to_html(
-        classes="table table-striped table-bordered table-sm dataframe",
-        index=False,
-    )
+    comp, version_id = parse_comp_versionid_from_df_final_path(df_final_path)
+    if not comp or not version_id:
+        return None
+    if fonte_key == "df_final":
+        df = carregar_da_versao(comp, version_id, ["df_final"])["df_final"]
+        if df is not None:
+            colunas_numericas = df.select_dtypes(include=["number"]).columns
+            df[colunas_numericas] = df[colunas_numericas].round(2)
+        return df
+    # passa pelo CACHE_DFS (versão do índice)
+    return carregar_da_versao(comp, version_id, [fonte_key])[fonte_key]
+
+
+def pagina_do_df(df: pd.DataFrame, pagina: int, por_pagina: int, colunas: list[str] | None = None) -> tuple[pd.DataFrame, int]:
+    """Fatia uma página do df (e só as `colunas` pedidas, se vierem). Retorna (pedaço, total_de_linhas)."""
+    if colunas:
+        df = df[[c for c in colunas if c in df.columns]]
+    por_pagina = max(1, min(por_pagina, 1000))
+    inicio = (max(1, pagina) - 1) * por_pagina
+    return df.iloc[inicio: inicio + por_pagina], len(df)
+
+
+def resumo_df_final(df_final: pd.DataFrame) -> dict:
+    """Totais do topo do dashboard, já formatados (arredonda as colunas numéricas do df_final)."""
+    colunas_numericas = df_final.select_dtypes(include=["number"]).columns
+    df_final[colunas_numericas] = df_final[colunas_numericas].round(2)
 
     if "Valor Total Assessor" in df_final.columns:
         total_assessores = len(df_final)
@@ -509,20 +1281,47 @@ def montar_contexto_dashboard(
         total_assessores = len(df_final)
         soma_total = media_total = max_total = 0.0
 
-    df_juntar_registros = []
-    if df_juntar is not None and not df_juntar.empty:
-        df_juntar_registros = df_juntar.to_dict(orient="records")
+    return dict(
+        total_assessores=total_assessores,
+        soma_total=formatacao.brl(soma_total),
+        media_total=formatacao.brl(media_total),
+        max_total_val=formatacao.brl(max_total),
+    )
 
-    def df_to_html(df):
-        return df.to_html(
-            classes="table table-striped table-bordered table-sm dataframe",
-            index=False,
-        )
 
-    tabelas_fontes = {}
-    if tabelas_fontes_dfs:
-        tabelas_fontes = {nome: df_to_html(df) for nome, df in tabelas_fontes_dfs.items()}
+def montar_contexto_dashboard(
+    df_final: pd.DataFrame,
+    competencia_label: str,
+    caminho_df_final: str | None,
+    df_juntar: pd.DataFrame | None = None,
+    fontes_dfs: dict[str, pd.DataFrame] | None = None,
+    fontes_keys: dict[str, str] | None = None,
+    links_fontes_override: dict[str, str] | None = None,
+):
+    """
+    As tabelas (df_juntar e fontes) não vão mais renderizadas no HTML: ficam registradas
+    pelo dashboard_id e a página busca uma página de cada vez pela API.
+    `fontes_dfs` (chave -> df) só precisa vir quando as fontes não estão no Supabase.
+    """
+    return contexto_dashboard(
+        resumo=resumo_df_final(df_final),
+        dashboard_id=registrar_dashboard(df_juntar, fontes_dfs),
+        competencia_label=competencia_label,
+        caminho_df_final=caminho_df_final,
+        fontes_keys=fontes_keys,
+        links_fontes_override=links_fontes_override,
+    )
+
 
+def contexto_dashboard(
+    resumo: dict,
+    dashboard_id: str,
+    competencia_label: str,
+    caminho_df_final: str | None,
+    fontes_keys: dict[str, str] | None = None,
+    links_fontes_override: dict[str, str] | None = None,
+):
+    """Contexto do resultado.html a partir do resumo_df_final e de um dashboard já registrado (usa a requisição)."""
     links_fontes = links_fontes_override if links_fontes_override is not None else montar_links_fontes_local()
 
     competencias_disponiveis = listar_competencias()
@@ -532,21 +1331,21 @@ def montar_contexto_dashboard(
 
     arquivos_df_final = listar_df_final_por_competencia(competencia_atual) if competencia_atual else []
 
+    link_zip_versao = None
+    if supabase is not None and all(parse_comp_versionid_from_df_final_path(caminho_df_final or "")):
+        link_zip_versao = url_for("download_versao", file=caminho_df_final)
+
     return dict(
-        tabela=tabela_html,
-        total_assessores=total_assessores,
-        soma_total=brl(soma_total),
-        media_total=brl(media_total),
-        max_total_val=brl(max_total),
-        tabelas_fontes=tabelas_fontes,
+        **resumo,
         links_fontes=links_fontes,
         fontes_keys=(fontes_keys or {}),
-        df_juntar=df_juntar_registros,
+        dashboard_id=dashboard_id,
         caminho_df_final=caminho_df_final,
         competencia=competencia_label,
         competencias_disponiveis=competencias_disponiveis,
         competencia_atual=competencia_atual,
         arquivos_df_final=arquivos_df_final,
+        link_zip_versao=link_zip_versao,
 
         # 🔑 manda os mapas pro template
         uid_to_codigo_a=UID_TO_CODIGO_A,
@@ -558,6 +1357,37 @@ def montar_contexto_dashboard(
 # 5) ROTAS
 # =====================================================================
 
+# perfil por requisição (PERFIL_ETAPAS=1): cada etapa das rotas e seção do cálculo
+# vira uma entrada; no fim sai uma linha "[perfil] {json}" no log
+@app.before_request
+def _iniciar_perfil():
+    if perfil.ativo() and request.endpoint not in ("static", "api_debug_perfil", "api_tarefa"):
+        g.perfil_token = perfil.iniciar(f"{request.method} {request.path}")
+
+
+@app.after_request
+def _finalizar_perfil(response):
+    token = g.pop("perfil_token", None)
+    if token is not None:
+        perfil.finalizar(token, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def _finalizar_perfil_com_erro(erro):
+    # exceção não tratada: o after_request não roda
+    token = g.pop("perfil_token", None)
+    if token is not None:
+        perfil.finalizar(token, status=500, erro=str(erro))
+
+
+@app.route("/api/debug/perfil")
+def api_debug_perfil():
+    if not perfil.ativo():
+        return jsonify({"ok": False, "error": "Perfil desligado (defina PERFIL_ETAPAS=1)."}), 404
+    return jsonify({"ok": True, "perfis": perfil.recentes()})
+
+
 @app.route("/")
 def index():
     competencias = listar_competencias()
@@ -573,6 +1403,116 @@ def api_arquivos():
     return jsonify({"ok": True, "files": files})
 
 
+def _df_juntar_da_requisicao():
+    dashboard_id = (request.args.get("id") or "").strip()
+    df_final_path = (request.args.get("file") or "").strip()
+    return obter_df_juntar(dashboard_id, df_final_path)
+
+
+@app.route("/api/df_juntar/linhas")
+def api_df_juntar_linhas():
+    df = _df_juntar_da_requisicao()
+    if df is None:
+        return jsonify({"ok": False, "error": "Dados detalhados não encontrados (recarregue a página)."}), 404
+
+    filtrado = consultas_juntar.filtrar(
+        df,
+        assessor=request.args.get("assessor", ""),
+        categoria=request.args.get("categoria", ""),
+        produto=request.args.get("produto") or None,
+        exato=request.args.get("exato") == "1",
+    )
+
+    if request.args.get("formato") == "csv":
+        return app.response_class(
+            consultas_juntar.para_csv(filtrado),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=tabela_detalhada_arvore.csv"},
+        )
+
+    try:
+        pagina = int(request.args.get("pagina", 1))
+        por_pagina = int(request.args.get("por_pagina", 100))
+    except ValueError:
+        return jsonify({"ok": False, "error": "pagina/por_pagina inválidos."}), 400
+
+    resultado = consultas_juntar.paginar(
+        filtrado,
+        pagina=pagina,
+        por_pagina=por_pagina,
+        ordenar=request.args.get("ordenar") or None,
+        desc=request.args.get("desc") == "1",
+    )
+    return jsonify({"ok": True, **resultado})
+
+
+@app.route("/api/df_juntar/resumo")
+def api_df_juntar_resumo():
+    df = _df_juntar_da_requisicao()
+    if df is None:
+        return jsonify({"ok": False, "error": "Dados detalhados não encontrados (recarregue a página)."}), 404
+
+    resumo = consultas_juntar.resumir(
+        df,
+        assessor=request.args.get("assessor", ""),
+        categoria=request.args.get("categoria", ""),
+    )
+    return jsonify({"ok": True, **resumo})
+
+
+@app.route("/api/df_juntar/opcoes")
+def api_df_juntar_opcoes():
+    df = _df_juntar_da_requisicao()
+    if df is None:
+        return jsonify({"ok": False, "error": "Dados detalhados não encontrados (recarregue a página)."}), 404
+    return jsonify({"ok": True, **consultas_juntar.opcoes(df, request.args.get("assessor", ""))})
+
+
+@app.route("/api/fonte")
+def api_fonte():
+    """
+    Uma página de uma fonte (ou do df_final) do dashboard.
+    ?id=<dashboard_id>&file=<df_final_path>&fonte=<chave>&pagina=1&por_pagina=100&colunas=A,B&formato=json|html
+    O total de linhas vai no header X-Total-Count.
+    """
+    fonte_key = (request.args.get("fonte") or "").strip()
+    if fonte_key not in FONTE_KEYS and fonte_key != "df_final":
+        return jsonify({"ok": False, "error": "fonte desconhecida."}), 400
+
+    try:
+        pagina = int(request.args.get("pagina", 1))
+        por_pagina = int(request.args.get("por_pagina", 100))
+    except ValueError:
+        return jsonify({"ok": False, "error": "pagina/por_pagina inválidos."}), 400
+
+    df = obter_fonte_dashboard(
+        (request.args.get("id") or "").strip(),
+        fonte_key,
+        (request.args.get("file") or "").strip(),
+    )
+    if df is None:
+        return jsonify({"ok": False, "error": "Fonte não encontrada (recarregue a página)."}), 404
+
+    colunas = [c.strip() for c in (request.args.get("colunas") or "").split(",") if c.strip()]
+    pedaco, total = pagina_do_df(df, pagina, por_pagina, colunas or None)
+    headers = {"X-Total-Count": str(total)}
+
+    if request.args.get("formato") == "html":
+        if fonte_key == "df_final":
+            pedaco = formatacao.formatar_colunas_brl(pedaco)
+        html = pedaco.to_html(
+            classes="table table-striped table-bordered table-sm dataframe",
+            index=False,
+        )
+        return app.response_class(html, mimetype="text/html", headers=headers)
+
+    # to_json cuida de NaN -> null e de datas (ISO)
+    linhas = json.loads(pedaco.to_json(orient="records", date_format="iso"))
+    resp = jsonify({"ok": True, "fonte": fonte_key, "colunas": list(pedaco.columns), "linhas": linhas})
+    resp.headers.update(headers)
+    return resp
+
+
 @app.route("/api/substituir_fonte", methods=["POST"])
 def api_substituir_fonte():
     if supabase is None:
@@ -592,55 +1532,61 @@ def api_substituir_fonte():
     if not comp or not version_id:
         return jsonify({"ok": False, "error": "df_final_path inválido (precisa conter competência e versão)."}), 400
 
-    caminhos = {
-        "df_final": df_final_path,
-        "df_juntar": f"{comp}/df_juntar_{version_id}.xlsx",
-    }
-    for k in FONTE_ARQUIVOS_PREFIXO:
-        prefixo = FONTE_ARQUIVOS_PREFIXO[k]
-        caminhos[k] = f"{comp}/{prefixo}_{version_id}.xlsx"
-
-    dfs = {}
-    for k in ["pj1", "seg", "cam", "co_ter", "co_xpvp", "cre", "xpcs", "lan_man", "tim_rep", "lan_pro"]:
-        if k == fonte_key:
-            continue
-        df_old = carregar_excel_do_supabase(caminhos[k])
-        if df_old is None:
-            return jsonify({"ok": False, "error": f"Não encontrei no Supabase a fonte '{k}' desta versão ({caminhos[k]})."}), 400
-        dfs[k] = df_old
+    caminhos = caminhos_da_versao(comp, version_id)
+    caminhos["df_final"] = df_final_path
 
+    marca = perfil.cronometro("rota ")
     try:
-        df_new = pd.read_excel(up_file)
+        conteudo = up_file.read()
+        if fonte_key == "pj1" and ingestao.pj1_em_blocos(len(conteudo)):
+            df_new = ingestao.FonteEmBlocos("pj1", conteudo)
+        else:
+            # mesma leitura do /processar: o mesmo arquivo dá o mesmo df (e o mesmo MEMO)
+            df_new = ingestao.ler_fonte(fonte_key, conteudo)[0]
     except Exception as e:
         return jsonify({"ok": False, "error": f"Não consegui ler o Excel enviado: {e}"}), 400
-
-    dfs[fonte_key] = df_new
+    marca("parse", df_new)
 
     try:
-        df_final_new, df_juntar_new = calcular_comissoes(
-            dfs["pj1"],
-            dfs["seg"],
-            dfs["cam"],
-            dfs["co_ter"],
-            dfs["co_xpvp"],
-            dfs["cre"],
-            dfs["xpcs"],
-            dfs["lan_man"],
-            dfs["tim_rep"],
-            dfs["lan_pro"],
+        df_final_new, df_juntar_new, ramos = recalcular_versao(
+            comp, version_id, fonte_key, df_new, sha_fonte=hash_conteudo(conteudo),
         )
+    except FonteAusente as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"ok": False, "error": f"Erro ao recalcular comissões: {e}"}), 500
 
     colunas_numericas = df_final_new.select_dtypes(include=["number"]).columns
     df_final_new[colunas_numericas] = df_final_new[colunas_numericas].round(2)
+    marca("compute", len(df_final_new) + len(df_juntar_new))
+
+    # os ramos acompanham as fontes salvas: só atualiza se a fonte nova subiu
+    try:
+        fonte_nova = enviar_fonte_versao(comp, version_id, fonte_key, conteudo, df_new)
+    except Exception as e:
+        return jsonify({"ok": False, "error": f"Erro ao enviar atualização ao Supabase: {e}"}), 500
+    salvar_ramos(caminho_ramos(comp, version_id), ramos)
 
     try:
-        supabase_upload_df_upsert(df_final_new, caminhos["df_final"])
-        supabase_upload_df_upsert(df_juntar_new, caminhos["df_juntar"])
-        supabase_upload_df_upsert(df_new, caminhos[fonte_key])
+        resultados = supabase_upload_varios({
+            caminhos["df_final"]: df_final_new,
+            caminhos["df_juntar"]: df_juntar_new,
+        })
     except Exception as e:
+        registrar_no_indice(comp, version_id, fontes={fonte_key: fonte_nova})
         return jsonify({"ok": False, "error": f"Erro ao enviar atualização ao Supabase: {e}"}), 500
+    registrar_no_indice(
+        comp, version_id,
+        df_final_new if resultados[caminhos["df_final"]].ok else None,
+        df_juntar_new if resultados[caminhos["df_juntar"]].ok else None,
+        {fonte_key: fonte_nova},
+        resultados,
+    )
+    marca("upload")
+
+    falhas = {p: r.erro for p, r in resultados.items() if not r.ok}
+    if falhas:
+        return jsonify({"ok": False, "error": "Erro ao enviar atualização ao Supabase.", "falhas": falhas}), 500
 
     return jsonify({"ok": True, "redirect": url_for("visualizar_antigo", file=caminhos["df_final"])})
 
@@ -676,61 +1622,42 @@ def visualizar_antigo():
         flash("Selecione uma competência válida para visualizar.")
         return redirect(url_for("index"))
 
-    df_final = carregar_excel_do_supabase(file_path)
-    if df_final is None:
-        flash("Não consegui baixar/ler o Excel do Supabase.")
-        return redirect(url_for("index"))
-
+    marca = perfil.cronometro("rota ")
     comp, version_id = parse_comp_versionid_from_df_final_path(file_path)
 
-    competencia_label = "—"
-    if comp and re.match(r"^\d{4}-\d{2}$", comp):
-        competencia_label = f"{comp.split('-')[1]}/{comp.split('-')[0]}"
-
     df_juntar = None
-    tabelas_fontes_dfs = None
     links_fontes = None
 
     if comp and version_id:
-        caminhos = {
-            "df_juntar": f"{comp}/df_juntar_{version_id}.xlsx",
-            "pj1": f"{comp}/pj1_{version_id}.xlsx",
-            "seg": f"{comp}/seguro_pj_{version_id}.xlsx",
-            "cam": f"{comp}/cambio_{version_id}.xlsx",
-            "co_ter": f"{comp}/co_corretagem_terceiras_{version_id}.xlsx",
-            "co_xpvp": f"{comp}/co_corretagem_xpvp_{version_id}.xlsx",
-            "cre": f"{comp}/credito_{version_id}.xlsx",
-            "xpcs": f"{comp}/xpcs_{version_id}.xlsx",
-            "lan_man": f"{comp}/lancamentos_manuais_{version_id}.xlsx",
-            "tim_rep": f"{comp}/times_repasses_{version_id}.xlsx",
-            "lan_pro": f"{comp}/lancamento_produtos_{version_id}.xlsx",
-        }
-
-        df_juntar = carregar_excel_do_supabase(caminhos["df_juntar"])
-
-        tabelas_fontes_dfs = {}
-        for nome_bonito, chave in FONTE_NOMES.items():
-            df_tmp = carregar_excel_do_supabase(caminhos[chave])
-            if df_tmp is not None:
-                tabelas_fontes_dfs[nome_bonito] = df_tmp
-
-        if not tabelas_fontes_dfs:
-            tabelas_fontes_dfs = None
-
+        # caminhos e versões vêm do índice; as fontes não são baixadas aqui:
+        # /api/fonte busca cada uma quando a aba é aberta
+        carregados = carregar_da_versao(comp, version_id, ["df_final", "df_juntar"])
+        df_final, df_juntar = carregados["df_final"], carregados["df_juntar"]
         links_fontes = montar_links_fontes_supabase(comp, version_id)
+    else:
+        df_final = carregar_excel_do_supabase(file_path)
+    if df_final is None:
+        flash("Não consegui baixar/ler o Excel do Supabase.")
+        return redirect(url_for("index"))
+
+    competencia_label = "—"
+    if comp and re.match(r"^\d{4}-\d{2}$", comp):
+        competencia_label = f"{comp.split('-')[1]}/{comp.split('-')[0]}"
+    marca("download", len(df_final) + (0 if df_juntar is None else len(df_juntar)))
 
     contexto = montar_contexto_dashboard(
         df_final=df_final,
         competencia_label=competencia_label,
         caminho_df_final=file_path,
         df_juntar=df_juntar,
-        tabelas_fontes_dfs=tabelas_fontes_dfs,
         fontes_keys=FONTE_NOMES,
         links_fontes_override=links_fontes,
     )
 
     contexto["max_total"] = contexto.pop("max_total_val")
-    return render_template("resultado.html", **contexto)
+    html = render_template("resultado.html", **contexto)
+    marca("render")
+    return html
 
 
 @app.route("/processar", methods=["POST"])
@@ -739,127 +1666,282 @@ def processar():
 
     competencia = (request.form.get("competencia") or "").strip()
     if not re.match(r"^\d{4}-\d{2}$", competencia):
-        flash("Selecione a competência (mês/ano) antes de processar.")
-        return redirect(url_for("index"))
-
-    ano, mes = competencia.split("-")
-    prefixo_competencia = f"{ano}-{mes}"
-    competencia_label = f"{mes}/{ano}"
+        return _recusar_processar("Selecione a competência (mês/ano) antes de processar.")
 
     if not arquivos or arquivos[0].filename == "":
-        flash("Nenhum arquivo foi enviado. Selecione a pasta ou os arquivos de comissão.")
-        return redirect(url_for("index"))
+        return _recusar_processar("Nenhum arquivo foi enviado. Selecione a pasta ou os arquivos de comissão.")
 
     slots, faltando = classificar_arquivos(arquivos)
     if faltando:
-        flash("Não consegui identificar estes tipos de arquivo: " + ", ".join(faltando))
-        flash(
+        return _recusar_processar(
+            "Não consegui identificar estes tipos de arquivo: " + ", ".join(faltando),
             "Confira se os nomes contêm: Seguro, Câmbio, Terceiras, XPVP, Crédito, XPCS, "
-            "Lançamentos Manuais, Times e Repasses, Lançamento de Produtos."
+            "Lançamentos Manuais, Times e Repasses, Lançamento de Produtos.",
         )
-        return redirect(url_for("index"))
 
-    pj1 = pd.read_excel(slots["pj1"])
-    seg = pd.read_excel(slots["seg"])
-    cam = pd.read_excel(slots["cam"])
-    co_ter = pd.read_excel(slots["co_ter"])
-    co_xpvp = pd.read_excel(slots["co_xpvp"])
-    cre = pd.read_excel(slots["cre"])
-    xpcs = pd.read_excel(slots["xpcs"])
-    lan_man = pd.read_excel(slots["lan_man"])
-    tim_rep = pd.read_excel(slots["tim_rep"])
-    lan_pro = pd.read_excel(slots["lan_pro"])
-
-    df_final, df_juntar = calcular_comissoes(
-        pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_rep, lan_pro
+    # os arquivos do upload só valem durante a requisição: a tarefa recebe cópias em memória
+    marca = perfil.cronometro("rota ", len(arquivos))
+    copias = {}
+    for chave, f in slots.items():
+        f.seek(0)
+        copias[chave] = BytesIO(f.read())
+    marca("upload recebido")
+
+    tarefa = TAREFAS.submeter("processar", processar_competencia, copias, competencia)
+    marca("enfileirar")
+
+    if _quer_json():
+        return jsonify({
+            "ok": True,
+            "tarefa": tarefa.id,
+            "status": url_for("api_tarefa", tarefa_id=tarefa.id),
+            "resultado": url_for("resultado_tarefa", tarefa_id=tarefa.id),
+        }), 202
+    if tarefa.terminou:
+        return redirect(url_for("resultado_tarefa", tarefa_id=tarefa.id))
+    return redirect(url_for("acompanhar_tarefa", tarefa_id=tarefa.id))
+
+
+def _quer_json() -> bool:
+    return request.accept_mimetypes.best == "application/json" or request.headers.get("X-Requested-With") == "XMLHttpRequest"
+
+
+def _recusar_processar(*mensagens: str):
+    if _quer_json():
+        return jsonify({"ok": False, "error": " ".join(mensagens)}), 400
+    for m in mensagens:
+        flash(m)
+    return redirect(url_for("index"))
+
+
+def processar_competencia(tarefa, slots, competencia: str) -> dict:
+    """
+    Corpo do /processar, rodado na fila de tarefas: leitura, cálculo, cópias locais e
+    envio ao Supabase. Registra o dashboard e devolve só os argumentos do
+    contexto_dashboard (ids, caminho e totais): a tarefa fica na fila até uma hora e os
+    DataFrames não ficam presos nela (a página é montada na requisição que abre o
+    resultado; as tabelas vêm do dashboard ou, se saíram da memória, da versão).
+
+    Fonte com o mesmo conteúdo (sha256) de uma já guardada não sobe de novo; o df vem
+    do cache/Parquet em vez de ler o .xlsx e, com o mesmo tim_rep da versão anterior,
+    o ramo dela é reaproveitado (a fonte nem é lida). Com as dez fontes iguais a um
+    cálculo já feito, o resultado vem do MEMO e só as fontes novas no bucket são lidas.
+    """
+    ano, mes = competencia.split("-")
+    prefixo_competencia = f"{ano}-{mes}"
+    competencia_label = f"{mes}/{ano}"
+
+    tarefa.progresso("comparando com as versões anteriores", 0)
+    marca = perfil.cronometro("rota ", len(slots))
+    conteudos = {}
+    for chave in FONTE_KEYS:
+        slots[chave].seek(0)
+        conteudos[chave] = slots[chave].read()
+    hashes = {chave: hash_conteudo(c) for chave, c in conteudos.items()}
+    pj1_grande = ingestao.pj1_em_blocos(len(conteudos["pj1"]))
+    regras = carregar_regras()
+    chave = chave_memo(hashes, regras)
+    memo = backend.MEMO.obter(chave) if chave is not None else None
+
+    version_id = None
+    existentes, prontos = {}, {}
+    if supabase is not None:
+        prox = proxima_versao_da_competencia(prefixo_competencia)
+        version_id = f"v{prox}"
+        existentes = blobs_existentes(hashes)
+        if prox > 1:
+            prontos = ramos_reaproveitaveis(prefixo_competencia, f"v{prox - 1}", hashes)
+    # ramo pronto (ou resultado inteiro no MEMO) e arquivo já no bucket: a fonte não
+    # precisa nem ser lida
+    pular = [k for k in (FONTE_KEYS if memo is not None else prontos) if k in existentes]
+    marca("dedup")
+
+    tarefa.progresso("lendo os arquivos", 10)
+    dfs = {k: None for k in pular}
+    reaproveitar = [k for k in FONTE_KEYS if k not in dfs and not (k == "pj1" and pj1_grande)]
+    for k in reaproveitar:
+        df = CACHE_DFS.obter(_chave_lida(k, hashes[k]), "blob")
+        if df is not None:
+            dfs[k] = df
+    do_bucket = ler_blobs_parquet({k: hashes[k] for k in reaproveitar if k not in dfs and existentes.get(k)})
+    dfs.update(do_bucket)
+    lidos, _tempos_leitura = ingestao.ler_fontes({k: BytesIO(conteudos[k]) for k in FONTE_KEYS if k not in dfs})
+    for k, df in lidos.items():
+        if isinstance(df, pd.DataFrame):
+            CACHE_DFS.guardar(_chave_lida(k, hashes[k]), "blob", df)
+    dfs.update(lidos)
+    print(
+        f"[fontes] {len(lidos)} lidas do upload, {len(do_bucket)} do Parquet, "
+        f"{len(FONTE_KEYS) - len(lidos) - len(do_bucket) - len(pular)} do cache, "
+        f"{len(pular)} sem leitura (ramo da versão anterior)"
     )
+    marca("parse", sum(len(df) for df in dfs.values() if isinstance(df, pd.DataFrame)))
+    # o cálculo usa só as colunas dele; os dfs inteiros vão para o Parquet e o dashboard
+    calculo = {k: ingestao.para_calculo(k, dfs[k]) for k in FONTE_KEYS}
+    pj1 = calculo["pj1"]
+    seg = calculo["seg"]
+    cam = calculo["cam"]
+    co_ter = calculo["co_ter"]
+    co_xpvp = calculo["co_xpvp"]
+    cre = calculo["cre"]
+    xpcs = calculo["xpcs"]
+    lan_man = calculo["lan_man"]
+    tim_rep = calculo["tim_rep"]
+    lan_pro = calculo["lan_pro"]
+
+    tarefa.progresso("calculando as comissões", 30)
+    if memo is not None:
+        df_final, df_juntar, ramos = memo
+    else:
+        ramos = backend.calcular_ramos(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_rep, lan_pro, regras, prontos=prontos)
+        df_final, df_juntar = backend.consolidar_ramos(ramos, tim_rep, regras)
+        if chave is not None:
+            backend.MEMO.guardar(chave, df_final, df_juntar, ramos)
 
     colunas_numericas = df_final.select_dtypes(include=["number"]).columns
     df_final[colunas_numericas] = df_final[colunas_numericas].round(2)
+    marca("compute", len(df_final) + len(df_juntar))
+
+    # cada resultado vira .xlsx uma vez: os mesmos bytes vão para as cópias locais e o upload
+    copias_locais = not os.getenv("VERCEL")
+    tarefa.progresso("gerando os Excels", 55)
+    para_xlsx = {"df_final": df_final, "df_juntar": df_juntar}
+    xlsx = planilhas.xlsx_varios(para_xlsx) if (copias_locais or supabase is not None) else {}
+    marca("xlsx", sum(len(df) for df in para_xlsx.values()))
 
-    if not os.getenv("VERCEL"):
+    if copias_locais:
+        tarefa.progresso("salvando as cópias locais", 60)
         pasta_competencia = os.path.join(OUTPUT_DIR, prefixo_competencia)
         os.makedirs(pasta_competencia, exist_ok=True)
 
-        df_final.to_excel(OUTPUT_FILES["df_final"], index=False)
-        df_juntar.to_excel(OUTPUT_FILES["df_juntar"], index=False)
-        pj1.to_excel(OUTPUT_FILES["pj1"], index=False)
-        seg.to_excel(OUTPUT_FILES["seg"], index=False)
-        cam.to_excel(OUTPUT_FILES["cam"], index=False)
-        co_ter.to_excel(OUTPUT_FILES["co_ter"], index=False)
-        co_xpvp.to_excel(OUTPUT_FILES["co_xpvp"], index=False)
-        cre.to_excel(OUTPUT_FILES["cre"], index=False)
-        xpcs.to_excel(OUTPUT_FILES["xpcs"], index=False)
-        lan_man.to_excel(OUTPUT_FILES["lan_man"], index=False)
-        tim_rep.to_excel(OUTPUT_FILES["tim_rep"], index=False)
-        lan_pro.to_excel(OUTPUT_FILES["lan_pro"], index=False)
-
-        df_final.to_excel(os.path.join(pasta_competencia, "df_final.xlsx"), index=False)
+        for k, caminho in OUTPUT_FILES.items():
+            # as fontes: o arquivo como veio
+            with open(caminho, "wb") as f:
+                f.write(xlsx[k] if k in xlsx else conteudos[k])
+        with open(os.path.join(pasta_competencia, "df_final.xlsx"), "wb") as f:
+            f.write(xlsx["df_final"])
+        marca("cópias locais")
 
     nome_arquivo_df_final = None
 
     if supabase is not None:
+        tarefa.progresso("enviando ao Supabase", 70)
         try:
-            prox = proxima_versao_da_competencia(prefixo_competencia)
-            version_id = f"v{prox}"
-
-            def upload_df(df: pd.DataFrame, path: str):
-                buf = BytesIO()
-                df.to_excel(buf, index=False)
-                buf.seek(0)
-                supabase.storage.from_(SUPABASE_BUCKET).upload(
-                    path=path,
-                    file=buf.getvalue(),
-                    file_options={
-                        "content-type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        "upsert": "true",
-                    },
+            caminhos = caminhos_da_versao(prefixo_competencia, version_id)
+            nome_arquivo_df_final = caminhos["df_final"]
+
+            # só sobem as fontes que ainda não estão no bucket
+            novas = {k: caminho_blob(k, hashes[k]) for k in FONTE_KEYS if k not in existentes}
+            resultados = supabase_upload_varios({
+                caminhos["df_final"]: FonteEnviada(xlsx["df_final"], df_final),
+                caminhos["df_juntar"]: FonteEnviada(xlsx["df_juntar"], df_juntar),
+                **{
+                    path: dfs[k] if isinstance(dfs[k], ingestao.FonteEmBlocos) else FonteEnviada(conteudos[k], dfs[k])
+                    for k, path in novas.items()
+                },
+            })
+
+            manifesto = {k: hashes[k] for k in FONTE_KEYS if k not in novas or resultados[novas[k]].ok}
+            manifesto_ok = salvar_manifesto(prefixo_competencia, version_id, manifesto)
+            print(f"[fontes] {version_id}: {len(novas)} fontes enviadas, {len(FONTE_KEYS) - len(novas)} já estavam no bucket")
+
+            nomes = {path: FONTE_ARQUIVOS_PREFIXO[k] + ".xlsx" for k, path in novas.items()}
+            falhas = [p for p, r in resultados.items() if not r.ok]
+            if falhas:
+                for p in falhas:
+                    print(f"Erro ao enviar {p} para o Supabase:", resultados[p].erro)
+                tarefa.avisar("Não consegui enviar ao Supabase: " + ", ".join(nomes.get(p, p.split("/")[-1]) for p in falhas))
+            if not manifesto_ok:
+                tarefa.avisar("Não consegui salvar a lista de fontes desta versão no Supabase.")
+            if nome_arquivo_df_final in falhas:
+                nome_arquivo_df_final = None
+            else:
+                if manifesto_ok:
+                    salvar_ramos(caminho_ramos(prefixo_competencia, version_id), ramos)
+                # linhas das fontes não lidas: as da versão anterior (mesmo conteúdo)
+                anteriores = (indice().versao(prefixo_competencia, f"v{prox - 1}") or {}).get("fontes", {})
+                fontes_indice = {}
+                for k in manifesto:
+                    fontes_indice[k] = entrada_fonte(k, hashes[k], len(conteudos[k]), dfs[k])
+                    if fontes_indice[k]["linhas"] is None and anteriores.get(k, {}).get("sha") == hashes[k]:
+                        fontes_indice[k]["linhas"] = anteriores[k].get("linhas")
+                registrar_no_indice(
+                    prefixo_competencia, version_id,
+                    df_final, df_juntar if resultados[caminhos["df_juntar"]].ok else None, fontes_indice,
+                    resultados,
                 )
 
-            nome_arquivo_df_final = f"{prefixo_competencia}/df_final_{version_id}.xlsx"
-            upload_df(df_final, nome_arquivo_df_final)
-
-            upload_df(df_juntar, f"{prefixo_competencia}/df_juntar_{version_id}.xlsx")
-            upload_df(pj1, f"{prefixo_competencia}/pj1_{version_id}.xlsx")
-            upload_df(seg, f"{prefixo_competencia}/seguro_pj_{version_id}.xlsx")
-            upload_df(cam, f"{prefixo_competencia}/cambio_{version_id}.xlsx")
-            upload_df(co_ter, f"{prefixo_competencia}/co_corretagem_terceiras_{version_id}.xlsx")
-            upload_df(co_xpvp, f"{prefixo_competencia}/co_corretagem_xpvp_{version_id}.xlsx")
-            upload_df(cre, f"{prefixo_competencia}/credito_{version_id}.xlsx")
-            upload_df(xpcs, f"{prefixo_competencia}/xpcs_{version_id}.xlsx")
-            upload_df(lan_man, f"{prefixo_competencia}/lancamentos_manuais_{version_id}.xlsx")
-            upload_df(tim_rep, f"{prefixo_competencia}/times_repasses_{version_id}.xlsx")
-            upload_df(lan_pro, f"{prefixo_competencia}/lancamento_produtos_{version_id}.xlsx")
-
         except Exception as e:
             print("Erro ao fazer upload para o Supabase:", e)
-            flash("Não consegui enviar os Excels para o Supabase. Você ainda pode ver a tabela na tela.")
+            tarefa.avisar("Não consegui enviar os Excels para o Supabase. Você ainda pode ver a tabela na tela.")
             nome_arquivo_df_final = None
+        marca("upload")
 
-    tabelas_fontes_dfs = {
-        "PJ1 - Base Principal": pj1,
-        "Seguro PJ": seg,
-        "Câmbio": cam,
-        "Co-corretagem Terceiras": co_ter,
-        "Co-corretagem XPVP": co_xpvp,
-        "Crédito": cre,
-        "XPCS": xpcs,
-        "Lançamentos Manuais": lan_man,
-        "Times e Repasses": tim_rep,
-        "Lançamento de Produtos": lan_pro,
-    }
-
-    contexto = montar_contexto_dashboard(
-        df_final=df_final,
+    tarefa.progresso("montando a página", 90)
+    # as fontes já estão em memória: ficam registradas no dashboard para o /api/fonte
+    # (PJ1 em blocos e fontes não lidas não: o /api/fonte lê do Supabase)
+    fontes_dfs = {**{k: dfs[k] for k in FONTE_KEYS if isinstance(dfs[k], pd.DataFrame)}, "df_final": df_final}
+    return dict(
+        resumo=resumo_df_final(df_final),
+        dashboard_id=registrar_dashboard(df_juntar, fontes_dfs),
         competencia_label=competencia_label,
         caminho_df_final=nome_arquivo_df_final,
-        df_juntar=df_juntar,
-        tabelas_fontes_dfs=tabelas_fontes_dfs,
         fontes_keys=FONTE_NOMES,
     )
 
-    contexto["max_total"] = contexto.pop("max_total_val")
-    return render_template("resultado.html", **contexto)
+
+def _tarefa_ou_none(tarefa_id: str):
+    tarefa = TAREFAS.obter(tarefa_id)
+    if tarefa is None:
+        flash("Não encontrei esse processamento (já expirou ou foi feito em outra instância). Envie os arquivos de novo.")
+    return tarefa
+
+
+@app.route("/api/tarefas/<tarefa_id>")
+def api_tarefa(tarefa_id):
+    tarefa = TAREFAS.obter(tarefa_id)
+    if tarefa is None:
+        return jsonify({"ok": False, "error": "Tarefa não encontrada (expirou ou é de outra instância)."}), 404
+    resumo = tarefa.resumo()
+    if tarefa.estado == CONCLUIDA:
+        resumo["resultado_url"] = url_for("resultado_tarefa", tarefa_id=tarefa.id)
+    return jsonify({"ok": True, **resumo})
+
+
+@app.route("/tarefas/<tarefa_id>")
+def acompanhar_tarefa(tarefa_id):
+    tarefa = _tarefa_ou_none(tarefa_id)
+    if tarefa is None:
+        return redirect(url_for("index"))
+    if tarefa.estado == CONCLUIDA:
+        return redirect(url_for("resultado_tarefa", tarefa_id=tarefa.id))
+    return render_template("tarefa.html", tarefa=tarefa.resumo())
+
+
+@app.route("/tarefas/<tarefa_id>/resultado")
+def resultado_tarefa(tarefa_id):
+    tarefa = _tarefa_ou_none(tarefa_id)
+    if tarefa is None:
+        return redirect(url_for("index"))
+    if tarefa.estado == ERRO:
+        flash(f"Erro ao processar os arquivos: {tarefa.erro}")
+        return redirect(url_for("index"))
+    if not tarefa.terminou:
+        return redirect(url_for("acompanhar_tarefa", tarefa_id=tarefa.id))
+
+    for aviso in tarefa.avisos:
+        flash(aviso)
+
+    # a primeira abertura monta o contexto (precisa da requisição para os links) e
+    # guarda só ele: os DataFrames ficam no cache do dashboard
+    marca = perfil.cronometro("rota ")
+    if "contexto" not in tarefa.resultado:
+        contexto = contexto_dashboard(**tarefa.resultado)
+        contexto["max_total"] = contexto.pop("max_total_val")
+        tarefa.resultado = {"contexto": contexto}
+    html = render_template("resultado.html", **tarefa.resultado["contexto"])
+    marca("render")
+    return html
 
 # =====================================================================
 # 6) DOWNLOADS
@@ -886,56 +1968,52 @@ def api_deletar_fonte():
     if not comp or not version_id:
         return jsonify({"ok": False, "error": "df_final_path inválido (precisa conter competência e versão)."}), 400
 
-    caminhos = {
-        "df_juntar": f"{comp}/df_juntar_{version_id}.xlsx",
-        "pj1": f"{comp}/pj1_{version_id}.xlsx",
-        "seg": f"{comp}/seguro_pj_{version_id}.xlsx",
-        "cam": f"{comp}/cambio_{version_id}.xlsx",
-        "co_ter": f"{comp}/co_corretagem_terceiras_{version_id}.xlsx",
-        "co_xpvp": f"{comp}/co_corretagem_xpvp_{version_id}.xlsx",
-        "cre": f"{comp}/credito_{version_id}.xlsx",
-        "xpcs": f"{comp}/xpcs_{version_id}.xlsx",
-        "lan_man": f"{comp}/lancamentos_manuais_{version_id}.xlsx",
-        "tim_rep": f"{comp}/times_repasses_{version_id}.xlsx",
-        "lan_pro": f"{comp}/lancamento_produtos_{version_id}.xlsx",
-    }
-
-    if fonte_key not in caminhos:
+    if fonte_key not in FONTE_KEYS:
         return jsonify({"ok": False, "error": "fonte_key desconhecida."}), 400
 
+    caminhos = caminhos_com_fontes(comp, version_id)
+
     try:
-        df_atual = carregar_excel_do_supabase(caminhos[fonte_key])
+        df_atual = carregar_da_versao(comp, version_id, [fonte_key])[fonte_key]
         if df_atual is None:
             df_vazio = pd.DataFrame()
         else:
             df_vazio = df_atual.iloc[0:0].copy()
 
-        supabase_upload_df_upsert(df_vazio, caminhos[fonte_key])
+        fonte_vazia = enviar_fonte_versao(comp, version_id, fonte_key, planilhas.xlsx_bytes(df_vazio), df_vazio)
 
-        def df_ou_vazio(df):
-            return df if df is not None else pd.DataFrame()
+        df_fonte = carregar_excel_do_supabase(fonte_vazia["path"])
+        if df_fonte is None:
+            df_fonte = pd.DataFrame()
 
-        pj1 = df_ou_vazio(carregar_excel_do_supabase(caminhos["pj1"]))
-        seg = df_ou_vazio(carregar_excel_do_supabase(caminhos["seg"]))
-        cam = df_ou_vazio(carregar_excel_do_supabase(caminhos["cam"]))
-        co_ter = df_ou_vazio(carregar_excel_do_supabase(caminhos["co_ter"]))
-        co_xpvp = df_ou_vazio(carregar_excel_do_supabase(caminhos["co_xpvp"]))
-        cre = df_ou_vazio(carregar_excel_do_supabase(caminhos["cre"]))
-        xpcs = df_ou_vazio(carregar_excel_do_supabase(caminhos["xpcs"]))
-        lan_man = df_ou_vazio(carregar_excel_do_supabase(caminhos["lan_man"]))
-        tim_rep = df_ou_vazio(carregar_excel_do_supabase(caminhos["tim_rep"]))
-        lan_pro = df_ou_vazio(carregar_excel_do_supabase(caminhos["lan_pro"]))
-
-        df_final, df_juntar = calcular_comissoes(
-            pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_rep, lan_pro
+        marca = perfil.cronometro("rota ")
+        df_final, df_juntar, ramos = recalcular_versao(
+            comp, version_id, fonte_key, df_fonte, faltando_vazio=True, sha_fonte=fonte_vazia["sha"],
         )
-
-        supabase_upload_df_upsert(df_final, df_final_path)
-        supabase_upload_df_upsert(df_juntar, caminhos["df_juntar"])
+        marca("compute", len(df_final) + len(df_juntar))
+
+        salvar_ramos(caminho_ramos(comp, version_id), ramos)
+
+        resultados = supabase_upload_varios({
+            df_final_path: df_final,
+            caminhos["df_juntar"]: df_juntar,
+        })
+        registrar_no_indice(
+            comp, version_id,
+            df_final if resultados[df_final_path].ok else None,
+            df_juntar if resultados[caminhos["df_juntar"]].ok else None,
+            {fonte_key: fonte_vazia},
+            resultados,
+        )
+        marca("upload")
+        falhas = {p: r.erro for p, r in resultados.items() if not r.ok}
+        if falhas:
+            return jsonify({"ok": False, "error": "Erro ao enviar o recálculo ao Supabase.", "falhas": falhas}), 500
 
         return jsonify({"ok": True, "redirect": url_for("visualizar_antigo", file=df_final_path)})
 
     except Exception as e:
+        descartar_ramos(caminho_ramos(comp, version_id))
         return jsonify({"ok": False, "error": f"Erro ao deletar/recalcular: {e}"}), 500
 
 
@@ -964,6 +2042,85 @@ def download_supabase():
     url_arquivo = f"{base_public_url}/{nome_arquivo}"
     return redirect(url_arquivo)
 
+
+def arquivos_zip_versao(comp: str, version_id: str, entrada: dict) -> list[pacote_zip.ArquivoZip]:
+    """df_final, df_juntar e as dez fontes da versão, numa pasta {comp}_{versão}/ do .zip."""
+    caminhos = caminhos_com_fontes(comp, version_id)
+    tamanhos = {k: (entrada.get(k) or {}).get("bytes") for k in ("df_final", "df_juntar")}
+    tamanhos.update({k: f.get("bytes") for k, f in entrada.get("fontes", {}).items()})
+    prefixos = {"df_final": "df_final", "df_juntar": "df_juntar", **FONTE_ARQUIVOS_PREFIXO}
+    return [
+        pacote_zip.ArquivoZip(f"{comp}_{version_id}/{prefixo}_{version_id}.xlsx", caminhos[k], tamanhos.get(k))
+        for k, prefixo in prefixos.items()
+    ]
+
+
+def _baixar_do_supabase(path: str) -> bytes:
+    r = transferencias().baixar_varios([path])[path]
+    if not r.ok or r.dados is None:
+        raise RuntimeError(f"Falha no download de {path}: {r.erro}")
+    return r.dados
+
+
+@app.route("/download_versao")
+def download_versao():
+    """
+    A versão inteira (df_final, df_juntar e as dez fontes) num .zip só, montado enquanto
+    sai (pacote_zip.py). ?file=<caminho do df_final>, como no /visualizar.
+    ETag pelas revisões do índice: o navegador revalida e recebe 304 se nada mudou.
+    """
+    df_final_path = (request.args.get("file") or "").strip()
+
+    if supabase is None:
+        flash("Supabase não está configurado. Não foi possível baixar a versão.")
+        return redirect(url_for("index"))
+
+    comp, version_id = parse_comp_versionid_from_df_final_path(df_final_path)
+    if not comp or not version_id:
+        flash("Arquivo inválido: informe o df_final de uma competência/versão.")
+        return redirect(url_for("index"))
+
+    entrada = indice().versao(comp, version_id)
+    if not entrada:
+        flash(f"Não encontrei a versão {version_id} de {comp} no Supabase.")
+        return redirect(url_for("index"))
+
+    arquivos = arquivos_zip_versao(comp, version_id, entrada)
+    versoes = versoes_do_indice(comp, version_id)
+    etag = hashlib.sha256(
+        json.dumps([(a.nome, a.path, versoes.get(a.path)) for a in arquivos]).encode("utf-8")
+    ).hexdigest()
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    data_hora = pacote_zip.data_hora_zip(entrada.get("atualizado_em"))
+    pedacos = pacote_zip.gerar_zip(
+        arquivos, _baixar_do_supabase, data_hora, paralelo=int(os.getenv("SUPABASE_PARALELO", "6")),
+    )
+    # o primeiro pedaço sai antes da resposta: falha logo no início ainda vira aviso na página
+    try:
+        primeiro = next(pedacos)
+    except Exception as e:
+        print(f"[zip] {comp}/{version_id}:", e)
+        flash(f"Não consegui montar o .zip da versão {version_id}: {e}")
+        return redirect(url_for("visualizar_antigo", file=df_final_path))
+
+    def corpo():
+        yield primeiro
+        yield from pedacos
+
+    resp = Response(corpo(), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f'attachment; filename="comissoes_{comp}_{version_id}.zip"'
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.set_etag(etag)
+    # tamanhos de todos os arquivos no índice: o do .zip é exato (senão, vai em chunks)
+    tamanho = pacote_zip.tamanho_zip(arquivos, data_hora)
+    if tamanho is not None:
+        resp.content_length = tamanho
+    return resp
+
 # =====================================================================
 # 7) MAIN LOCAL
 # =====================================================================
@@ -0,0 +1,106 @@
+# armazenamento.py
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+# status HTTP que não adianta repetir (arquivo não existe, sem permissão...)
+_STATUS_SEM_RETRY = {400, 401, 403, 404, 409}
+
+
+@dataclass
+class ResultadoTransferencia:
+    path: str
+    ok: bool
+    dados: bytes | None = None
+    erro: str | None = None
+    tentativas: int = 0
+    tamanho: int | None = None  # bytes enviados (uploads)
+    status: int | None = None  # status HTTP da falha, quando o erro traz (404 = não existe)
+
+
+def _status_do_erro(e: Exception) -> int | None:
+    status = getattr(e, "status", None) or getattr(e, "status_code", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def _como_bytes(data) -> bytes | None:
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    if hasattr(data, "data"):
+        return data.data
+    return None
+
+
+class TransferenciasStorage:
+    """
+    Downloads/uploads em lote no bucket do Supabase, em paralelo e com retry.
+
+    Usa sempre o mesmo `bucket` (supabase.storage.from_(SUPABASE_BUCKET)), então todas
+    as transferências passam pela mesma sessão HTTP do client. Cada objeto tem o seu
+    ResultadoTransferencia: uma falha não derruba o lote inteiro.
+    """
+
+    def __init__(self, bucket, max_paralelo: int = 6, tentativas: int = 3, espera_inicial: float = 0.5):
+        self.bucket = bucket
+        self.max_paralelo = max(1, max_paralelo)
+        self.tentativas = max(1, tentativas)
+        self.espera_inicial = espera_inicial
+
+    def _com_retry(self, path: str, operacao) -> ResultadoTransferencia:
+        espera = self.espera_inicial
+        erro = None
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                dados = operacao()
+                return ResultadoTransferencia(path=path, ok=True, dados=dados, tentativas=tentativa)
+            except Exception as e:
+                erro = e
+                if _status_do_erro(e) in _STATUS_SEM_RETRY or tentativa == self.tentativas:
+                    break
+                time.sleep(espera)
+                espera *= 2
+        return ResultadoTransferencia(path=path, ok=False, erro=str(erro), tentativas=tentativa, status=_status_do_erro(erro))
+
+    def _em_paralelo(self, tarefas: list[tuple[str, object]]) -> dict[str, ResultadoTransferencia]:
+        if not tarefas:
+            return {}
+        n = min(self.max_paralelo, len(tarefas))
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            futuros = {path: pool.submit(self._com_retry, path, op) for path, op in tarefas}
+            return {path: fut.result() for path, fut in futuros.items()}
+
+    def baixar_varios(self, paths: list[str]) -> dict[str, ResultadoTransferencia]:
+        def baixar(path):
+            def op():
+                dados = _como_bytes(self.bucket.download(path))
+                if dados is None:
+                    raise RuntimeError("download sem conteúdo")
+                return dados
+            return op
+
+        return self._em_paralelo([(p, baixar(p)) for p in dict.fromkeys(paths)])
+
+    def enviar_varios(self, itens: list[tuple[str, bytes, str]], upsert: bool = True) -> dict[str, ResultadoTransferencia]:
+        """
+        itens = [(path, conteudo, content_type), ...]. `upsert=False` só cria: objeto que
+        já existe falha com status 409.
+        """
+        def enviar(path, conteudo, content_type):
+            def op():
+                self.bucket.upload(
+                    path=path,
+                    file=conteudo,
+                    file_options={"content-type": content_type, "upsert": "true" if upsert else "false"},
+                )
+                return None
+            return op
+
+        resultados = self._em_paralelo([(p, enviar(p, c, t)) for p, c, t in itens])
+        for p, c, _ in itens:
+            resultados[p].tamanho = len(c)
+        return resultados
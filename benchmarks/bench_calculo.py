@@ -0,0 +1,221 @@
+# benchmarks/bench_calculo.py
+"""
+Como o calcular_comissoes escala com o tamanho do mês (dados de dados_sinteticos.py).
+
+Para cada tamanho de PJ1 mede, num processo separado (o pico de RSS não se mistura):
+tempo total, pico de RSS e tempo de cada seção do motor (tim_rep, seis linhas de
+negócio, pj1, lan_man, lan_pro, consolidação). Com --processar mede também o POST
+/processar de ponta a ponta (upload dos xlsx, leitura, cálculo, envio, página),
+com o bucket do Supabase trocado por um em memória (só o custo local entra na conta).
+
+    python benchmarks/bench_calculo.py
+    python benchmarks/bench_calculo.py --pj1 10000 1000000 5000000 --assessores 500
+    python benchmarks/bench_calculo.py --pj1 10000 100000 --processar
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, ".."))
+sys.path.insert(0, AQUI)
+
+# xlsx tem no máximo 1.048.576 linhas: o /processar não passa disso
+_MAX_LINHAS_XLSX = 1_048_575
+
+
+def pico_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devolve KB; macOS, bytes
+    return pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+
+
+def medir_motor(n_pj1: int, n_assessores: int, seed: int) -> dict:
+    import comissoes_backend as cb
+    from dados_sinteticos import gerar_entradas
+
+    dados = gerar_entradas(n_pj1=n_pj1, n_assessores=n_assessores, seed=seed)
+    rss_dados = pico_rss_mb()
+
+    secoes = {}
+
+    def cronometrar(nome, func):
+        inicio = time.perf_counter()
+        r = func()
+        secoes[nome] = time.perf_counter() - inicio
+        return r
+
+    inicio_total = time.perf_counter()
+    repasses = cronometrar("tim_rep", lambda: cb.preparar_repasses(dados["tim_rep"]))
+    ramos = cronometrar("linhas", lambda: cb._ramos_linhas({f: dados[f] for f in cb.LINHAS_NEGOCIO}, repasses))
+    for fonte in ("pj1", "lan_man", "lan_pro"):
+        ramos[fonte] = cronometrar(fonte, lambda: cb.calcular_ramo(fonte, dados[fonte], repasses))
+    ramos = {f: ramos[f] for f in cb.FONTES_RAMOS}
+    df_final, df_juntar = cronometrar("consolidar", lambda: cb.consolidar_ramos(ramos, dados["tim_rep"]))
+    total = time.perf_counter() - inicio_total
+
+    return dict(
+        modo="motor",
+        n_pj1=n_pj1,
+        total=total,
+        rss_dados=rss_dados,
+        rss_pico=pico_rss_mb(),
+        secoes=secoes,
+        linhas_df_juntar=len(df_juntar),
+        assessores_df_final=len(df_final),
+    )
+
+
+class _BucketMemoria:
+    """Bucket do Supabase em memória (list/download/upload/remove), só para o benchmark."""
+
+    def __init__(self):
+        self.objetos: dict[str, tuple[bytes, float]] = {}
+
+    def list(self, path=None, options=None):
+        prefixo = f"{path}/" if path else ""
+        busca = (options or {}).get("search", "")
+        itens, pastas = [], set()
+        for caminho, (conteudo, quando) in list(self.objetos.items()):
+            if not caminho.startswith(prefixo):
+                continue
+            resto = caminho[len(prefixo):]
+            if "/" in resto:
+                pasta = resto.split("/")[0]
+                if pasta not in pastas:
+                    pastas.add(pasta)
+                    itens.append({"name": pasta, "id": None, "metadata": None})
+            elif resto.startswith(busca):
+                itens.append({"name": resto, "updated_at": str(quando), "metadata": {"size": len(conteudo)}})
+        return itens
+
+    def download(self, path):
+        if path not in self.objetos:
+            raise RuntimeError(f"404: {path}")
+        return self.objetos[path][0]
+
+    def upload(self, path, file, file_options=None):
+        self.objetos[path] = (bytes(file), time.time())
+
+    def remove(self, paths):
+        for p in paths:
+            self.objetos.pop(p, None)
+        return []
+
+
+class _SupabaseMemoria:
+    def __init__(self):
+        self.bucket = _BucketMemoria()
+        self.storage = self
+
+    def from_(self, nome):
+        return self.bucket
+
+
+def medir_processar(n_pj1: int, n_assessores: int, seed: int) -> dict:
+    from io import BytesIO
+
+    from dados_sinteticos import NOMES_ARQUIVOS, gerar_entradas, para_xlsx
+
+    # caminho de produção: sem as cópias locais em outputs/ e com a tarefa rodando
+    # dentro da requisição (o POST redireciona direto para o resultado)
+    os.environ.setdefault("VERCEL", "1")
+    import app as aplicacao
+
+    aplicacao.supabase = _SupabaseMemoria()
+
+    inicio = time.perf_counter()
+    dados = gerar_entradas(n_pj1=n_pj1, n_assessores=n_assessores, seed=seed)
+    arquivos = {k: para_xlsx(df) for k, df in dados.items()}
+    preparo = time.perf_counter() - inicio
+    del dados
+    rss_dados = pico_rss_mb()
+
+    cliente = aplicacao.app.test_client()
+    inicio = time.perf_counter()
+    resp = cliente.post(
+        "/processar",
+        data={
+            "competencia": "2025-03",
+            "files": [(BytesIO(conteudo), NOMES_ARQUIVOS[k]) for k, conteudo in arquivos.items()],
+        },
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    total = time.perf_counter() - inicio
+    if resp.status_code != 200:
+        raise RuntimeError(f"/processar respondeu {resp.status_code}")
+
+    return dict(
+        modo="processar",
+        n_pj1=n_pj1,
+        total=total,
+        rss_dados=rss_dados,
+        rss_pico=pico_rss_mb(),
+        secoes={"gerar xlsx (fora do total)": preparo},
+        bytes_resposta=len(resp.data),
+        bytes_enviados=sum(len(c) for c in arquivos.values()),
+    )
+
+
+def _em_processo_separado(modo: str, n_pj1: int, n_assessores: int, seed: int) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--filho", modo,
+           "--pj1", str(n_pj1), "--assessores", str(n_assessores), "--seed", str(seed)]
+    saida = subprocess.run(cmd, capture_output=True, text=True)
+    if saida.returncode != 0:
+        raise RuntimeError(f"{modo} {n_pj1}: {saida.stderr.strip()[-2000:]}")
+    # o resultado é a última linha (o app/ingestão também imprimem logs)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def _mb(v) -> str:
+    return "    -" if v is None else f"{v:7.0f}"
+
+
+def imprimir(r: dict):
+    secoes = " | ".join(f"{nome} {seg:.2f}s" for nome, seg in r["secoes"].items())
+    print(
+        f"{r['modo']:<9} {r['n_pj1']:>9,} linhas PJ1 | total {r['total']:7.2f}s | "
+        f"RSS dados {_mb(r['rss_dados'])} MB | pico {_mb(r['rss_pico'])} MB | {secoes}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pj1", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--assessores", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processar", action="store_true", help="mede também o POST /processar")
+    parser.add_argument("--json", action="store_true", help="uma linha JSON por medição")
+    parser.add_argument("--filho", choices=["motor", "processar"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        medir = medir_motor if args.filho == "motor" else medir_processar
+        print(json.dumps(medir(args.pj1[0], args.assessores, args.seed)))
+        return
+
+    modos = ["motor"] + (["processar"] if args.processar else [])
+    for n in args.pj1:
+        for modo in modos:
+            if modo == "processar" and n > _MAX_LINHAS_XLSX:
+                print(f"processar {n:>9,} linhas PJ1 | pulado: passa do limite de linhas do xlsx")
+                continue
+            r = _em_processo_separado(modo, n, args.assessores, args.seed)
+            if args.json:
+                print(json.dumps(r, ensure_ascii=False))
+            else:
+                imprimir(r)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# benchmarks/bench_desconto.py
+"""
+Seção 4 do PJ1 (desconto de transferência): caminho antigo (filtros, groupbys,
+idxmax e merges, o último pelas seis colunas sobre o PJ1 inteiro) x
+_pj1_descontos/_pj1_com_desconto. Confere que o pj1_final sai igual bit a bit
+(mesmas colunas, dtypes, valores e sinal dos zeros) antes de medir; casos de borda
+(categoria/código vazios, empate de produtos, desconto em várias categorias) vão
+num PJ1 pequeno à parte.
+
+Cada tamanho roda duas vezes: com o sintético como vem (quase todo assessor tem
+desconto, em várias categorias) e com desconto só em --com-desconto dos assessores,
+mais perto de um mês real.
+
+    python benchmarks/bench_desconto.py
+    python benchmarks/bench_desconto.py --pj1 100000 1000000 --assessores 500
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, ".."))
+sys.path.insert(0, AQUI)
+
+import comissoes_backend as cb  # noqa: E402
+from dados_sinteticos import gerar_entradas  # noqa: E402
+
+
+# ---------------------------------------------------------------------
+# caminho antigo (referência)
+# ---------------------------------------------------------------------
+
+def _antigo(pj1):
+    pj1_desc = pj1[["ID","PJ","Categoria","Produto","Cód. Assessor Direto","Comissão Bruta (R$) Escritório"]].copy()
+    pj1_desc = pj1_desc[pj1_desc["Produto"]=="Desconto de Transferência de Clientes"]
+    pj1_sem = pj1[~pj1['Produto'].isin(cb.PRODUTOS_FORA_PJ1)]
+    pj1_perc = pj1_sem[["ID","PJ","Cód. Assessor Direto","Categoria","Produto","Comissão Bruta (R$) Escritório"]].copy()
+
+    pj1_desc_2 = pj1_desc.groupby(["PJ","Cód. Assessor Direto","Categoria","Produto"])[["Comissão Bruta (R$) Escritório"]].sum().reset_index()
+    pj1_desc_2.rename({'Comissão Bruta (R$) Escritório':'Comissão Escritório Soma'}, axis=1, inplace=True)
+
+    pj1_desc_pos = pj1_desc_2[pj1_desc_2['Comissão Escritório Soma'] > 0].copy()
+    pj1_desc_pos["Comissão Escritório Tratada"] = pj1_desc_pos["Comissão Escritório Soma"]
+    pj1_desc_pos["Produto"] = "Desconto de Transferência de Clientes Positivo"
+
+    pj1_perc = pj1_perc[~pj1_perc["Cód. Assessor Direto"].isin(pj1_desc_pos["Cód. Assessor Direto"])].copy()
+    pj1_perc["Comissão Escritório Soma x Produto"] = pj1_perc.groupby(
+        ["Cód. Assessor Direto","Categoria","Produto"]
+    )["Comissão Bruta (R$) Escritório"].transform("sum")
+    pj1_perc["Proporção Desconto Transferência"] = (
+        pj1_perc["Comissão Bruta (R$) Escritório"] / pj1_perc["Comissão Escritório Soma x Produto"] * 100
+    )
+
+    maior_produto = (
+        pj1_perc.groupby(["Cód. Assessor Direto","Produto"])["Comissão Escritório Soma x Produto"]
+        .first().reset_index()
+    )
+    maior_produto = maior_produto.loc[
+        maior_produto.groupby("Cód. Assessor Direto")["Comissão Escritório Soma x Produto"].idxmax()
+    ]
+    pj1_maior = pj1_perc.merge(
+        maior_produto[["Cód. Assessor Direto","Produto"]],
+        on=["Cód. Assessor Direto","Produto"],
+        how="inner"
+    ).reset_index(drop=True)
+
+    pj1_desc3 = pj1_maior[["Cód. Assessor Direto","Produto"]].drop_duplicates()
+    pj1_desc3.rename({'Produto':'Descontar de'}, axis=1, inplace=True)
+    pj1_desc_2 = pj1_desc_2.merge(pj1_desc3, on="Cód. Assessor Direto", how="left")
+
+    pj1_desc_4 = pj1_maior.merge(
+        pj1_desc_2[["Cód. Assessor Direto","Comissão Escritório Soma"]],
+        on="Cód. Assessor Direto",
+        how="left"
+    )
+    pj1_desc_4["Desconto de Transferência de Clientes Fracionado"] = (
+        pj1_desc_4["Proporção Desconto Transferência"] * pj1_desc_4["Comissão Escritório Soma"]/100
+    )
+    pj1_desc_4["Comissão Escritório Tratada"] = (
+        pj1_desc_4["Comissão Bruta (R$) Escritório"] + pj1_desc_4["Desconto de Transferência de Clientes Fracionado"]
+    )
+    pj1_desc_4 = pj1_desc_4[pj1_desc_4["Comissão Escritório Tratada"].notnull()]
+
+    pj1_final = pj1.merge(
+        pj1_desc_4,
+        on=["ID","PJ","Cód. Assessor Direto","Categoria","Produto","Comissão Bruta (R$) Escritório"],
+        how="left"
+    )
+    colunas_comuns = ["PJ","Cód. Assessor Direto","Categoria","Produto","Comissão Escritório Soma"]
+    return pd.concat([pj1_final, pj1_desc_pos[colunas_comuns]], ignore_index=True)
+
+
+def _novo(pj1):
+    return cb._pj1_com_desconto(pj1, *cb._pj1_descontos(*cb._pj1_partes_desconto(pj1)))
+
+
+# ---------------------------------------------------------------------
+
+def conferir_igual(obtido: pd.DataFrame, esperado: pd.DataFrame):
+    pd.testing.assert_frame_equal(obtido, esperado, check_exact=True)
+    for col in esperado.columns:
+        a, b = obtido[col].to_numpy(), esperado[col].to_numpy()
+        if a.dtype.kind == "f":
+            assert np.array_equal(np.signbit(a), np.signbit(b)), f"sinal do zero diferente em {col}"
+
+
+def pj1_de_borda() -> pd.DataFrame:
+    """PJ1 pequeno com os casos que o sintético quase não gera."""
+    linhas = [
+        # A: desconto em duas categorias; empate entre Ações e BDR (fica o primeiro na ordem)
+        ("A", "Renda Variável", "Ações", 10.0), ("A", "Renda Variável", "BDR", 10.0), ("A", "Renda Fixa", "Ações", 5.0),
+        ("A", "Renda Fixa", "Desconto de Transferência de Clientes", -3.0),
+        ("A", "Renda Variável", "Desconto de Transferência de Clientes", -2.0),
+        # B: linha sem categoria (fica sem soma) e desconto que soma zero
+        ("B", None, "Fundos", 40.0), ("B", "Fundos", "Fundos", 7.0), ("B", "Fundos", "Fundos", -0.0),
+        ("B", "Fundos", "Desconto de Transferência de Clientes", -1.0),
+        ("B", "Fundos", "Desconto de Transferência de Clientes", 1.0),
+        # C: soma positiva numa categoria (não divide nada)
+        ("C", "Renda Fixa", "CDB", 8.0), ("C", "Renda Fixa", "Desconto de Transferência de Clientes", 4.0),
+        ("C", "Fundos", "Desconto de Transferência de Clientes", -9.0),
+        # D: sem desconto; E: só desconto; código vazio; campanha
+        ("D", "Renda Fixa", "CDB", 3.0), ("E", "Renda Fixa", "Desconto de Transferência de Clientes", -5.0),
+        (None, "Renda Fixa", "CDB", 2.0), (None, "Renda Fixa", "Desconto de Transferência de Clientes", -1.0),
+        ("A", "Renda Variável", "Campanhas", 50.0), ("A", "Renda Variável", "Ações", np.nan),
+    ]
+    pj1 = pd.DataFrame(linhas, columns=["Cód. Assessor Direto", "Categoria", "Produto", "Comissão Bruta (R$) Escritório"])
+    pj1.insert(0, "PJ", "PJ1")
+    pj1.insert(0, "ID", range(1, len(pj1) + 1))
+    return pj1
+
+
+def _melhor_de(func, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pj1", type=int, nargs="+", default=[10_000, 100_000, 400_000])
+    parser.add_argument("--assessores", type=int, default=200)
+    parser.add_argument("--com-desconto", type=float, default=0.1, help="fração dos assessores com desconto no 2º cenário")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    borda = pj1_de_borda()
+    conferir_igual(_novo(borda.copy()), _antigo(borda.copy()))
+    print("casos de borda: igual ao caminho antigo")
+
+    for n in args.pj1:
+        sintetico = gerar_entradas(n_pj1=n, n_assessores=args.assessores)["pj1"]
+        codigos = sintetico["Cód. Assessor Direto"].unique()
+        com_desconto = codigos[: max(1, int(len(codigos) * args.com_desconto))]
+        desconto = sintetico["Produto"] == "Desconto de Transferência de Clientes"
+        cenarios = {
+            "todos com desconto": sintetico,
+            f"{len(com_desconto)} com desconto": sintetico[~desconto | sintetico["Cód. Assessor Direto"].isin(com_desconto)],
+        }
+        for nome, pj1 in cenarios.items():
+            pj1 = cb._pj1_base(pj1.reset_index(drop=True))
+            conferir_igual(_novo(pj1.copy()), _antigo(pj1.copy()))
+            t_antigo = _melhor_de(lambda: _antigo(pj1.copy()), args.repeticoes)
+            t_novo = _melhor_de(lambda: _novo(pj1.copy()), args.repeticoes)
+            print(
+                f"PJ1 {n:>9} linhas, {nome:<18} | antigo {t_antigo * 1000:8.1f} ms"
+                f" | novo {t_novo * 1000:8.1f} ms | {t_antigo / t_novo:.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
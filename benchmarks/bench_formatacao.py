@@ -0,0 +1,51 @@
+# benchmarks/bench_formatacao.py
+"""
+Formatação BRL: caminho antigo (apply + lambda por célula) x formatacao.formatar_brl_array.
+
+    python benchmarks/bench_formatacao.py [n_valores]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from formatacao import formatar_brl_array  # noqa: E402
+
+
+def _antigo(serie: pd.Series) -> pd.Series:
+    return serie.apply(lambda x: f"{x:,.2f}".replace(",", "v").replace(".", ",").replace("v", "."))
+
+
+def _melhor_de(func, repeticoes: int = 5) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main(n: int = 100_000):
+    rng = np.random.default_rng(42)
+    valores = np.round(rng.normal(0, 50_000, n), 2)
+    valores[:: 997] = np.nan
+    valores[1:: 991] = -0.0
+    serie = pd.Series(valores)
+
+    esperado = _antigo(serie).tolist()
+    obtido = list(formatar_brl_array(valores))
+    assert obtido == esperado, "texto diferente do caminho antigo"
+
+    t_antigo = _melhor_de(lambda: _antigo(serie))
+    t_novo = _melhor_de(lambda: formatar_brl_array(valores))
+    print(f"{n} valores | apply: {t_antigo * 1000:.1f} ms | vetorizado: {t_novo * 1000:.1f} ms | {t_antigo / t_novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
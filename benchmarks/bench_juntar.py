@@ -0,0 +1,178 @@
+# benchmarks/bench_juntar.py
+"""
+Seções 11–12 do df_juntar (detalhado): caminho antigo (cópia + rename do PJ1, um frame
+por mesa/líder com todas as colunas do PJ1, dois concats, merge com o nome e
+"código - nome" linha a linha) x _pj1_juntar + _montar_df_juntar. Confere antes que o
+df_juntar sai igual bit a bit (colunas, dtypes, valores), também com código repetido
+no tim_rep.
+
+Cada caminho roda num processo novo, a partir do pj1_final e dos outros ramos prontos:
+mede o tempo e o pico de memória da etapa (pico de RSS zerado logo antes dela, via
+/proc/self/clear_refs; fora do Linux só o tempo).
+
+    python benchmarks/bench_juntar.py
+    python benchmarks/bench_juntar.py --pj1 100000 1000000 --assessores 500
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, ".."))
+sys.path.insert(0, AQUI)
+
+import comissoes_backend as cb  # noqa: E402
+from dados_sinteticos import gerar_entradas  # noqa: E402
+
+
+# ---------------------------------------------------------------------
+# caminho antigo (referência)
+# ---------------------------------------------------------------------
+
+def _padroniza(df, col_perc, col_val, codigo):
+    base = df[cb._COLUNAS_JUNTAR_PJ1 + [col_perc, col_val]].copy()
+    base = base.rename(columns={**cb._RENOMEAR_JUNTAR_PJ1, col_perc:"percentual", col_val:"Valor Assessor"})
+    base["Código Assessor"] = codigo
+    return base
+
+
+def _antigo(pj1_final, ramos, repasses, regras):
+    pj1_juntar = pj1_final[cb._COLUNAS_JUNTAR_PJ1 + ["percentual tratado","Valor Assessor Direto"]].copy()
+    pj1_juntar["Valor Escritório"] = pj1_juntar["Repasse (%) Escritório"] * pj1_juntar["Sem Imposto"]/100
+    pj1_juntar = pj1_juntar.rename(columns={**cb._RENOMEAR_JUNTAR_PJ1, "percentual tratado":"percentual", "Valor Assessor Direto":"Valor Assessor"})
+    extras = [
+        _padroniza(pj1_final[pj1_final[m.coluna_percentual]!=0], m.coluna_percentual, m.coluna_valor, m.codigo)
+        for m in regras.mesas
+    ]
+    extras.append(_padroniza(
+        pj1_final[pj1_final["Repasse Investimento Líder"]!=0], "Repasse Investimento Líder", "Valor Lider", regras.lider
+    ))
+
+    df_juntar = pd.concat([pj1_juntar if f == "pj1" else ramos[f]["juntar"] for f in cb.FONTES_RAMOS], ignore_index=True)
+    df_juntar = pd.concat([df_juntar] + extras, ignore_index=True)
+    df_juntar = cb._com_nome_completo(df_juntar, repasses)
+    df_juntar["Assessor + Nome"] = (
+        df_juntar["Código Assessor"].astype(str) + " - " + df_juntar["Nome Completo"].astype(str)
+    ).str.replace(r"(nan|NaN|None)", "", regex=True).str.strip(" -")
+    df_juntar["Código Assessor"] = df_juntar["Assessor + Nome"]
+    df_juntar.drop(columns=["Código", "Nome Completo", "Assessor + Nome"], inplace=True, errors="ignore")
+    return df_juntar
+
+
+def _novo(pj1_final, ramos, repasses, regras):
+    pj1_juntar, linhas_mesa, repasse_lider = cb._pj1_juntar(pj1_final, regras)
+    ramos = {**ramos, "pj1": {**ramos["pj1"], "juntar": pj1_juntar, "juntar_extra": linhas_mesa + [repasse_lider]}}
+    return cb._montar_df_juntar(ramos, repasses)
+
+
+CAMINHOS = {"antigo": _antigo, "novo": _novo}
+
+
+# ---------------------------------------------------------------------
+
+def preparar(dados: dict):
+    """pj1_final (seções 2–9 do PJ1) e os ramos das outras fontes, prontos."""
+    regras = cb.carregar_regras()
+    repasses = cb.preparar_repasses(dados["tim_rep"])
+    ramos = cb.calcular_ramos(**dados, regras=regras)
+    pj1 = cb._pj1_base(dados["pj1"].copy())
+    pj1_final = cb._pj1_com_desconto(pj1, *cb._pj1_descontos(*cb._pj1_partes_desconto(pj1)))
+    pj1_final, cod_tim = cb._pj1_repasses(pj1_final, repasses, regras)
+    pj1_final = cb._pj1_lider(pj1_final, cod_tim, repasses)
+    return pj1_final, ramos, repasses, regras
+
+
+def conferir_igual(obtido: pd.DataFrame, esperado: pd.DataFrame):
+    pd.testing.assert_frame_equal(obtido, esperado, check_exact=True)
+    for col in esperado.columns:
+        a, b = obtido[col].to_numpy(), esperado[col].to_numpy()
+        if a.dtype.kind == "f":
+            assert np.array_equal(np.signbit(a), np.signbit(b)), f"sinal do zero diferente em {col}"
+
+
+def _rss_mb(campo: str) -> float | None:
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith(campo + ":"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _zerar_pico() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def medir(caminho: str, n_pj1: int, n_assessores: int) -> dict:
+    args = preparar(gerar_entradas(n_pj1=n_pj1, n_assessores=n_assessores))
+    gc.collect()
+    antes = _rss_mb("VmRSS")
+    zerou = _zerar_pico()
+    inicio = time.perf_counter()
+    df_juntar = CAMINHOS[caminho](*args)
+    segundos = time.perf_counter() - inicio
+    pico = _rss_mb("VmHWM") if zerou else None
+    return dict(
+        segundos=segundos,
+        pico_mb=None if pico is None or antes is None else pico - antes,
+        linhas=len(df_juntar),
+    )
+
+
+def _em_processo_novo(caminho: str, n_pj1: int, n_assessores: int) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--filho", caminho, "--pj1", str(n_pj1), "--assessores", str(n_assessores)]
+    saida = subprocess.run(cmd, capture_output=True, text=True)
+    if saida.returncode != 0:
+        raise RuntimeError(saida.stderr.strip()[-2000:])
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pj1", type=int, nargs="+", default=[10_000, 100_000, 400_000])
+    parser.add_argument("--assessores", type=int, default=200)
+    parser.add_argument("--filho", choices=list(CAMINHOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(json.dumps(medir(args.filho, args.pj1[0], args.assessores)))
+        return
+
+    dados = gerar_entradas(n_pj1=20_000, n_assessores=args.assessores)
+    conferir_igual(_novo(*preparar(dados)), _antigo(*preparar(dados)))
+    # código repetido no tim_rep (o merge com o nome repete as linhas)
+    tim_rep = dados["tim_rep"]
+    dados["tim_rep"] = pd.concat([tim_rep, tim_rep.iloc[[0, 1, 1]]], ignore_index=True)
+    conferir_igual(_novo(*preparar(dados)), _antigo(*preparar(dados)))
+    print("df_juntar igual ao caminho antigo")
+
+    for n in args.pj1:
+        r = {c: _em_processo_novo(c, n, args.assessores) for c in CAMINHOS}
+        antigo, novo = r["antigo"], r["novo"]
+        memoria = ""
+        if antigo["pico_mb"] is not None and novo["pico_mb"] is not None:
+            memoria = f" | pico {antigo['pico_mb']:7.0f} -> {novo['pico_mb']:6.0f} MB"
+        print(
+            f"PJ1 {n:>9} linhas ({novo['linhas']:>9} no df_juntar) | antigo {antigo['segundos'] * 1000:8.1f} ms"
+            f" | novo {novo['segundos'] * 1000:8.1f} ms | {antigo['segundos'] / novo['segundos']:.1f}x{memoria}"
+        )
+
+
+if __name__ == "__main__":
+    main()
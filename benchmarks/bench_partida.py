@@ -0,0 +1,107 @@
+# benchmarks/bench_partida.py
+"""
+Partida a frio do app (o que uma instância nova da Vercel paga antes de responder).
+
+Em processos novos mede: `import app`, o primeiro GET / e o primeiro GET
+/api/arquivos (bucket do Supabase em memória, com o índice de versões pronto), e
+confere que nenhum módulo pesado (pandas, numpy, openpyxl, supabase, o motor) foi
+carregado no caminho. Sai com status 1 se a mediana do import passar do orçamento
+ou se algum módulo pesado aparecer: serve de teste contra regressão da partida.
+
+    python benchmarks/bench_partida.py
+    python benchmarks/bench_partida.py --rodadas 9 --orcamento-ms 300
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+
+# pilha de cálculo/armazenamento que / e /api/arquivos não podem carregar
+MODULOS_PESADOS = ["pandas", "numpy", "openpyxl", "pyarrow", "supabase", "comissoes_backend", "ingestao"]
+
+ORCAMENTO_MS = float(os.getenv("PARTIDA_ORCAMENTO_MS", "500"))
+
+
+def medir_partida() -> dict:
+    os.environ.setdefault("VERCEL", "1")
+    sys.path.insert(0, os.path.join(AQUI, ".."))
+
+    inicio = time.perf_counter()
+    import app as aplicacao
+    importar = time.perf_counter() - inicio
+
+    sys.path.insert(0, AQUI)
+    from bench_calculo import _SupabaseMemoria
+
+    memoria = _SupabaseMemoria()
+    indice = {
+        "versao": 1,
+        "atualizado_em": None,
+        "competencias": {"2025-03": {"v1": {"df_final": {"path": "2025-03/df_final_v1.xlsx"}, "fontes": {}}}},
+    }
+    memoria.bucket.upload("indice_versoes.json", json.dumps(indice).encode("utf-8"))
+    aplicacao.supabase = memoria
+
+    cliente = aplicacao.app.test_client()
+    tempos = {}
+    for nome, url in [("/", "/"), ("/api/arquivos", "/api/arquivos?competencia=2025-03")]:
+        inicio = time.perf_counter()
+        resp = cliente.get(url)
+        tempos[nome] = time.perf_counter() - inicio
+        if resp.status_code != 200:
+            raise RuntimeError(f"{url} respondeu {resp.status_code}")
+
+    return dict(
+        importar=importar,
+        rotas=tempos,
+        pesados=[m for m in MODULOS_PESADOS if m in sys.modules],
+    )
+
+
+def _em_processo_novo() -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--filho"]
+    saida = subprocess.run(cmd, capture_output=True, text=True)
+    if saida.returncode != 0:
+        raise RuntimeError(saida.stderr.strip()[-2000:])
+    # o resultado é a última linha (o app também imprime avisos)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rodadas", type=int, default=5)
+    parser.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_MS, help="limite da mediana do import app")
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(json.dumps(medir_partida()))
+        return
+
+    rodadas = [_em_processo_novo() for _ in range(args.rodadas)]
+    importar_ms = statistics.median(r["importar"] for r in rodadas) * 1000
+    rotas = " | ".join(
+        f"{nome} {statistics.median(r['rotas'][nome] for r in rodadas) * 1000:.0f} ms" for nome in rodadas[0]["rotas"]
+    )
+    pesados = sorted({m for r in rodadas for m in r["pesados"]})
+    print(f"import app {importar_ms:.0f} ms (orçamento {args.orcamento_ms:.0f} ms) | {rotas} | {args.rodadas} rodadas")
+
+    falhas = []
+    if importar_ms > args.orcamento_ms:
+        falhas.append(f"import app levou {importar_ms:.0f} ms, acima do orçamento de {args.orcamento_ms:.0f} ms")
+    if pesados:
+        falhas.append("módulos pesados carregados na partida: " + ", ".join(pesados))
+    for falha in falhas:
+        print("FALHOU:", falha)
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
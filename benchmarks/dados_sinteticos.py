@@ -0,0 +1,206 @@
+# benchmarks/dados_sinteticos.py
+"""
+Entradas sintéticas para o calcular_comissoes: as dez fontes, com as colunas que o
+cálculo usa (as mesmas de ingestao.COLUNAS_POR_FONTE) e os casos especiais do motor
+(códigos da mesa/líder/capitão, desconto de transferência, BM&F, débitos do lan_man...).
+
+    from dados_sinteticos import gerar_entradas
+    dados = gerar_entradas(n_pj1=100_000, n_assessores=300)
+"""
+from __future__ import annotations
+
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ingestao import COLUNAS_POR_FONTE  # noqa: E402
+
+# códigos com regra própria no motor (mesa RV/RF/trader, líder, capitão, débitos do lan_man)
+CODIGOS_ESPECIAIS = ["A21426", "A54626", "A39437", "A53030", "A70108", "A97601", "A50753"]
+
+# nome de arquivo que o classificar_arquivos reconhece para cada fonte
+NOMES_ARQUIVOS = {
+    "pj1": "Relatorio PJ1.xlsx",
+    "seg": "Seguro PJ.xlsx",
+    "cam": "Cambio.xlsx",
+    "co_ter": "Co-corretagem Terceiras.xlsx",
+    "co_xpvp": "Co-corretagem XPVP.xlsx",
+    "cre": "Credito.xlsx",
+    "xpcs": "XPCS.xlsx",
+    "lan_man": "Lancamentos Manuais.xlsx",
+    "tim_rep": "Times e Repasses.xlsx",
+    "lan_pro": "Lancamento de Produtos.xlsx",
+}
+
+_CATEGORIAS_PJ1 = ["Renda Variável", "Produtos Financeiros", "Fundos Imobiliários", "Renda Fixa", "Previdência", "Campanhas"]
+_PESOS_CATEGORIAS_PJ1 = [0.3, 0.1, 0.1, 0.3, 0.15, 0.05]
+
+# (produto, peso) — inclui as exceções do motor (BM&F, COE, FIIs, campanhas, desconto)
+_PRODUTOS_PJ1 = [
+    ("Ações", 0.22),
+    ("BM&F", 0.06),
+    ("BM&F Mini", 0.04),
+    ("BM&F Self Service", 0.02),
+    ("BM&F Ontick", 0.02),
+    ("COE", 0.06),
+    ("CDB", 0.16),
+    ("Tesouro Direto", 0.08),
+    ("BOVESPA FIIs Risco", 0.03),
+    ("BOVESPA FIIs Empacotados", 0.02),
+    ("Fundos", 0.14),
+    ("Campanha COE", 0.01),
+    ("Campanha Renda Variável", 0.01),
+    ("Desconto de Transferência de Clientes", 0.13),
+]
+
+_COLUNAS_PERCENTUAIS_TIM_REP = [c for c in COLUNAS_POR_FONTE["tim_rep"] if c.startswith("%")]
+
+
+def codigos_assessores(n_assessores: int) -> list[str]:
+    """Os códigos especiais + `n_assessores` códigos comuns ("A10000", "A10001", ...)."""
+    return CODIGOS_ESPECIAIS + [f"A{10000 + i}" for i in range(n_assessores)]
+
+
+def _codigos_das_linhas(rng, codigos: np.ndarray, n: int) -> np.ndarray:
+    # alguns assessores concentram a maior parte das linhas (como num mês real);
+    # ~0,5% das linhas vêm com código fora do tim_rep
+    pesos = rng.pareto(1.5, len(codigos)) + 1
+    escolhidos = rng.choice(codigos, n, p=pesos / pesos.sum())
+    fora = rng.random(n) < 0.005
+    escolhidos[fora] = "A99999"
+    return escolhidos
+
+
+def gerar_tim_rep(rng, codigos: list[str]) -> pd.DataFrame:
+    n = len(codigos)
+    tim_rep = pd.DataFrame({
+        "Código": codigos,
+        "Nome Completo": [f"Assessor {c}" for c in codigos],
+        "Líder": rng.choice(["A53030", "A21426"], n),
+        "Posição": rng.choice(["Assessor", "Sênior", "Trader"], n),
+        "Imposto + Despesa": rng.choice([0.1, 0.15, 0.2], n),
+        "Comisssionado": "Sim",
+    })
+    for col in _COLUNAS_PERCENTUAIS_TIM_REP:
+        tim_rep[col] = rng.choice([0.0, 0.05, 0.1, 0.2, 0.25, 0.3, 0.4, 0.5], n)
+    return tim_rep
+
+
+def gerar_pj1(rng, codigos: np.ndarray, n: int) -> pd.DataFrame:
+    produtos, pesos = zip(*_PRODUTOS_PJ1)
+    pesos = np.array(pesos) / sum(pesos)
+    produto = rng.choice(np.array(produtos), n, p=pesos)
+    comissao = np.round(rng.lognormal(3.5, 1.2, n), 2)
+    # desconto de transferência: a maioria negativo, alguns assessores ficam com soma positiva
+    desconto = produto == "Desconto de Transferência de Clientes"
+    comissao[desconto] *= np.where(rng.random(int(desconto.sum())) < 0.9, -1, 1)
+    dias = rng.integers(1, 29, n)
+
+    return pd.DataFrame({
+        "Data": pd.Series(dias).astype(str).str.zfill(2) + "/03/2025",
+        "Categoria": rng.choice(_CATEGORIAS_PJ1, n, p=_PESOS_CATEGORIAS_PJ1),
+        "Produto": produto,
+        "Cód. Assessor Direto": _codigos_das_linhas(rng, codigos, n),
+        "Cód. Cliente": rng.integers(100_000, 9_999_999, n),
+        "Receita (R$)": np.round(comissao * rng.uniform(1.5, 3.0, n), 2),
+        "Receita Líquida (R$)": np.round(comissao * rng.uniform(1.2, 1.5, n), 2),
+        "Repasse (%) Escritório": rng.choice([30.0, 35.0, 40.0, 50.0], n),
+        "Comissão Bruta (R$) Escritório": comissao,
+        "Comissão (R$) Assessor Direto": np.round(comissao * rng.uniform(0.2, 0.5, n), 2),
+        "Comissão (R$) Assessor Indireto I": np.round(comissao * rng.uniform(0, 0.05, n), 2),
+        "Comissão (R$) Assessor Indireto II": 0.0,
+        "Comissão (R$) Assessor Indireto III": 0.0,
+    })
+
+
+def gerar_linha_negocio(rng, codigos: np.ndarray, n: int, categorias: list[str]) -> pd.DataFrame:
+    """seg/cam/co_ter/co_xpvp/cre/xpcs têm o mesmo layout."""
+    comissao = np.round(rng.lognormal(4, 1, n) * np.where(rng.random(n) < 0.03, -1, 1), 2)
+    return pd.DataFrame({
+        "Código Assessor": _codigos_das_linhas(rng, codigos, n),
+        "Categoria": rng.choice(categorias, n),
+        "Código Cliente": rng.integers(100_000, 9_999_999, n),
+        "Receita Bruta": np.round(np.abs(comissao) * rng.uniform(1.5, 3.0, n), 2),
+        "Receita Líquida": np.round(np.abs(comissao) * rng.uniform(1.2, 1.5, n), 2),
+        "Comissão (%) Escritório": rng.choice([0.3, 0.4, 0.5], n),
+        "Comissão Escritório": comissao,
+    })
+
+
+def gerar_lan_man(rng, codigos: np.ndarray, n: int) -> pd.DataFrame:
+    lan_man = pd.DataFrame({
+        "Código": _codigos_das_linhas(rng, codigos, n),
+        "Categoria": rng.choice(["Ajuste", "Bônus", "Reembolso"], n),
+        "Produto": rng.choice(["Bônus de meta", "Estorno", "Despesa de evento"], n),
+        "Nome Completo": "Fulano de Tal",
+        "Valor": np.round(rng.normal(0, 800, n), 2),
+        "Debitar de": rng.choice(np.array([None, "A97601", "A50753", codigos[-1]], dtype=object), n, p=[0.7, 0.1, 0.1, 0.1]),
+    })
+    # os códigos com ajuste de débito sempre aparecem
+    lan_man.loc[0, "Código"] = "A50753"
+    lan_man.loc[1, "Código"] = "A97601"
+    return lan_man
+
+
+def gerar_lan_pro(rng, codigos: np.ndarray, n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Código do Assessor": _codigos_das_linhas(rng, codigos, n),
+        "Categoria": rng.choice(["seguro auto", "cripto", "consorcio", "convenio", "mesa"], n),
+        "Produto": rng.choice(np.array(["Seguro Auto", "Bitcoin", "Consórcio Imóvel", None], dtype=object), n),
+        "Cliente": rng.integers(100_000, 9_999_999, n),
+        "Comissão Escritório": np.round(rng.lognormal(4, 1, n), 2),
+    })
+
+
+def gerar_entradas(
+    n_pj1: int = 10_000,
+    n_assessores: int = 200,
+    n_linhas: int | None = None,
+    n_lancamentos: int | None = None,
+    seed: int = 0,
+) -> dict[str, pd.DataFrame]:
+    """
+    As dez fontes de um mês sintético, na ordem dos parâmetros do calcular_comissoes.
+    `n_linhas`: linhas de cada uma das seis linhas de negócio (padrão: 5% do PJ1).
+    `n_lancamentos`: linhas de lan_man e de lan_pro (padrão: 1% do PJ1, no mínimo 50).
+    """
+    rng = np.random.default_rng(seed)
+    if n_linhas is None:
+        n_linhas = max(100, n_pj1 // 20)
+    if n_lancamentos is None:
+        n_lancamentos = max(50, n_pj1 // 100)
+
+    lista_codigos = codigos_assessores(n_assessores)
+    codigos = np.array(lista_codigos, dtype=object)
+
+    dados = dict(
+        pj1=gerar_pj1(rng, codigos, n_pj1),
+        seg=gerar_linha_negocio(rng, codigos, n_linhas, ["Seguro de Vida", "Seguro Empresarial"]),
+        cam=gerar_linha_negocio(rng, codigos, n_linhas, ["Câmbio Turismo", "Câmbio Comercial"]),
+        co_ter=gerar_linha_negocio(rng, codigos, n_linhas, ["Co-corretagem Terceiras"]),
+        co_xpvp=gerar_linha_negocio(rng, codigos, n_linhas, ["Co-corretagem XPVP"]),
+        cre=gerar_linha_negocio(rng, codigos, n_linhas, ["Crédito Consignado", "Crédito Imobiliário"]),
+        xpcs=gerar_linha_negocio(rng, codigos, n_linhas, ["XPCS"]),
+        lan_man=gerar_lan_man(rng, codigos, n_lancamentos),
+        tim_rep=gerar_tim_rep(rng, lista_codigos),
+        lan_pro=gerar_lan_pro(rng, codigos, n_lancamentos),
+    )
+
+    # mesmos dtypes que a ingestão declara (texto como str, valores como float64)
+    for chave, df in dados.items():
+        for col, dtype in COLUNAS_POR_FONTE[chave].items():
+            if dtype is not None:
+                df[col] = df[col].astype(dtype)
+        dados[chave] = df[list(COLUNAS_POR_FONTE[chave])]
+    return dados
+
+
+def para_xlsx(df: pd.DataFrame) -> bytes:
+    buf = BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
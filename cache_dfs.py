@@ -0,0 +1,79 @@
+# cache_dfs.py
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # só nas anotações: o app importa este módulo sem carregar o pandas
+    import pandas as pd
+
+
+def tamanho_df(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class CacheDataFrames:
+    """
+    Cache LRU em memória de DataFrames já baixados e lidos do Supabase.
+
+    A chave é o caminho no bucket; cada entrada guarda também a "versão" do objeto
+    (ETag / updated_at). Se a versão mudou no storage, a entrada é descartada.
+    Quando a soma dos tamanhos passa de `limite_bytes`, sai quem foi usado há mais tempo.
+    """
+
+    def __init__(self, limite_bytes: int):
+        self.limite_bytes = limite_bytes
+        self._itens: OrderedDict[str, tuple[object, pd.DataFrame, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def bytes_usados(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    def obter(self, path: str, versao, copiar: bool = True) -> pd.DataFrame | None:
+        if versao is None:
+            return None
+        with self._lock:
+            item = self._itens.get(path)
+            if item is None:
+                return None
+            if item[0] != versao:
+                self._remover(path)
+                return None
+            self._itens.move_to_end(path)
+            df = item[1]
+        # devolve cópia: as rotas alteram o df (round, drop...) depois de ler
+        return df.copy() if copiar else df
+
+    def guardar(self, path: str, versao, df: pd.DataFrame):
+        if versao is None:
+            return
+        tamanho = tamanho_df(df)
+        if tamanho > self.limite_bytes:
+            return
+        with self._lock:
+            if path in self._itens:
+                self._remover(path)
+            self._itens[path] = (versao, df.copy(), tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.limite_bytes and self._itens:
+                self._remover(next(iter(self._itens)))
+
+    def invalidar(self, path: str):
+        with self._lock:
+            if path in self._itens:
+                self._remover(path)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+
+    def _remover(self, path: str):
+        _, _, tamanho = self._itens.pop(path)
+        self._bytes -= tamanho
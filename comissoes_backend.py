@@ -4,6 +4,11 @@ import numpy as np
 from pandas.tseries.offsets import MonthEnd
 import locale
 
+from ingestao import FonteEmBlocos
+from memo_resultados import MemoResultados, chave_resultado, impressao_df
+from perfil import cronometro
+from regras_assessores import RegrasAssessores, RegraMesa, carregar_regras
+
 # locale seguro
 for loc in ['pt_BR.UTF-8', 'pt_BR.utf8', 'pt_BR', 'Portuguese_Brazil.1252']:
     try:
@@ -13,20 +18,126 @@ for loc in ['pt_BR.UTF-8', 'pt_BR.utf8', 'pt_BR', 'Portuguese_Brazil.1252']:
         continue
 
 
+# fontes que viram um "ramo" (resultado por assessor guardado separadamente)
+FONTES_RAMOS = ["pj1", "seg", "cam", "co_ter", "co_xpvp", "cre", "xpcs", "lan_man", "lan_pro"]
+
+# muda quando o formato dos ramos muda (ramos salvos com outra versão são ignorados)
+VERSAO_RAMOS = 2
+
+# muda quando o resultado do cálculo (ou a leitura das fontes) muda: resultados
+# memorizados com outra versão não são usados
+VERSAO_MOTOR = f"1/ramos-{VERSAO_RAMOS}"
+
+# resultados já calculados, em disco (memo_resultados.py)
+MEMO = MemoResultados()
+
+# coluna do df_final (linha do líder, regras_assessores) que recebe o total líder de cada ramo (seção 9)
+COLUNAS_LIDER_POR_RAMO = {
+    "pj1": "Valor Assessor PJ1",
+    "seg": "Valor Assessor Seguro",
+    "cam": "Valor Assessor Câmbio",
+    "co_ter": "Valor Assessor Co-Corretagem Terceiras",
+    "cre": "Valor Assessor Crédito",
+    "xpcs": "Valor Assessor XPCS",
+    "co_xpvp": "Valor Assessor Co-Corretagem XPVP",
+    "lan_pro": "Valor Lançamentos Produtos",
+}
+
+
 def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_rep, lan_pro):
-    # ======================
-    # 0) Cópias
-    # ======================
-    pj1 = pj1.copy()
-    seg = seg.copy()
-    cam = cam.copy()
-    co_ter = co_ter.copy()
-    co_xpvp = co_xpvp.copy()
-    cre = cre.copy()
-    xpcs = xpcs.copy()
-    lan_man = lan_man.copy()
+    """Com as mesmas dez entradas (e regras) de um cálculo anterior, devolve o resultado do MEMO."""
+    regras = carregar_regras()
+    entradas = dict(pj1=pj1, seg=seg, cam=cam, co_ter=co_ter, co_xpvp=co_xpvp, cre=cre, xpcs=xpcs, lan_man=lan_man, tim_rep=tim_rep, lan_pro=lan_pro)
+    chave = None
+    if MEMO.ativo:
+        chave = chave_resultado({k: impressao_df(df) for k, df in entradas.items()}, VERSAO_MOTOR, regras.assinatura)
+        memo = MEMO.obter(chave)
+        if memo is not None:
+            return memo[0], memo[1]
+    ramos = calcular_ramos(**entradas, regras=regras)
+    df_final, df_juntar = consolidar_ramos(ramos, tim_rep, regras)
+    if chave is not None:
+        MEMO.guardar(chave, df_final, df_juntar, ramos)
+    return df_final, df_juntar
+
+
+def calcular_ramos(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_rep, lan_pro, regras: RegrasAssessores | None = None, prontos: dict[str, dict] | None = None) -> dict[str, dict]:
+    """
+    Calcula o resultado de cada fonte separadamente (group por assessor, total líder,
+    linhas do df_juntar). Junte tudo com consolidar_ramos.
+    `prontos`: ramos já calculados com o mesmo tim_rep e as mesmas regras (ex.: fonte
+    idêntica à da versão anterior); essas fontes não são recalculadas (podem vir None).
+    """
+    regras = regras or carregar_regras()
+    fontes = dict(pj1=pj1, seg=seg, cam=cam, co_ter=co_ter, co_xpvp=co_xpvp, cre=cre, xpcs=xpcs, lan_man=lan_man, lan_pro=lan_pro)
+    marca = cronometro("ramos ", tim_rep)
+    repasses = preparar_repasses(tim_rep)
+    marca("1) times e repasses", repasses.tim_rep)
+
+    ramos = {f: prontos[f] for f in FONTES_RAMOS if f in (prontos or {})}
+    bases = {f: fontes[f] for f in LINHAS_NEGOCIO if f not in ramos}
+    if bases:
+        marca = cronometro("ramos ", sum(len(df) for df in bases.values()))
+        ramos.update(_ramos_linhas(bases, repasses))
+        marca("3) " + "/".join(bases), sum(len(ramos[f]["juntar"]) for f in bases))
+
+    for fonte in FONTES_RAMOS:
+        if fonte not in ramos:
+            marca = cronometro("ramos ", fontes[fonte])
+            ramos[fonte] = calcular_ramo(fonte, fontes[fonte], repasses, regras)
+            marca(fonte, ramos[fonte]["juntar"])
+    return {fonte: ramos[fonte] for fonte in FONTES_RAMOS}
+
+
+def recalcular_ramos(ramos: dict[str, dict], fonte: str, df: pd.DataFrame, tim_rep: pd.DataFrame, regras: RegrasAssessores | None = None) -> dict[str, dict]:
+    """
+    Recalcula só o ramo de `fonte` (com o df novo) e devolve o novo dict de ramos.
+    Trocar tim_rep muda quase todos os ramos: nesse caso use calcular_ramos com todas as fontes.
+    """
+    if fonte not in FONTES_RAMOS:
+        raise ValueError(f"fonte sem ramo próprio: {fonte}")
+    marca = cronometro("ramos ", df)
+    repasses = preparar_repasses(tim_rep)
+    novos = dict(ramos)
+    novos[fonte] = calcular_ramo(fonte, df, repasses, regras)
+    marca(f"recalcular {fonte}", novos[fonte]["juntar"])
+    return novos
+
+
+def calcular_ramo(fonte: str, df: pd.DataFrame, repasses: "TabelaRepasses", regras: RegrasAssessores | None = None) -> dict:
+    """`repasses` já preparado por preparar_repasses; `regras` padrão: carregar_regras()."""
+    regras = regras or carregar_regras()
+    if fonte == "pj1":
+        if isinstance(df, FonteEmBlocos):
+            return _ramo_pj1_em_blocos(df, repasses, regras)
+        return _ramo_pj1(df.copy(), repasses, regras)
+    if fonte in LINHAS_NEGOCIO:
+        return _ramos_linhas({fonte: df}, repasses)[fonte]
+    if fonte == "lan_man":
+        return _ramo_lan_man(df.copy(), regras)
+    if fonte == "lan_pro":
+        return _ramo_lan_pro(df.copy(), repasses)
+    raise ValueError(f"fonte desconhecida: {fonte}")
+
+
+# coluna de % do tim_rep (já renomeada) -> tipo de repasse
+TIPOS_REPASSE = {
+    'Repasse Investimento RV': 'Investimentos - RV',
+    'Repasse Investimento RF': 'Investimentos - RF',
+    'Repasse Investimento Outros': 'Investimentos - Outros',
+    'Repasse Investimento PJ2': 'PJ2',
+    'Repasse Investimento Líder': 'Líder',
+    'Repasse Investimento Mesa RV': 'Mesa RV',
+    'Repasse Investimento Mesa RF': 'Mesa RF',
+    'Repasse Investimento Co-Corretagem Assessor': 'Co-corretagem - Assessor',
+    'Repasse Investimento Co-Corretagem Capitão': 'Co-corretagem - Capitão',
+    'Repasse Investimento Mesa Trader': 'Mesa Trader',
+    'Repasse Investimento Trader Assessor': 'Trader Assessor'
+}
+
+
+def preparar_repasses(tim_rep: pd.DataFrame) -> "TabelaRepasses":
     tim_rep = tim_rep.copy()
-    lan_pro = lan_pro.copy()
 
     # ======================
     # 1) Times e repasses
@@ -45,222 +156,694 @@ def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_r
         '% Trader Assessor': 'Repasse Investimento Trader Assessor'
     }, axis=1, inplace=True)
 
-    mapa_tipos = {
-        'Repasse Investimento RV': 'Investimentos - RV',
-        'Repasse Investimento RF': 'Investimentos - RF',
-        'Repasse Investimento Outros': 'Investimentos - Outros',
-        'Repasse Investimento PJ2': 'PJ2',
-        'Repasse Investimento Líder': 'Líder',
-        'Repasse Investimento Mesa RV': 'Mesa RV',
-        'Repasse Investimento Mesa RF': 'Mesa RF',
-        'Repasse Investimento Co-Corretagem Assessor': 'Co-corretagem - Assessor',
-        'Repasse Investimento Co-Corretagem Capitão': 'Co-corretagem - Capitão',
-        'Repasse Investimento Mesa Trader': 'Mesa Trader',
-        'Repasse Investimento Trader Assessor': 'Trader Assessor'
-    }
-
-    colunas_fixas = ['Código', 'Nome Completo', 'Líder', 'Posição', 'Imposto + Despesa', 'Comisssionado']
+    return TabelaRepasses(tim_rep)
+
+
+# ======================
+# Textos repetidos como Categorical
+# ======================
+def _dicionario(*valores) -> pd.CategoricalDtype | None:
+    """
+    CategoricalDtype com os valores distintos (sem NaN) de todas as `valores`, em ordem:
+    o groupby(observed=True) por uma coluna nele sai na mesma ordem do groupby pelo
+    texto. None se algum não for str (ex.: object do read_excel sem dtypes, onde None e
+    NaN não voltariam iguais do Categorical): a coluna fica como veio.
+    """
+    partes = [pd.Index(pd.unique(pd.Series(v))) for v in valores]
+    if not partes or not all(isinstance(p.dtype, pd.StringDtype) for p in partes):
+        return None
+    return pd.CategoricalDtype(partes[0].append(partes[1:]).unique().dropna().sort_values())
+
+
+def _categorizar(serie: pd.Series, tipo: pd.CategoricalDtype | None) -> pd.Series:
+    """`serie` como Categorical do dicionário `tipo`; como está se `tipo` é None ou não tem todos os valores."""
+    if tipo is None or isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    cod, unicos = pd.factorize(serie)
+    pos = tipo.categories.get_indexer(unicos)
+    if (pos < 0).any():
+        return serie
+    return pd.Series(pd.Categorical.from_codes(np.append(pos, -1)[cod], dtype=tipo), index=serie.index, name=serie.name)
+
+
+def _por_categoria(buscar, valores) -> np.ndarray:
+    """buscar(valores), uma posição por linha. Coluna Categorical: busca só as categorias (e o NaN) e espalha pelos códigos."""
+    if isinstance(valores, pd.Series) and isinstance(valores.dtype, pd.CategoricalDtype):
+        por_categoria = buscar(pd.Index(list(valores.cat.categories) + [np.nan]))
+        # código -1 (NaN) pega a última
+        return por_categoria[valores.cat.codes.to_numpy()]
+    return buscar(valores)
+
+
+class TabelaRepasses:
+    """
+    tim_rep indexado por código, montado uma vez por cálculo.
+
+    Substitui os merges com tim_rep / repasse_linhas (o tim_rep "derretido" por tipo):
+    cada fonte procura a posição dos seus códigos uma vez (`indices`) e pega os valores
+    por posição. `percentuais` é a matriz densa código x tipo de repasse (colunas na
+    ordem de TIPOS_REPASSE).
+
+    Código repetido no tim_rep continua repetindo a linha da fonte, como no merge left:
+    por isso `expandir` devolve, além das posições, as linhas da fonte a repetir.
+    """
+
+    def __init__(self, tim_rep: pd.DataFrame):
+        self.tim_rep = tim_rep
+        cod, unicos = pd.factorize(tim_rep["Código"], use_na_sentinel=False)
+        self._unicos = pd.Index(unicos)
+        self._qtd = np.bincount(cod, minlength=len(unicos))
+        self._inicio = np.cumsum(self._qtd) - self._qtd
+        # linhas do tim_rep agrupadas por código, na ordem original (igual ao merge)
+        self._ordem = np.argsort(cod, kind="stable")
+        self._repetidos = bool((self._qtd > 1).any())
+
+        self._tipos = pd.Index(list(TIPOS_REPASSE.values()))
+        self._col_tipo = {}
+        for j, (coluna, tipo) in enumerate(TIPOS_REPASSE.items()):
+            self._col_tipo[coluna] = self._col_tipo[tipo] = j
+        self.percentuais = tim_rep[list(TIPOS_REPASSE)].to_numpy(dtype=np.float64)
+
+    def indices(self, codigos) -> np.ndarray:
+        """Código distinto de cada linha (-1 = fora do tim_rep). NaN casa com NaN, como no merge."""
+        return _por_categoria(self._unicos.get_indexer, codigos)
+
+    def expandir(self, indices: np.ndarray, validos=None) -> tuple[np.ndarray | None, np.ndarray]:
+        """
+        Equivalente ao merge left pelos `indices`. Devolve (repetir, pos):
+        `repetir` é None se nenhuma linha se repete (o caso normal, código único);
+        senão, as linhas da fonte na ordem do merge. `pos` é a linha do tim_rep de
+        cada linha do resultado (-1 = sem par). `validos=False` força "sem par"
+        (tipo de repasse que não existe no tim_rep).
+        """
+        u = np.asarray(indices)
+        if validos is not None:
+            u = np.where(validos, u, -1)
+        achou = u >= 0
+        u0 = np.where(achou, u, 0)
+        if not len(self._unicos):
+            return None, np.full(len(u), -1, dtype=np.int64)
+
+        if self._repetidos:
+            qtd = np.where(achou, self._qtd[u0], 1)
+            if not (qtd == 1).all():
+                repetir = np.repeat(np.arange(len(u)), qtd)
+                dentro = np.arange(len(repetir)) - np.repeat(np.cumsum(qtd) - qtd, qtd)
+                u0, achou = u0[repetir], achou[repetir]
+                return repetir, np.where(achou, self._ordem[self._inicio[u0] + dentro], -1)
+        return None, np.where(achou, self._ordem[self._inicio[u0]], -1)
+
+    def coluna(self, nome: str, pos: np.ndarray) -> pd.Series:
+        """Coluna do tim_rep nas posições `pos` (NaN onde -1, com o mesmo dtype que o merge daria)."""
+        if not len(self.tim_rep):
+            return pd.Series(np.nan, index=range(len(pos)))
+        valores = self.tim_rep[nome].take(np.where(pos >= 0, pos, 0)).reset_index(drop=True)
+        if (pos < 0).any():
+            valores = valores.where(pd.Series(pos >= 0))
+        return valores
+
+    def percentual(self, pos: np.ndarray, tipo) -> np.ndarray:
+        """
+        % de repasse nas posições `pos`. `tipo` é um tipo/coluna só ou o array de
+        indices_tipo de cada linha; tipo desconhecido (-1) dá NaN, como no merge com repasse_linhas.
+        Um tipo só que não está em TIPOS_REPASSE (mesa nova das regras) vem da coluna
+        "% <tipo>" do tim_rep, se existir.
+        """
+        if isinstance(tipo, str) and tipo not in self._col_tipo and f"% {tipo}" in self.tim_rep.columns:
+            valores = pd.to_numeric(self.coluna(f"% {tipo}", pos), errors="coerce")
+            return valores.to_numpy(dtype=np.float64, na_value=np.nan)
+        if isinstance(tipo, str):
+            j = np.full(len(pos), self._col_tipo.get(tipo, -1))
+        else:
+            j = np.asarray(tipo)
+        ok = (pos >= 0) & (j >= 0)
+        out = self.percentuais[np.where(ok, pos, 0), np.where(ok, j, 0)] if len(self.percentuais) else np.zeros(len(pos))
+        return np.where(ok, out, np.nan)
+
+    def indices_tipo(self, tipos) -> np.ndarray:
+        """Coluna de `percentuais` de cada tipo (-1 = tipo que não existe)."""
+        return _por_categoria(self._tipos.get_indexer, tipos)
+
+
+# ======================
+# 3) Bases (seg/cam/co_ter/co_xpvp/cre/xpcs)
+# ======================
+# fonte -> valores calculados (coluna -> % do tim_rep aplicado), fillna,
+#          colunas percentual/valor usadas no df_juntar
+LINHAS_NEGOCIO = {
+    "seg": dict(
+        valores={"Valor Assessor Seguro": "Repasse Investimento Co-Corretagem Assessor", "Valor Capitão Seguro": "Repasse Investimento Co-Corretagem Capitão"},
+        fillna=True,
+        juntar=("Repasse Investimento Co-Corretagem Capitão", "Valor Assessor Seguro"),
+    ),
+    "cam": dict(
+        valores={"Valor Assessor Câmbio": "Repasse Investimento PJ2"},
+        fillna=True,
+        juntar=("Repasse Investimento PJ2", "Valor Assessor Câmbio"),
+    ),
+    "co_ter": dict(
+        valores={"Valor Assessor Co-Corretagem Terceiras": "Repasse Investimento Co-Corretagem Assessor", "Valor Capitão Co-Corretagem Terceiras": "Repasse Investimento Co-Corretagem Capitão"},
+        fillna=True,
+        juntar=("Repasse Investimento Co-Corretagem Assessor", "Valor Assessor Co-Corretagem Terceiras"),
+    ),
+    "co_xpvp": dict(
+        valores={"Valor Assessor Co-Corretagem XPVP": "Repasse Investimento PJ2"},
+        fillna=False,
+        juntar=("Repasse Investimento PJ2", "Valor Assessor Co-Corretagem XPVP"),
+    ),
+    "cre": dict(
+        valores={"Valor Assessor Crédito": "Repasse Investimento PJ2"},
+        fillna=True,
+        juntar=("Repasse Investimento PJ2", "Valor Assessor Crédito"),
+    ),
+    "xpcs": dict(
+        valores={"Valor Assessor XPCS": "Repasse Investimento PJ2"},
+        fillna=True,
+        juntar=("Repasse Investimento PJ2", "Valor Assessor XPCS"),
+    ),
+}
+
+
+def _ramos_linhas(bases: dict[str, pd.DataFrame], repasses: "TabelaRepasses") -> dict[str, dict]:
+    """
+    Seção 3 das seis linhas (seg/cam/co_ter/co_xpvp/cre/xpcs) de uma vez.
+
+    Em vez de um merge com tim_rep por fonte, cada fonte procura só os seus códigos
+    distintos no índice de `repasses` e cada linha pega os valores por posição.
+    Valor/líder das seis vão para um groupby único por (linha de negócio, assessor).
+    No fim cada fonte continua com seu ramo (group/lider/juntar).
+    """
+    fontes = [f for f in LINHAS_NEGOCIO if f in bases]
+    if not fontes:
+        return {}
+
+    # ---- códigos distintos de cada fonte (grupo = deslocamento + código)
+    unicos, deslocamentos, posicoes = [], {}, {}
+    total = 0
+    for fonte in fontes:
+        # mesma ordem do groupby (ordenado); NaN fica no fim e não vira grupo
+        cod, uni = pd.factorize(bases[fonte]["Código Assessor"], sort=True, use_na_sentinel=False)
+        uni = pd.Series(uni, dtype=bases[fonte]["Código Assessor"].dtype)
+        deslocamentos[fonte] = total
+        unicos.append(uni)
+        total += len(uni)
+
+        # linha de origem e linha do tim_rep de cada linha do resultado (igual ao merge
+        # left: código repetido em tim_rep repete a linha da fonte)
+        origem, pos_tim = repasses.expandir(repasses.indices(uni)[cod])
+        grupo = cod + deslocamentos[fonte]
+        if origem is not None:
+            grupo = grupo[origem]
+        posicoes[fonte] = (origem, grupo, pos_tim)
+
+    # entradas do groupby único, já alocadas para as seis fontes
+    n_total = sum(len(g) for _, g, _ in posicoes.values())
+    chave_grupo = np.empty(n_total, dtype=np.int64)
+    soma_v0 = np.empty(n_total)
+    soma_v1 = np.full(n_total, np.nan)
+    soma_lider = np.empty(n_total)
+
+    juntares = {}
+    fim = 0
+    for fonte in fontes:
+        cfg = LINHAS_NEGOCIO[fonte]
+        base = bases[fonte]
+        origem, grupo, pos_tim = posicoes[fonte]
+
+        juntar = base[["Código Assessor","Categoria","Código Cliente","Receita Bruta","Receita Líquida","Comissão (%) Escritório","Comissão Escritório"]]
+        juntar = (juntar if origem is None else juntar.iloc[origem]).reset_index(drop=True)
+
+        # a coluna pode vir object (planilha com célula vazia/texto numérico): float64 antes do np.isnan
+        comissao = pd.to_numeric(juntar["Comissão Escritório"]).to_numpy(dtype=np.float64, na_value=np.nan)
+        imposto = repasses.coluna("Imposto + Despesa", pos_tim)
+        imp = imposto.to_numpy(dtype=np.float64)
+        valor_imposto = comissao * imp
+        sem_imposto = comissao - (comissao * imp)
+
+        valores = []
+        for col_perc in cfg["valores"].values():
+            v = sem_imposto * repasses.percentual(pos_tim, col_perc)
+            valores.append(np.where(np.isnan(v), 0.0, v) if cfg["fillna"] else v)
+
+        inicio, fim = fim, fim + len(grupo)
+        chave_grupo[inicio:fim] = grupo
+        soma_v0[inicio:fim] = valores[0]
+        if len(valores) > 1:
+            soma_v1[inicio:fim] = valores[1]
+        soma_lider[inicio:fim] = sem_imposto * repasses.percentual(pos_tim, "Repasse Investimento Líder")
+
+        # 11) df_juntar: colunas da própria fonte + calculadas
+        col_perc_juntar, col_valor_juntar = cfg["juntar"]
+        juntar["Imposto + Despesa"] = imposto.array
+        juntar["Valor Imposto"] = valor_imposto
+        juntar["Sem Imposto"] = sem_imposto
+        juntar["percentual"] = repasses.percentual(pos_tim, col_perc_juntar)
+        juntar["Valor Assessor"] = valores[list(cfg["valores"]).index(col_valor_juntar)]
+        juntar["Valor Escritório"] = juntar["Comissão (%) Escritório"] * juntar["Sem Imposto"]
+        juntares[fonte] = juntar
+
+    # ---- 7) e 9) juntos: um groupby por (linha, assessor) para as seis fontes
+    # (o grupo do NaN, se existir, é descartado abaixo: o groupby original o ignorava)
+    somas = pd.DataFrame(
+        {"v0": soma_v0, "v1": soma_v1, "lider": soma_lider}, copy=False
+    ).groupby(chave_grupo).sum()
+
+    ramos = {}
+    for fonte, uni in zip(fontes, unicos):
+        cfg = LINHAS_NEGOCIO[fonte]
+
+        ids = deslocamentos[fonte] + np.arange(len(uni))
+        s = somas.loc[ids[~pd.isna(uni).to_numpy()]]
+
+        group = pd.DataFrame({"Código Assessor": uni[~pd.isna(uni)].reset_index(drop=True)})
+        for j, col_valor in enumerate(cfg["valores"]):
+            group[col_valor] = s[f"v{j}"].to_numpy()
+
+        ramos[fonte] = dict(group=group, lider=s["lider"].sum(), juntar=juntares[fonte])
+    return ramos
+
+
+def _linhas_das_mesas(pj1_final: pd.DataFrame, mesas: tuple[RegraMesa, ...]) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    (linhas que entram no %, linhas com valor zerado) de cada mesa. Os filtros de
+    produto e tipo são avaliados uma vez por valor distinto (são poucos) e espalhados
+    pelas linhas, em vez de uma varredura de texto do PJ1 por regra.
+    """
+    cod_prod, produtos = pd.factorize(pj1_final["Produto"])
+    cod_tipo, tipos = pd.factorize(pj1_final["Tipo Repasse Baseado na Categoria"])
+    produtos, tipos = pd.Series(np.asarray(produtos, dtype=object)).astype(str), pd.Index(np.asarray(tipos, dtype=object))
+
+    def por_produto(ok: np.ndarray) -> np.ndarray:
+        # produto vazio (-1) cai no False do fim
+        return np.append(ok, False)[cod_prod]
+
+    contem = {}
+
+    def produto_contem(trecho: str) -> np.ndarray:
+        if trecho not in contem:
+            contem[trecho] = por_produto(produtos.str.contains(trecho, case=False, na=False).to_numpy(dtype=bool))
+        return contem[trecho]
+
+    resultado = []
+    for mesa in mesas:
+        entra = np.ones(len(pj1_final), dtype=bool)
+        if mesa.tipos:
+            entra &= np.append(tipos.isin(mesa.tipos), False)[cod_tipo]
+        if mesa.produto_contem is not None:
+            entra &= produto_contem(mesa.produto_contem)
+        if mesa.produto_nao_contem is not None:
+            entra &= ~produto_contem(mesa.produto_nao_contem)
+
+        zerar = por_produto(produtos.isin(mesa.zerar_produtos).to_numpy())
+        for codigo, lista in mesa.zerar_produtos_do_assessor:
+            linhas = np.flatnonzero(por_produto(produtos.isin(lista).to_numpy()))
+            zerar[linhas[(pj1_final["Cód. Assessor Direto"].iloc[linhas] == codigo).to_numpy(dtype=bool)]] = True
+        resultado.append((entra, zerar))
+    return resultado
+
+
+# produtos que ficam fora do group do PJ1 e da base do desconto de transferência
+PRODUTOS_FORA_PJ1 = ['Campanha COE','Campanha Renda Variável','Campanhas','Desconto de Transferência de Clientes']
+
+_COLUNAS_JUNTAR_PJ1 = ["Cód. Assessor Direto","Categoria","Produto","Cód. Cliente","Receita (R$)","Receita Líquida (R$)","Repasse (%) Escritório","Desconto de Transferência de Clientes Fracionado","Comissão Escritório Tratada","Imposto + Despesa","Valor Imposto","Sem Imposto"]
+
+_RENOMEAR_JUNTAR_PJ1 = {
+    "Cód. Assessor Direto":"Código Assessor",
+    "Cód. Cliente":"Código Cliente",
+    "Receita (R$)":"Receita Bruta",
+    "Receita Líquida (R$)":"Receita Líquida",
+    "Repasse (%) Escritório":"Comissão (%) Escritório",
+    "Comissão Escritório Tratada":"Comissão Escritório",
+}
+
+# coluna do pj1_final -> coluna do df_juntar (mesas e líder usam as mesmas, sem "Valor Escritório")
+_COLUNAS_JUNTAR_PJ1_SAIDA = {
+    **{c: _RENOMEAR_JUNTAR_PJ1.get(c, c) for c in _COLUNAS_JUNTAR_PJ1},
+    "percentual tratado":"percentual",
+    "Valor Assessor Direto":"Valor Assessor",
+}
+
+# colunas de texto do PJ1 que o cálculo usa como Categorical (um dicionário ordenado por
+# coluna, o mesmo em todos os frames/blocos do ramo) e devolve no dtype de entrada
+_TEXTOS_PJ1 = ["Cód. Assessor Direto","Categoria","Produto"]
+_PRODUTO_DESCONTO_POSITIVO = "Desconto de Transferência de Clientes Positivo"
+
+_MAPA_CATEGORIA_REPASSE_PJ1 = {
+    "Renda Variável": "Investimentos - RV",
+    "Produtos Financeiros": "Investimentos - RV",
+    "Fundos Imobiliários": "Investimentos - RV",
+    "Renda Fixa": "Investimentos - RF"
+}
+
+_TIPO_PJ = pd.CategoricalDtype(["PJ1","PJ2"])
+_TIPO_REPASSE_PJ1 = pd.CategoricalDtype(sorted({*_MAPA_CATEGORIA_REPASSE_PJ1.values(), "Investimentos - Outros", "PJ2"}))
+
+
+def _dicionarios_pj1(distintos: dict[str, list]) -> dict[str, pd.CategoricalDtype | None]:
+    """Dicionário de cada coluna de _TEXTOS_PJ1, dos valores `distintos` (coluna -> partes) de todo o PJ1."""
+    tipos = {c: _dicionario(*distintos[c]) for c in _TEXTOS_PJ1}
+    if tipos["Produto"] is not None:
+        tipos["Produto"] = _dicionario(tipos["Produto"].categories, pd.Index([_PRODUTO_DESCONTO_POSITIVO]))
+    return tipos
+
+
+def _textos_de_entrada(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Colunas Categorical de `df` de volta ao dtype de entrada (`dtypes`: coluna do df_juntar -> dtype)."""
+    for col, dtype in dtypes.items():
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            # take nas categorias: bem mais rápido que o astype do Categorical inteiro
+            cat = df[col].array
+            df[col] = pd.Series(cat.categories.array.take(cat.codes, allow_fill=True), index=df.index).astype(dtype)
+    return df
+
+
+def _ramo_pj1(pj1, repasses, regras):
+    marca = cronometro("pj1 ", pj1)
+
+    entrada = {_COLUNAS_JUNTAR_PJ1_SAIDA[c]: pj1[c].dtype for c in _TEXTOS_PJ1}
+    pj1 = _pj1_base(pj1, textos=_dicionarios_pj1({c: [pj1[c]] for c in _TEXTOS_PJ1}))
+    marca("2) base", pj1)
+
+    pj1_desc_4, pj1_desc_pos = _pj1_descontos(*_pj1_partes_desconto(pj1))
+    pj1_final = _pj1_com_desconto(pj1, pj1_desc_4, pj1_desc_pos)
+    marca("4) desconto transferência", pj1_final)
+
+    pj1_final, cod_tim = _pj1_repasses(pj1_final, repasses, regras)
+    marca("5) repasse + mesa", pj1_final)
+
+    pj1_group = _pj1_group(pj1_final, regras)
+    marca("7) groupby + ajustes mesa", pj1_group)
+
+    pj1_final = _pj1_lider(pj1_final, cod_tim, repasses)
+    lider = _pj1_total_lider(pj1_final)
+    marca("9) líder", pj1_final)
+
+    pj1_juntar, linhas_mesa, repasse_lider = _pj1_juntar(pj1_final, regras)
+    pj1_group, pj1_juntar = _textos_de_entrada(pj1_group, entrada), _textos_de_entrada(pj1_juntar, entrada)
+    marca("11) df_juntar + mesa/líder", len(pj1_juntar) + sum(len(m["linhas"]) for m in linhas_mesa + [repasse_lider]))
+
+    return dict(group=pj1_group, lider=lider, juntar=pj1_juntar, juntar_extra=linhas_mesa + [repasse_lider])
+
+
+def _ramo_pj1_em_blocos(fonte, repasses, regras):
+    """
+    O mesmo _ramo_pj1, lendo o PJ1 aos pedaços (ingestao.FonteEmBlocos) em duas passadas:
+    1) só as colunas do desconto de transferência (proporções por assessor/produto);
+    2) cada bloco passa pelas seções 2, 5, 9 e 11 linha a linha.
+    As somas que dependem da ordem das linhas (groups, mesas, líder) são feitas uma vez
+    no fim, sobre as colunas de valor guardadas de cada bloco, na mesma ordem do cálculo
+    inteiro: o resultado é idêntico ao do _ramo_pj1.
+    """
+    marca = cronometro("pj1 blocos ")
 
-    repasse_linhas = tim_rep.melt(
-        id_vars=colunas_fixas,
-        value_vars=list(mapa_tipos.keys()),
-        var_name='Tipo Repasse Original',
-        value_name='% Repasse'
-    )
-    repasse_linhas['Tipo Repasse'] = repasse_linhas['Tipo Repasse Original'].map(mapa_tipos)
+    # ======================
+    # 1ª passada: base do desconto de transferência
+    # ======================
+    partes_desc, partes_perc = [], []
+    distintos, entrada = {c: [] for c in _TEXTOS_PJ1}, None
+    proximo_id = 1
+    for bloco in fonte.blocos():
+        if entrada is None:
+            entrada = {_COLUNAS_JUNTAR_PJ1_SAIDA[c]: bloco[c].dtype for c in _TEXTOS_PJ1}
+        for c in _TEXTOS_PJ1:
+            distintos[c].append(pd.unique(bloco[c]))
+        bloco["PJ"] = "PJ1"
+        bloco["ID"] = range(proximo_id, proximo_id + len(bloco))
+        proximo_id += len(bloco)
+        desc, perc = _pj1_partes_desconto(bloco)
+        partes_desc.append(desc)
+        partes_perc.append(perc)
+    pj1_desc_4, pj1_desc_pos = _pj1_descontos(pd.concat(partes_desc), pd.concat(partes_perc))
+    # o dicionário de cada texto cobre todos os blocos: as peças se juntam sem voltar a texto
+    textos = _dicionarios_pj1(distintos)
+    del partes_desc, partes_perc, distintos
+    marca("1ª passada (desconto transferência)", proximo_id - 1)
 
+    # ======================
+    # 2ª passada: linha a linha, por bloco
+    # ======================
+    pecas = dict(juntar=[], mesas=[], lider=[], group=[], group_lider=[])
+    colunas_group = ["Cód. Assessor Direto","Produto","Valor Assessor Direto"] + [m.coluna_valor for m in regras.mesas]
+    desc_4_por_id = pj1_desc_4.sort_values("ID", kind="stable")
+    sem_linhas = pj1_desc_pos.iloc[:0]
+
+    def processar(pj1_final):
+        pj1_final, cod_tim = _pj1_repasses(pj1_final, repasses, regras)
+        pecas["group"].append(pj1_final[colunas_group])
+        pj1_final = _pj1_lider(pj1_final, cod_tim, repasses)
+        pecas["group_lider"].append(pj1_final[["Cód. Assessor Direto","Valor Lider"]])
+        pj1_juntar, linhas_mesa, repasse_lider = _pj1_juntar(pj1_final, regras)
+        pecas["juntar"].append(pj1_juntar)
+        pecas["mesas"].append(linhas_mesa)
+        pecas["lider"].append(repasse_lider)
+
+    ids_desc_4 = desc_4_por_id["ID"].to_numpy()
+    proximo_id, vazio = 1, None
+    for bloco in fonte.blocos():
+        bloco = _pj1_base(bloco, primeiro_id=proximo_id, textos=textos)
+        if vazio is None:
+            vazio = bloco.iloc[:0]
+        # só as linhas do desconto desse bloco (a ordem entre elas é a mesma do cálculo inteiro)
+        inicio, fim = np.searchsorted(ids_desc_4, [proximo_id, proximo_id + len(bloco)])
+        proximo_id += len(bloco)
+        processar(_pj1_com_desconto(bloco, desc_4_por_id.iloc[inicio:fim], sem_linhas))
+
+    # as linhas de desconto positivo vão no fim do pj1_final, como no cálculo inteiro
+    processar(_pj1_com_desconto(vazio, pj1_desc_4, pj1_desc_pos))
+    marca("2ª passada (repasse, mesa, líder, df_juntar)", sum(len(p) for p in pecas["juntar"]))
+
+    pj1_group = _textos_de_entrada(_pj1_group(pd.concat(pecas["group"], ignore_index=True), regras), entrada)
+    lider = _pj1_total_lider(pd.concat(pecas["group_lider"], ignore_index=True))
+    pj1_juntar = _textos_de_entrada(pd.concat(pecas["juntar"], ignore_index=True), entrada)
+    inicios = np.cumsum([0] + [len(p) for p in pecas["juntar"]])
+    linhas_mesa = [_pj1_extra_concat(partes, inicios) for partes in zip(*pecas["mesas"])]
+    repasse_lider = _pj1_extra_concat(pecas["lider"], inicios)
+    marca("somas e df_juntar", pj1_group)
+
+    return dict(group=pj1_group, lider=lider, juntar=pj1_juntar, juntar_extra=linhas_mesa + [repasse_lider])
+
+
+def _pj1_base(pj1, primeiro_id=1, textos=None):
+    """`textos`: dicionário de cada coluna de _TEXTOS_PJ1 (_dicionarios_pj1); sem ele os textos ficam como vieram."""
     # ======================
     # 2) PJ1 base
     # ======================
+    for col, tipo in (textos or {}).items():
+        pj1[col] = _categorizar(pj1[col], tipo)
     pj1["Valor Assessor"] = (
         pj1["Comissão (R$) Assessor Direto"]
         + pj1["Comissão (R$) Assessor Indireto I"]
         + pj1["Comissão (R$) Assessor Indireto II"]
         + pj1["Comissão (R$) Assessor Indireto III"]
     )
-    pj1["PJ"] = "PJ1"
-    pj1["ID"] = range(1, len(pj1) + 1)
+    pj1["PJ"] = pd.Categorical.from_codes(np.zeros(len(pj1), dtype=np.int8), dtype=_TIPO_PJ)
+    pj1["ID"] = range(primeiro_id, primeiro_id + len(pj1))
 
-    pj1["Data"] = pd.to_datetime(pj1["Data"], dayfirst=True, errors="coerce")
-    pj1["Data Fechamento"] = pj1["Data"] + MonthEnd(0)
-    pj1["Data"] = pj1["Data"].dt.strftime("%d/%m/%Y")
-    pj1["Data Fechamento"] = pj1["Data Fechamento"].dt.strftime("%d/%m/%Y")
+    # o mês tem no máximo 31 datas distintas: converte cada uma uma vez, não cada linha
+    datas = _por_valor(pj1["Data"], _datas_pj1)
+    pj1["Data"] = datas["Data"]
+    pj1["Data Fechamento"] = datas["Data Fechamento"]
+    return pj1
 
-    # ======================
-    # 3) Bases (seg/cam/co_ter/co_xpvp/cre/xpcs)
-    # ======================
-    seg_final = seg.merge(
-        tim_rep[['Código','Imposto + Despesa','Repasse Investimento Co-Corretagem Assessor','Repasse Investimento Líder',"Repasse Investimento Co-Corretagem Capitão"]],
-        left_on='Código Assessor', right_on='Código', how='left'
-    )
-    seg_final["Valor Imposto"] = seg_final["Comissão Escritório"] * seg_final["Imposto + Despesa"]
-    seg_final["Sem Imposto"] = seg_final["Comissão Escritório"] - (seg_final["Comissão Escritório"] * seg_final["Imposto + Despesa"])
-    seg_final["Valor Assessor Seguro"] = seg_final["Sem Imposto"] * seg_final["Repasse Investimento Co-Corretagem Assessor"]
-    seg_final["Valor Capitão Seguro"] = seg_final["Sem Imposto"] * seg_final["Repasse Investimento Co-Corretagem Capitão"]
-    seg_final[["Valor Assessor Seguro","Valor Capitão Seguro"]] = seg_final[["Valor Assessor Seguro","Valor Capitão Seguro"]].fillna(0)
-
-    cam_final = cam.merge(
-        tim_rep[['Código','Imposto + Despesa','Repasse Investimento PJ2','Repasse Investimento Líder']],
-        left_on='Código Assessor', right_on='Código', how='left'
-    )
-    cam_final["Valor Imposto"] = cam_final["Comissão Escritório"] * cam_final["Imposto + Despesa"]
-    cam_final["Sem Imposto"] = cam_final["Comissão Escritório"] - (cam_final["Comissão Escritório"] * cam_final["Imposto + Despesa"])
-    cam_final["Valor Assessor Câmbio"] = cam_final["Sem Imposto"] * cam_final["Repasse Investimento PJ2"]
-    cam_final[["Valor Assessor Câmbio"]] = cam_final[["Valor Assessor Câmbio"]].fillna(0)
-
-    co_ter_final = co_ter.merge(
-        tim_rep[['Código','Imposto + Despesa','Repasse Investimento PJ2','Repasse Investimento Líder',"Repasse Investimento Co-Corretagem Assessor","Repasse Investimento Co-Corretagem Capitão"]],
-        left_on='Código Assessor', right_on='Código', how='left'
-    )
-    co_ter_final["Valor Imposto"] = co_ter_final["Comissão Escritório"] * co_ter_final["Imposto + Despesa"]
-    co_ter_final["Sem Imposto"] = co_ter_final["Comissão Escritório"] - (co_ter_final["Comissão Escritório"] * co_ter_final["Imposto + Despesa"])
-    co_ter_final["Valor Assessor Co-Corretagem Terceiras"] = co_ter_final["Sem Imposto"] * co_ter_final["Repasse Investimento Co-Corretagem Assessor"]
-    co_ter_final["Valor Capitão Co-Corretagem Terceiras"] = co_ter_final["Sem Imposto"] * co_ter_final["Repasse Investimento Co-Corretagem Capitão"]
-    co_ter_final[["Valor Assessor Co-Corretagem Terceiras","Valor Capitão Co-Corretagem Terceiras"]] = co_ter_final[["Valor Assessor Co-Corretagem Terceiras","Valor Capitão Co-Corretagem Terceiras"]].fillna(0)
-
-    co_xpvp_final = co_xpvp.merge(
-        tim_rep[['Código','Imposto + Despesa','Repasse Investimento PJ2','Repasse Investimento Líder',"Repasse Investimento Co-Corretagem Assessor","Repasse Investimento Co-Corretagem Capitão"]],
-        left_on='Código Assessor', right_on='Código', how='left'
-    )
-    co_xpvp_final["Valor Imposto"] = co_xpvp_final["Comissão Escritório"] * co_xpvp_final["Imposto + Despesa"]
-    co_xpvp_final["Sem Imposto"] = co_xpvp_final["Comissão Escritório"] - (co_xpvp_final["Comissão Escritório"] * co_xpvp_final["Imposto + Despesa"])
-    co_xpvp_final["Valor Assessor Co-Corretagem XPVP"] = co_xpvp_final["Sem Imposto"] * co_xpvp_final["Repasse Investimento PJ2"]
 
-    cre_final = cre.merge(
-        tim_rep[['Código','Imposto + Despesa','Repasse Investimento PJ2','Repasse Investimento Líder']],
-        left_on='Código Assessor', right_on='Código', how='left'
-    )
-    cre_final["Valor Imposto"] = cre_final["Comissão Escritório"] * cre_final["Imposto + Despesa"]
-    cre_final["Sem Imposto"] = cre_final["Comissão Escritório"] - (cre_final["Comissão Escritório"] * cre_final["Imposto + Despesa"])
-    cre_final["Valor Assessor Crédito"] = cre_final["Sem Imposto"] * cre_final["Repasse Investimento PJ2"]
-    cre_final[["Valor Assessor Crédito"]] = cre_final[["Valor Assessor Crédito"]].fillna(0)
-
-    xpcs_final = xpcs.merge(
-        tim_rep[['Código','Imposto + Despesa','Repasse Investimento PJ2','Repasse Investimento Líder']],
-        left_on='Código Assessor', right_on='Código', how='left'
-    )
-    xpcs_final["Valor Imposto"] = xpcs_final["Comissão Escritório"] * xpcs_final["Imposto + Despesa"]
-    xpcs_final["Sem Imposto"] = xpcs_final["Comissão Escritório"] - (xpcs_final["Comissão Escritório"] * xpcs_final["Imposto + Despesa"])
-    xpcs_final["Valor Assessor XPCS"] = xpcs_final["Sem Imposto"] * xpcs_final["Repasse Investimento PJ2"]
-    xpcs_final[["Valor Assessor XPCS"]] = xpcs_final[["Valor Assessor XPCS"]].fillna(0)
+def _datas_pj1(data: pd.Series) -> pd.DataFrame:
+    data = pd.to_datetime(data, dayfirst=True, errors="coerce")
+    return pd.DataFrame({
+        "Data": data.dt.strftime("%d/%m/%Y"),
+        "Data Fechamento": (data + MonthEnd(0)).dt.strftime("%d/%m/%Y"),
+    })
+
+
+def _por_valor(serie: pd.Series, funcao):
+    """
+    funcao(valores distintos da série, NaN incluído) espalhada de volta pelas linhas:
+    para conversões de texto/data em colunas com poucos valores e muitas linhas.
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    return funcao(pd.Series(unicos)).take(codigos).set_axis(serie.index)
 
+
+def _pj1_partes_desconto(pj1):
+    """As linhas de desconto e a base das proporções (PJ1 sem campanhas/desconto)."""
+    pj1_desc = pj1.loc[
+        pj1["Produto"]=="Desconto de Transferência de Clientes",
+        ["PJ","Categoria","Produto","Cód. Assessor Direto","Comissão Bruta (R$) Escritório"],
+    ]
+    pj1_perc = pj1.loc[
+        ~pj1['Produto'].isin(PRODUTOS_FORA_PJ1),
+        ["ID","Cód. Assessor Direto","Categoria","Produto","Comissão Bruta (R$) Escritório"],
+    ]
+    return pj1_desc, pj1_perc
+
+
+# colunas que o desconto acrescenta às linhas do PJ1, na ordem do merge de antes
+_COLUNAS_DESCONTO = [
+    "Comissão Escritório Soma x Produto",
+    "Proporção Desconto Transferência",
+    "Comissão Escritório Soma",
+    "Desconto de Transferência de Clientes Fracionado",
+    "Comissão Escritório Tratada",
+]
+
+
+def _pj1_descontos(pj1_desc, pj1_perc):
+    """
+    Seção 4. O desconto de cada assessor (soma por categoria) é dividido entre as linhas
+    do seu maior produto, na proporção da comissão de cada linha na soma de
+    assessor/categoria/produto; assessor com alguma soma positiva não divide nada (as
+    somas positivas viram linhas próprias).
+
+    Só as linhas dos assessores que dividem desconto entram na conta, ordenadas uma vez
+    por assessor e produto: o valor de cada produto, o maior de cada assessor e a
+    repetição por categoria do desconto saem das fatias dessa ordem. As somas continuam
+    no groupby (mesma soma compensada, mesma ordem das linhas): o resultado é igual ao
+    das filtragens e merges de antes, bit a bit.
+
+    Devolve (pj1_desc_4, pj1_desc_pos): ID + _COLUNAS_DESCONTO das linhas que recebem
+    desconto (em ordem de ID, uma por categoria do desconto) e as linhas de desconto positivo.
+    """
     # ======================
     # 4) Desconto Transferência (igual sua lógica nova)
     # ======================
-    pj1_desc = pj1[["ID","PJ","Categoria","Produto","Cód. Assessor Direto","Comissão Bruta (R$) Escritório"]].copy()
-    pj1_desc = pj1_desc[pj1_desc["Produto"]=="Desconto de Transferência de Clientes"]
-
-    pj1_desc_2 = pj1_desc.groupby(["PJ","Cód. Assessor Direto","Categoria","Produto"])[["Comissão Bruta (R$) Escritório"]].sum().reset_index()
+    pj1_desc_2 = pj1_desc.groupby(["PJ","Cód. Assessor Direto","Categoria","Produto"], observed=True)[["Comissão Bruta (R$) Escritório"]].sum().reset_index()
     pj1_desc_2.rename({'Comissão Bruta (R$) Escritório':'Comissão Escritório Soma'}, axis=1, inplace=True)
 
     pj1_desc_pos = pj1_desc_2[pj1_desc_2['Comissão Escritório Soma'] > 0].copy()
     pj1_desc_pos["Comissão Escritório Tratada"] = pj1_desc_pos["Comissão Escritório Soma"]
-    pj1_desc_pos["Produto"] = "Desconto de Transferência de Clientes Positivo"
-
-    pj1_sem = pj1[~pj1['Produto'].isin(['Campanha COE','Campanha Renda Variável','Campanhas','Desconto de Transferência de Clientes'])].copy()
-    pj1_perc = pj1_sem[["ID","PJ","Cód. Assessor Direto","Categoria","Produto","Comissão Bruta (R$) Escritório"]].copy()
-
-    pj1_perc = pj1_perc[~pj1_perc["Cód. Assessor Direto"].isin(pj1_desc_pos["Cód. Assessor Direto"])].copy()
-
-    pj1_perc["Comissão Escritório Soma x Produto"] = pj1_perc.groupby(
-        ["Cód. Assessor Direto","Categoria","Produto"]
-    )["Comissão Bruta (R$) Escritório"].transform("sum")
-
-    pj1_perc["Proporção Desconto Transferência"] = (
-        pj1_perc["Comissão Bruta (R$) Escritório"] / pj1_perc["Comissão Escritório Soma x Produto"] * 100
-    )
-
-    maior_produto = (
-        pj1_perc.groupby(["Cód. Assessor Direto","Produto"])["Comissão Escritório Soma x Produto"]
-        .first().reset_index()
-    )
-    maior_produto = maior_produto.loc[
-        maior_produto.groupby("Cód. Assessor Direto")["Comissão Escritório Soma x Produto"].idxmax()
-    ]
-
-    pj1_maior = pj1_perc.merge(
-        maior_produto[["Cód. Assessor Direto","Produto"]],
-        on=["Cód. Assessor Direto","Produto"],
-        how="inner"
-    ).reset_index(drop=True)
-
-    pj1_desc3 = pj1_maior[["Cód. Assessor Direto","Produto"]].drop_duplicates()
-    pj1_desc3.rename({'Produto':'Descontar de'}, axis=1, inplace=True)
-    pj1_desc_2 = pj1_desc_2.merge(pj1_desc3, on="Cód. Assessor Direto", how="left")
-
-    pj1_desc_4 = pj1_maior.merge(
-        pj1_desc_2[["Cód. Assessor Direto","Comissão Escritório Soma"]],
-        on="Cód. Assessor Direto",
-        how="left"
-    )
+    pj1_desc_pos["Produto"] = _PRODUTO_DESCONTO_POSITIVO
+
+    # linhas de desconto que viram divisão (uma por categoria), e as linhas dos seus assessores
+    somas = pj1_desc_2[~pj1_desc_2["Cód. Assessor Direto"].isin(pj1_desc_pos["Cód. Assessor Direto"])]
+    perc = pj1_perc[pj1_perc["Cód. Assessor Direto"].isin(somas["Cód. Assessor Direto"])]
+
+    cod, codigos = pd.factorize(perc["Cód. Assessor Direto"])
+    cat, categorias = pd.factorize(perc["Categoria"])
+    # produtos na ordem do groupby: no empate fica o primeiro
+    prod, produtos = pd.factorize(perc["Produto"], sort=True)
+
+    # soma de assessor/categoria/produto; chave vazia (NaN) fica sem soma, como no groupby
+    trio = (cod.astype(np.int64) * (len(categorias) + 1) + cat) * (len(produtos) + 1) + prod
+    trio = np.where((cat >= 0) & (prod >= 0), trio, np.nan)
+    bruta = perc["Comissão Bruta (R$) Escritório"]
+    soma_x_produto = bruta.groupby(trio, sort=False).transform("sum")
+    proporcao = bruta / soma_x_produto * 100
+
+    # valor de cada (assessor, produto): a soma da primeira linha que tem soma (o .first())
+    com_soma = np.flatnonzero(soma_x_produto.notna().to_numpy() & (prod >= 0))
+    _, primeiras = np.unique(cod[com_soma].astype(np.int64) * (len(produtos) + 1) + prod[com_soma], return_index=True)
+    primeiras = com_soma[primeiras]
+
+    # maior valor de cada assessor (o .idxmax()): ordena por assessor, valor decrescente, produto
+    ordem = primeiras[np.lexsort((prod[primeiras], -soma_x_produto.to_numpy()[primeiras], cod[primeiras]))]
+    inicio = np.diff(cod[ordem], prepend=-1) != 0
+    maior = np.full(len(codigos), -2)
+    maior[cod[ordem[inicio]]] = prod[ordem[inicio]]
+    linhas_maior = np.flatnonzero(prod == maior[cod])
+
+    # cada linha do maior produto se repete para cada categoria do desconto do assessor
+    cod_somas = pd.Index(codigos).get_indexer(somas["Cód. Assessor Direto"])
+    fatias = np.argsort(cod_somas, kind="stable")
+    qtd = np.bincount(cod_somas[cod_somas >= 0], minlength=len(codigos))
+    primeira_fatia = np.searchsorted(cod_somas[fatias], np.arange(len(codigos)))
+    repeticoes = qtd[cod[linhas_maior]]
+    linhas = np.repeat(linhas_maior, repeticoes)
+    k = np.arange(len(linhas)) - np.repeat(np.cumsum(repeticoes) - repeticoes, repeticoes)
+    linhas_soma = fatias[primeira_fatia[cod[linhas]] + k]
+
+    pj1_desc_4 = pd.DataFrame({
+        "ID": perc["ID"].to_numpy()[linhas],
+        "Comissão Escritório Soma x Produto": soma_x_produto.iloc[linhas].to_numpy(),
+        "Proporção Desconto Transferência": proporcao.iloc[linhas].to_numpy(),
+        "Comissão Escritório Soma": somas["Comissão Escritório Soma"].iloc[linhas_soma].to_numpy(),
+    })
     pj1_desc_4["Desconto de Transferência de Clientes Fracionado"] = (
         pj1_desc_4["Proporção Desconto Transferência"] * pj1_desc_4["Comissão Escritório Soma"]/100
     )
     pj1_desc_4["Comissão Escritório Tratada"] = (
-        pj1_desc_4["Comissão Bruta (R$) Escritório"] + pj1_desc_4["Desconto de Transferência de Clientes Fracionado"]
+        bruta.iloc[linhas].to_numpy() + pj1_desc_4["Desconto de Transferência de Clientes Fracionado"]
     )
     pj1_desc_4 = pj1_desc_4[pj1_desc_4["Comissão Escritório Tratada"].notnull()]
+    return pj1_desc_4, pj1_desc_pos
+
+
+def _pj1_com_desconto(pj1, pj1_desc_4, pj1_desc_pos):
+    """
+    Cola _COLUNAS_DESCONTO nas linhas do PJ1 pela posição do ID (crescente no PJ1), no
+    lugar do merge pelas seis colunas. Linha com desconto de mais de uma categoria sai
+    repetida, uma vez por categoria, como no merge; as linhas de desconto positivo vão
+    no fim.
+    """
+    ids = pj1["ID"].to_numpy()
+    ids_desc = pj1_desc_4["ID"].to_numpy()
+    pos = np.searchsorted(ids, ids_desc)
+    achou = pos < len(ids)
+    achou[achou] = ids[pos[achou]] == ids_desc[achou]
+    linhas_desc = np.flatnonzero(achou)
+    ordem = np.argsort(pos[achou], kind="stable")
+    pos, linhas_desc = pos[achou][ordem], linhas_desc[ordem]
+
+    # linha do pj1_desc_4 de cada linha do resultado (-1: sem desconto, fica NaN)
+    qtd = np.bincount(pos, minlength=len(ids))
+    repeticoes = np.maximum(qtd, 1)
+    desconto_da_linha = np.full(int(repeticoes.sum()), -1)
+    desconto_da_linha[np.repeat(qtd > 0, repeticoes)] = linhas_desc
+
+    if len(desconto_da_linha) == len(ids):
+        pj1_final = pj1.reset_index(drop=True)
+    else:
+        pj1_final = pj1.take(np.repeat(np.arange(len(ids)), repeticoes)).reset_index(drop=True)
+    for col in _COLUNAS_DESCONTO:
+        pj1_final[col] = pd.api.extensions.take(pj1_desc_4[col].to_numpy(), desconto_da_linha, allow_fill=True)
 
-    pj1_final = pj1.merge(
-        pj1_desc_4,
-        on=["ID","PJ","Cód. Assessor Direto","Categoria","Produto","Comissão Bruta (R$) Escritório"],
-        how="left"
-    )
-
-    # joga linhas de desconto positivo
+    # joga linhas de desconto positivo (nos dicionários do PJ1: o concat continua Categorical)
     colunas_comuns = ["PJ","Cód. Assessor Direto","Categoria","Produto","Comissão Escritório Soma"]
-    pj1_final = pd.concat([pj1_final, pj1_desc_pos[colunas_comuns]], ignore_index=True)
+    positivos = pj1_desc_pos[colunas_comuns].copy()
+    for col in ["PJ"] + _TEXTOS_PJ1:
+        if isinstance(pj1_final[col].dtype, pd.CategoricalDtype):
+            positivos[col] = _categorizar(positivos[col], pj1_final[col].dtype)
+    return pd.concat([pj1_final, positivos], ignore_index=True)
+
 
+def _pj1_repasses(pj1_final, repasses, regras):
     # ======================
     # 5) Repasse PJ1 + Mesa (igual sua lógica nova)
     # ======================
-    mapa_categoria_repasse = {
-        "Renda Variável": "Investimentos - RV",
-        "Produtos Financeiros": "Investimentos - RV",
-        "Fundos Imobiliários": "Investimentos - RV",
-        "Renda Fixa": "Investimentos - RF"
-    }
-
-    pj1_final["Tipo Repasse Baseado na Categoria"] = pj1_final["Categoria"].map(mapa_categoria_repasse).fillna("Investimentos - Outros")
+    # tipo de cada categoria/produto distinto, espalhado pelas linhas (Categorical)
+    cod_cat, categorias = pd.factorize(pj1_final["Categoria"], use_na_sentinel=False)
+    cod_prod, produtos = pd.factorize(pj1_final["Produto"], use_na_sentinel=False)
+    categorias = pd.Series(np.asarray(categorias, dtype=object)).map(_MAPA_CATEGORIA_REPASSE_PJ1).fillna("Investimentos - Outros")
+    produtos = pd.Series(np.asarray(produtos, dtype=object))
+    tipos = _TIPO_REPASSE_PJ1.categories
+    tipo = tipos.get_indexer(categorias)[cod_cat]
 
     # exceções (SEU NOVO)
-    pj1_final.loc[pj1_final["Produto"].isin(["BM&F Ontick", "BM&F Ontick Parceiros"]), "Tipo Repasse Baseado na Categoria"] = "PJ2"
-    pj1_final.loc[pj1_final["Produto"].isin(["BM&F Ontick", "BM&F Ontick Parceiros"]), "PJ"] = "PJ2"
-    pj1_final.loc[pj1_final["Produto"] == "COE", "Tipo Repasse Baseado na Categoria"] = "Investimentos - Outros"
-
-    pj1_final = pj1_final.merge(
-        repasse_linhas[["Código","Tipo Repasse","% Repasse","Imposto + Despesa"]],
-        left_on=["Cód. Assessor Direto","Tipo Repasse Baseado na Categoria"],
-        right_on=["Código","Tipo Repasse"],
-        how="left"
-    )
-    pj1_final["percentual tratado"] = pj1_final["% Repasse"]
-    pj1_final.drop(columns=["Código","Tipo Repasse","% Repasse"], inplace=True, errors="ignore")
-
-    repasse_mesa_rv = repasse_linhas[repasse_linhas["Tipo Repasse"]=="Mesa RV"][["Código","% Repasse"]].rename(columns={"% Repasse":"% Repasse Mesa RV"})
-    repasse_mesa_rf = repasse_linhas[repasse_linhas["Tipo Repasse"]=="Mesa RF"][["Código","% Repasse"]].rename(columns={"% Repasse":"% Repasse Mesa RF"})
-    repasse_mesa_trade = repasse_linhas[repasse_linhas["Tipo Repasse"]=="Mesa Trader"][["Código","% Repasse"]].rename(columns={"% Repasse":"% Repasse Mesa Trader"})
-
-    pj1_final = pj1_final.merge(repasse_mesa_rv, left_on="Cód. Assessor Direto", right_on="Código", how="left").drop(columns=["Código"], errors="ignore")
-    pj1_final = pj1_final.merge(repasse_mesa_rf, left_on="Cód. Assessor Direto", right_on="Código", how="left").drop(columns=["Código"], errors="ignore")
-    pj1_final = pj1_final.merge(repasse_mesa_trade, left_on="Cód. Assessor Direto", right_on="Código", how="left").drop(columns=["Código"], errors="ignore")
-
-    pj1_final["percentual tratado mesa rv"] = np.where(
-        (pj1_final["Tipo Repasse Baseado na Categoria"]=="Investimentos - RV") &
-        (~pj1_final["Produto"].astype(str).str.contains("BM&F", case=False, na=False)),
-        pj1_final["% Repasse Mesa RV"],
-        0
-    )
-    pj1_final["percentual tratado mesa rf"] = np.where(
-        pj1_final["Tipo Repasse Baseado na Categoria"]=="Investimentos - RF",
-        pj1_final["% Repasse Mesa RF"],
-        0
-    )
-    pj1_final["percentual tratado mesa trader"] = np.where(
-        pj1_final["Produto"].astype(str).str.contains("BM&F", case=False, na=False),
-        pj1_final["% Repasse Mesa Trader"],
-        0
-    )
+    ontick = produtos.isin(["BM&F Ontick", "BM&F Ontick Parceiros"]).to_numpy()[cod_prod]
+    tipo[ontick] = tipos.get_loc("PJ2")
+    pj1_final.loc[ontick, "PJ"] = "PJ2"
+    tipo[(produtos == "COE").to_numpy()[cod_prod]] = tipos.get_loc("Investimentos - Outros")
+    pj1_final["Tipo Repasse Baseado na Categoria"] = pd.Categorical.from_codes(tipo, dtype=_TIPO_REPASSE_PJ1)
+
+    # % pelo tipo da linha + imposto (antes: merge com repasse_linhas por código e tipo)
+    cod_tim = repasses.indices(pj1_final["Cód. Assessor Direto"])
+    tipo = repasses.indices_tipo(pj1_final["Tipo Repasse Baseado na Categoria"])
+    repetir, pos = repasses.expandir(cod_tim, validos=tipo >= 0)
+    if repetir is not None:
+        pj1_final = pj1_final.take(repetir).reset_index(drop=True)
+        cod_tim, tipo = cod_tim[repetir], tipo[repetir]
+    pj1_final["Imposto + Despesa"] = repasses.coluna("Imposto + Despesa", pos).array
+    pj1_final["percentual tratado"] = repasses.percentual(pos, tipo)
+
+    # % das mesas (antes: um merge por mesa)
+    for mesa in regras.mesas:
+        repetir, pos = repasses.expandir(cod_tim)
+        if repetir is not None:
+            pj1_final = pj1_final.take(repetir).reset_index(drop=True)
+            cod_tim = cod_tim[repetir]
+        pj1_final[mesa.coluna_repasse] = repasses.percentual(pos, mesa.repasse)
+
+    linhas_mesas = _linhas_das_mesas(pj1_final, regras.mesas)
+    for mesa, (entra, _) in zip(regras.mesas, linhas_mesas):
+        pj1_final[mesa.coluna_percentual] = np.where(entra, pj1_final[mesa.coluna_repasse], 0)
 
     # contas finais PJ1
     pj1_final["Comissão Escritório Tratada"] = pj1_final["Comissão Escritório Tratada"].fillna(pj1_final["Comissão Bruta (R$) Escritório"])
@@ -268,17 +851,90 @@ def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_r
     pj1_final["Valor Imposto"] = pj1_final["Comissão Escritório Tratada"] * pj1_final["Imposto + Despesa"]
     pj1_final["Valor Assessor Direto"] = (pj1_final["Sem Imposto"] * pj1_final["percentual tratado"]).fillna(0)
 
-    pj1_final["Valor Mesa RV"] = pj1_final["Sem Imposto"] * pj1_final["percentual tratado mesa rv"]
-    pj1_final["Valor Mesa RF"] = pj1_final["Sem Imposto"] * pj1_final["percentual tratado mesa rf"]
-    pj1_final["Valor Mesa Trader"] = pj1_final["Sem Imposto"] * pj1_final["percentual tratado mesa trader"]
+    # valor de cada mesa (zerado nos produtos que as regras excluem)
+    for mesa, (_, zerar) in zip(regras.mesas, linhas_mesas):
+        valor = (pj1_final["Sem Imposto"] * pj1_final[mesa.coluna_percentual]).to_numpy(copy=True)
+        valor[zerar] = 0
+        pj1_final[mesa.coluna_valor] = valor
+    return pj1_final, cod_tim
+
+
+def _pj1_group(pj1_final, regras):
+    """Seção 7. Usa só código, Produto, Valor Assessor Direto e o valor de cada mesa."""
+    # ======================
+    # 7) Groupby PJ1 + ajustes mesa
+    # ======================
+    pj1_group = pj1_final.loc[~pj1_final['Produto'].isin(PRODUTOS_FORA_PJ1), ['Cód. Assessor Direto',"Valor Assessor Direto"]]
+    pj1_group = pj1_group.groupby('Cód. Assessor Direto', observed=True)[["Valor Assessor Direto"]].sum().reset_index()
+    pj1_group["Valor Assessor PJ1"] = pj1_group["Valor Assessor Direto"].fillna(0)
+    pj1_group = pj1_group[["Cód. Assessor Direto","Valor Assessor PJ1"]]
+
+    # código da mesa = os próprios diretos (todas as linhas, inclusive campanhas) + o total da mesa
+    diretos = _somas_por_codigo(pj1_final["Cód. Assessor Direto"], pj1_final["Valor Assessor Direto"], [m.codigo for m in regras.mesas])
+    for mesa in regras.mesas:
+        pj1_group.loc[pj1_group["Cód. Assessor Direto"]==mesa.codigo, "Valor Assessor PJ1"] = diretos[mesa.codigo] + pj1_final[mesa.coluna_valor].sum()
+
+    return pj1_group.rename(columns={"Cód. Assessor Direto":"Código Assessor"})
+
+
+def _pj1_lider(pj1_final, cod_tim, repasses):
+    # ======================
+    # 9) Líder
+    # ======================
+    repetir, pos = repasses.expandir(cod_tim)
+    if repetir is not None:
+        pj1_final = pj1_final.take(repetir).reset_index(drop=True)
+    pj1_final["Repasse Investimento Líder"] = repasses.coluna("Repasse Investimento Líder", pos).array
+    pj1_final["Valor Lider"] = pj1_final["Sem Imposto"] * pj1_final["Repasse Investimento Líder"]
+    return pj1_final
+
+
+def _pj1_total_lider(pj1_final):
+    pj1_group_lider = pj1_final.groupby("Cód. Assessor Direto", observed=True)[["Valor Lider"]].sum().reset_index().rename(columns={"Cód. Assessor Direto":"Código Assessor"})
+    return pj1_group_lider["Valor Lider"].sum()
+
+
+def _pj1_extra(pj1_final, col_perc, col_val, codigo):
+    """
+    Linhas de uma mesa (ou do líder) no df_juntar: as linhas do PJ1 com esse percentual
+    != 0, no código da mesa. Guarda só o que muda em relação ao pj1_juntar (posições,
+    percentual e valor); consolidar_ramos pega as demais colunas direto do pj1_juntar.
+    """
+    linhas = np.flatnonzero((pj1_final[col_perc] != 0).to_numpy())
+    return dict(
+        codigo=codigo,
+        linhas=linhas,
+        percentual=pj1_final[col_perc].array.take(linhas),
+        valor=pj1_final[col_val].array.take(linhas),
+    )
+
 
-    # zera mesa rv por regras
-    produtos_somente_a39437 = ['BM&F','BM&F Mini','BM&F Self Service']
-    produtos_todos = ['BOVESPA FIIs Empacotados','BOVESPA FIIs Risco']
-    cond1 = pj1_final['Produto'].isin(produtos_somente_a39437) & (pj1_final['Cód. Assessor Direto']=='A39437')
-    cond2 = pj1_final['Produto'].isin(produtos_todos)
-    pj1_final.loc[cond1 | cond2, 'Valor Mesa RV'] = 0
+def _pj1_extra_concat(partes, inicios):
+    """Junta o _pj1_extra de cada bloco; `inicios`: posição do pj1_juntar de cada bloco no inteiro."""
+    def juntar(chave):
+        return pd.concat([pd.Series(p[chave]) for p in partes], ignore_index=True).array
+    return dict(
+        codigo=partes[0]["codigo"],
+        linhas=np.concatenate([p["linhas"] + i for p, i in zip(partes, inicios)]),
+        percentual=juntar("percentual"),
+        valor=juntar("valor"),
+    )
 
+
+def _pj1_juntar(pj1_final, regras):
+    # ======================
+    # 11) df_juntar (PJ1 + mesa/líder)
+    # ======================
+    # cada coluna sai do pj1_final já com o nome do df_juntar (uma cópia, sem rename)
+    pj1_juntar = pd.DataFrame({novo: pj1_final[c] for c, novo in _COLUNAS_JUNTAR_PJ1_SAIDA.items()}, copy=True)
+    pj1_juntar["Valor Escritório"] = pj1_final["Repasse (%) Escritório"] * pj1_final["Sem Imposto"]/100
+
+    linhas_mesa = [_pj1_extra(pj1_final, m.coluna_percentual, m.coluna_valor, m.codigo) for m in regras.mesas]
+    repasse_lider = _pj1_extra(pj1_final, "Repasse Investimento Líder", "Valor Lider", regras.lider)
+    return pj1_juntar, linhas_mesa, repasse_lider
+
+
+def _ramo_lan_pro(lan_pro, repasses):
     # ======================
     # 6) Lançamento de produtos (igual seu novo)
     # ======================
@@ -291,12 +947,15 @@ def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_r
 
     lan_pro["Tipo Repasse Baseado na Categoria"] = lan_pro["Categoria"].map(mapa_categoria_repasse_lan_pro)
 
-    lan_pro = lan_pro.merge(
-        repasse_linhas[["Código","Tipo Repasse","% Repasse","Imposto + Despesa"]],
-        left_on=["Código do Assessor","Tipo Repasse Baseado na Categoria"],
-        right_on=["Código","Tipo Repasse"],
-        how="left"
-    ).drop(columns=["Código"], errors="ignore")
+    # Cripto/Consorcio/Convenio não são tipos do tim_rep: ficam sem % e sem imposto
+    cod_tim = repasses.indices(lan_pro["Código do Assessor"])
+    tipo = repasses.indices_tipo(lan_pro["Tipo Repasse Baseado na Categoria"])
+    repetir, pos = repasses.expandir(cod_tim, validos=tipo >= 0)
+    if repetir is not None:
+        lan_pro = lan_pro.take(repetir).reset_index(drop=True)
+        cod_tim, tipo = cod_tim[repetir], tipo[repetir]
+    lan_pro["% Repasse"] = repasses.percentual(pos, tipo)
+    lan_pro["Imposto + Despesa"] = repasses.coluna("Imposto + Despesa", pos).array
 
     lan_pro["percentual tratado"] = lan_pro["% Repasse"]
     imposto = lan_pro["Imposto + Despesa"].fillna(0)
@@ -305,129 +964,299 @@ def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_r
     lan_pro["Valor Imposto"] = np.where(imposto==0, 0, lan_pro["Comissão Escritório"] * imposto)
     lan_pro["Valor Lançamentos Produtos"] = np.where(imposto==0, lan_pro["Comissão Escritório"], lan_pro["Sem Imposto"] * lan_pro["percentual tratado"])
 
-    lan_pro = lan_pro.merge(
-        tim_rep[['Código','Repasse Investimento Líder']],
-        left_on='Código do Assessor', right_on='Código', how='left'
-    ).drop(columns=["Código"], errors="ignore")
+    repetir, pos = repasses.expandir(cod_tim)
+    if repetir is not None:
+        lan_pro = lan_pro.take(repetir).reset_index(drop=True)
+    lan_pro["Repasse Investimento Líder"] = repasses.coluna("Repasse Investimento Líder", pos).array
 
     # ======================
-    # 7) Groupbys (resumo)
+    # 7) Groupby
     # ======================
-    pj1_group = pj1_final[~pj1_final['Produto'].isin(['Campanha COE','Campanha Renda Variável','Campanhas','Desconto de Transferência de Clientes'])].copy()
-    pj1_group = pj1_group.groupby('Cód. Assessor Direto')[["Valor Assessor Direto"]].sum().reset_index()
-    pj1_group["Valor Assessor PJ1"] = pj1_group["Valor Assessor Direto"].fillna(0)
-    pj1_group = pj1_group[["Cód. Assessor Direto","Valor Assessor PJ1"]]
+    lan_pro_filtrado = lan_pro[lan_pro["Categoria"] != "mesa"].copy()
+    lan_pro_group = lan_pro_filtrado.groupby("Código do Assessor")[["Valor Lançamentos Produtos"]].sum().reset_index().rename(columns={"Código do Assessor":"Código Assessor"})
+
+    # ======================
+    # 9) Líder
+    # ======================
+    lan_pro_filtrado = lan_pro_filtrado[lan_pro_filtrado["Produto"].notna()].copy()
+    lan_pro_filtrado["Valor Lançamentos Produtos"] = pd.to_numeric(lan_pro_filtrado["Valor Lançamentos Produtos"], errors="coerce").fillna(0)
+    lan_pro_filtrado["Valor Lider"] = lan_pro_filtrado["Valor Lançamentos Produtos"] * lan_pro_filtrado["Repasse Investimento Líder"]
+    lan_pro_group_lider = lan_pro_filtrado.groupby("Código do Assessor")[["Valor Lider"]].sum().reset_index().rename(columns={"Código do Assessor":"Código Assessor"})
 
-    seg_group = seg_final.groupby("Código Assessor")[["Valor Assessor Seguro","Valor Capitão Seguro"]].sum().reset_index()
-    cam_group = cam_final.groupby("Código Assessor")[["Valor Assessor Câmbio"]].sum().reset_index()
-    co_ter_group = co_ter_final.groupby("Código Assessor")[["Valor Assessor Co-Corretagem Terceiras","Valor Capitão Co-Corretagem Terceiras"]].sum().reset_index()
-    cre_group = cre_final.groupby("Código Assessor")[["Valor Assessor Crédito"]].sum().reset_index()
-    xpcs_group = xpcs_final.groupby("Código Assessor")[["Valor Assessor XPCS"]].sum().reset_index()
-    co_xpvp_group = co_xpvp_final.groupby("Código Assessor")[["Valor Assessor Co-Corretagem XPVP"]].sum().reset_index()
+    # ======================
+    # 11) df_juntar
+    # ======================
+    lan_pro_juntar = lan_pro_filtrado[["Código do Assessor","Categoria","Produto","Cliente","Valor Lançamentos Produtos"]]
+    lan_pro_juntar = lan_pro_juntar.rename(columns={"Código do Assessor":"Código Assessor","Valor Lançamentos Produtos":"Valor Assessor","Cliente":"Código Cliente"})
 
+    return dict(group=lan_pro_group, lider=lan_pro_group_lider["Valor Lider"].sum(), juntar=lan_pro_juntar)
+
+
+def _somas_por_codigo(codigos: pd.Series, valores: pd.Series, alvos: list[str]) -> dict:
+    """
+    Soma de `valores` das linhas de cada código de `alvos`, numa passada: ordena uma
+    vez por código e soma cada fatia. A fatia mantém a ordem das linhas, então o
+    resultado é o mesmo de df[df[col] == codigo][valor].sum().
+    """
+    cod, unicos = pd.factorize(codigos)
+    ordem = np.argsort(cod, kind="stable")
+    limites = np.searchsorted(cod[ordem], np.arange(len(unicos) + 1))
+    v = valores.to_numpy()
+    if v.dtype.kind == "f":
+        v = np.where(np.isnan(v), 0.0, v)  # skipna do Series.sum
+    v = v[ordem]
+
+    somas = {}
+    for alvo, i in zip(alvos, pd.Index(unicos).get_indexer(alvos)):
+        somas[alvo] = v[limites[i]:limites[i + 1]].sum() if i >= 0 else v[:0].sum()
+    return somas
+
+
+def _centavos(valores: pd.Series) -> tuple[pd.Series, int]:
+    """
+    (valores, escala) para somar: em centavos int64 (escala 100, NaN = 0 como no skipna
+    da soma) se todos são centavos exatos; a soma fica exata e só divide no fim. Senão
+    os próprios valores (escala 1).
+    """
+    v = valores.to_numpy(dtype=np.float64, na_value=np.nan)
+    v = np.where(np.isnan(v), 0.0, v)
+    c = np.round(v * 100)
+    if not (np.abs(c) < 2 ** 53).all() or not np.array_equal(c / 100, v):
+        return valores, 1
+    return pd.Series(c.astype(np.int64), index=valores.index, name=valores.name), 100
+
+
+def _ramo_lan_man(lan_man, regras):
+    # ======================
+    # 7) Groupby + ajustes débito
+    # ======================
+    # regras.debitos: códigos cujo total em df_final é refeito com os lançamentos
+    # "Debitar de" apontando para eles (valor negativado). proprios=True: próprios
+    # lançamentos + débitos; False: os lançamentos do próprio código são estornados
+    # (linhas negativas no df_juntar) e o total fica só com os débitos.
+    # Os demais códigos de "Debitar de" só ganham as linhas de débito no df_juntar.
     lan_man["Produto"] = lan_man["Produto"] + " - " + lan_man["Nome Completo"]
-    lan_man_group = lan_man.groupby("Código")[["Valor"]].sum().reset_index().rename(columns={"Código":"Código Assessor","Valor":"Valor Lançamentos Manuais"})
-
-    lan_pro_filtrado = lan_pro[lan_pro["Categoria"] != "mesa"].copy()
-    lan_pro_group = lan_pro_filtrado.groupby("Código do Assessor")[["Valor Lançamentos Produtos"]].sum().reset_index().rename(columns={"Código do Assessor":"Código Assessor"})
+    # somas em centavos (_centavos): o lançamento manual é valor digitado, em centavos
+    valor, escala = _centavos(lan_man["Valor"])
+    lan_man_group = valor.groupby(lan_man["Código"]).sum().reset_index().rename(columns={"Código":"Código Assessor","Valor":"Valor Lançamentos Manuais"})
+    lan_man_group["Valor Lançamentos Manuais"] = lan_man_group["Valor Lançamentos Manuais"] / escala
 
-    # ajustes débito
-    linhas_negativas = lan_man[lan_man["Código"] == "A50753"].copy()
+    estornados = [c for c, proprios in regras.debitos if not proprios]
+    linhas_negativas = lan_man[lan_man["Código"].isin(estornados)].copy()
     linhas_negativas["Valor"] *= -1
     lan_man = pd.concat([lan_man, linhas_negativas], ignore_index=True)
     lan_man["Valor negativado"] = lan_man["Valor"] * -1
 
-    soma_A97601 = lan_man[lan_man['Código'] == 'A97601']['Valor'].sum()
-    valor_deb_97601 = lan_man[lan_man["Debitar de"] == "A97601"]["Valor negativado"].sum()
-    valor_total_97601 = soma_A97601 + valor_deb_97601
+    alvos = [c for c, _ in regras.debitos]
+    valor, escala = _centavos(lan_man["Valor"])
+    proprios = _somas_por_codigo(lan_man["Código"], valor, alvos)
+    debitos = _somas_por_codigo(lan_man["Debitar de"], valor * -1, alvos)
+
+    novos = []
+    for codigo, soma_proprios in regras.debitos:
+        total = (proprios[codigo] + debitos[codigo] if soma_proprios else debitos[codigo]) / escala
+        linha = lan_man_group["Código Assessor"] == codigo
+        if linha.any():
+            lan_man_group.loc[linha, "Valor Lançamentos Manuais"] = total
+        else:
+            novos.append((codigo, total))
+    for codigo, total in novos:
+        lan_man_group = pd.concat([lan_man_group, pd.DataFrame({"Código Assessor":[codigo],"Valor Lançamentos Manuais":[total]})], ignore_index=True)
 
-    if "A97601" in lan_man_group["Código Assessor"].values:
-        lan_man_group.loc[lan_man_group["Código Assessor"]=="A97601","Valor Lançamentos Manuais"] = valor_total_97601
-    else:
-        lan_man_group = pd.concat([lan_man_group, pd.DataFrame({"Código Assessor":["A97601"],"Valor Lançamentos Manuais":[valor_total_97601]})], ignore_index=True)
+    # ======================
+    # 11) df_juntar
+    # ======================
+    # cada lançamento com "Debitar de" vira também uma linha negativada no código
+    # indicado; agrupadas por código na ordem em que aparecem, como antes
+    lan_man["Valor Assessor"] = lan_man["Valor"]
+    alvo, _ = pd.factorize(lan_man["Debitar de"])
+    com_debito = np.flatnonzero(alvo >= 0)
+    if len(com_debito):
+        linhas_debito = lan_man.take(com_debito[np.argsort(alvo[com_debito], kind="stable")])
+        linhas_debito["Código"] = linhas_debito["Debitar de"].astype(str)
+        linhas_debito["Valor Assessor"] = linhas_debito["Valor negativado"]
+        lan_man = pd.concat([lan_man, linhas_debito], ignore_index=True)
 
-    valor_deb_50753 = lan_man[lan_man["Debitar de"] == "A50753"]["Valor negativado"].sum()
-    if "A50753" in lan_man_group["Código Assessor"].values:
-        lan_man_group.loc[lan_man_group["Código Assessor"]=="A50753","Valor Lançamentos Manuais"] = valor_deb_50753
-    else:
-        lan_man_group = pd.concat([lan_man_group, pd.DataFrame({"Código Assessor":["A50753"],"Valor Lançamentos Manuais":[valor_deb_50753]})], ignore_index=True)
+    lan_man_juntar = lan_man[["Código","Categoria","Produto","Valor Assessor"]]
+    lan_man_juntar = lan_man_juntar.rename(columns={"Código":"Código Assessor"})
 
-    # ajustes mesa no pj1_group
-    soma_valor_direto_A21426 = pj1_final.loc[pj1_final['Cód. Assessor Direto']=='A21426','Valor Assessor Direto'].sum()
-    soma_valor_mesa_rv = pj1_final['Valor Mesa RV'].sum()
-    pj1_group.loc[pj1_group['Cód. Assessor Direto']=='A21426','Valor Assessor PJ1'] = soma_valor_direto_A21426 + soma_valor_mesa_rv
+    return dict(group=lan_man_group, juntar=lan_man_juntar)
+
+
+def _com_nome_completo(df: pd.DataFrame, repasses: TabelaRepasses) -> pd.DataFrame:
+    """Coluna "Nome Completo" do tim_rep pelo "Código Assessor" (o antigo merge left)."""
+    repetir, pos = repasses.expandir(repasses.indices(df["Código Assessor"]))
+    df = (df if repetir is None else df.take(repetir)).reset_index(drop=True)
+    df["Nome Completo"] = repasses.coluna("Nome Completo", pos).array
+    return df
+
+
+# dtypes do numpy sem NaN: faltante vira NaT
+_FALTANTE_NAT = {"M": np.datetime64("NaT"), "m": np.timedelta64("NaT")}
+
+
+def _valores(arr):
+    """ndarray para dtypes do numpy; os ExtensionArray ficam como estão."""
+    return arr.to_numpy() if isinstance(arr.dtype, np.dtype) else arr
+
+
+def _converter(valores, dtype):
+    """`valores` no dtype da coluna, convertidos como o concat converteria (astype)."""
+    if valores.dtype == dtype:
+        return valores
+    return _valores(pd.Series(valores, copy=False).astype(dtype).array)
+
+
+def _preencher_coluna(dtype, partes, total: int):
+    """
+    Uma coluna do df_juntar com `total` linhas. `partes`: (início, fim, valores,
+    posições) de cada peça no resultado; posições None = todos os valores, em ordem;
+    valores None = peça sem a coluna (faltante, como no concat).
+    """
+    if isinstance(dtype, np.dtype):
+        saida = np.empty(total, dtype=dtype)
+        for inicio, fim, valores, posicoes in partes:
+            if valores is None:
+                saida[inicio:fim] = _FALTANTE_NAT.get(dtype.kind, np.nan)
+            elif posicoes is not None and valores.dtype == dtype:
+                np.take(valores, posicoes, out=saida[inicio:fim])
+            else:
+                saida[inicio:fim] = _converter(valores if posicoes is None else valores.take(posicoes), dtype)
+        return saida
+
+    arrays = []
+    for inicio, fim, valores, posicoes in partes:
+        if valores is None:
+            arrays.append(pd.array([], dtype=dtype).take(np.full(fim - inicio, -1), allow_fill=True))
+        else:
+            arrays.append(_converter(valores if posicoes is None else valores.take(posicoes), dtype))
+    return dtype.construct_array_type()._concat_same_type(arrays)
+
+
+def _pecas_juntar(ramos: dict[str, dict]) -> list[tuple]:
+    """
+    Peças do df_juntar na ordem do concat antigo: os juntar de cada ramo e, depois,
+    mesas/líder do PJ1. Cada peça: (amostra, linhas, colunas). A amostra tem as colunas
+    e dtypes da peça em até uma linha; `colunas` dá, por coluna, os valores de origem e
+    as posições a pegar deles (None: todos, em ordem).
+    """
+    pecas = []
+    for f in FONTES_RAMOS:
+        df = ramos[f]["juntar"]
+        pecas.append((df.iloc[:1], len(df), {c: (_valores(df[c].array), None) for c in df.columns}))
+
+    pj1_juntar = ramos["pj1"]["juntar"]
+    saida = list(_COLUNAS_JUNTAR_PJ1_SAIDA.values())
+    for extra in ramos["pj1"]["juntar_extra"]:
+        linhas = extra["linhas"]
+        # a mesma linha que o _pj1_padroniza antigo montaria
+        amostra = pj1_juntar.iloc[linhas[:1]][saida]
+        amostra["percentual"] = extra["percentual"][:1]
+        amostra["Valor Assessor"] = extra["valor"][:1]
+        amostra["Código Assessor"] = extra["codigo"]
+        colunas = {c: (_valores(pj1_juntar[c].array), linhas) for c in saida}
+        colunas["Código Assessor"] = (_valores(amostra["Código Assessor"].array), np.zeros(len(linhas), dtype=np.intp))
+        colunas["percentual"] = (_valores(extra["percentual"]), None)
+        colunas["Valor Assessor"] = (_valores(extra["valor"]), None)
+        pecas.append((amostra, len(linhas), colunas))
+    return pecas
+
+
+def _montar_df_juntar(ramos: dict[str, dict], repasses: TabelaRepasses) -> pd.DataFrame:
+    """
+    Seções 11–12 do df_juntar: o concat dos juntar (e depois das mesas/líder), o merge
+    com o nome e o "código - nome", sem montar os frames intermediários. Colunas e
+    dtypes saem do concat das amostras das peças (as regras de dtype do concat); cada
+    coluna é alocada uma vez no tamanho final e preenchida direto dos arrays das peças,
+    já com as linhas repetidas pelo tim_rep. O "código - nome" é calculado uma vez por
+    par (código, linha do tim_rep).
+    """
+    pecas = _pecas_juntar(ramos)
+    n = len(FONTES_RAMOS)
+    esquema = pd.concat(
+        [pd.concat([p[0] for p in pecas[:n]], ignore_index=True)] + [p[0] for p in pecas[n:]],
+        ignore_index=True,
+    )
+    inicios = np.cumsum([0] + [p[1] for p in pecas])
+
+    def coluna(nome, repetir=None):
+        partes = []
+        for (_, _, colunas), primeira, fim in zip(pecas, inicios[:-1], inicios[1:]):
+            valores, posicoes = colunas.get(nome, (None, None))
+            inicio = primeira
+            if repetir is not None:
+                # repetir é crescente: as linhas de cada peça ficam juntas no resultado
+                inicio, fim = np.searchsorted(repetir, [primeira, fim])
+                locais = repetir[inicio:fim] - primeira
+                posicoes = locais if posicoes is None else posicoes[locais]
+            partes.append((inicio, fim, valores, posicoes))
+        return _preencher_coluna(esquema.dtypes[nome], partes, inicios[-1] if repetir is None else len(repetir))
+
+    # 12) nome pelo código (o merge com o tim_rep pode repetir linhas)
+    codigos = coluna("Código Assessor")
+    cod, unicos = pd.factorize(codigos, use_na_sentinel=False)
+    repetir, pos = repasses.expandir(repasses.indices(unicos)[cod])
+    if repetir is not None:
+        cod = cod[repetir]
+    base = len(repasses.tim_rep) + 1
+    par, pares = pd.factorize(cod.astype(np.int64) * base + (pos + 1))
+    codigo = pd.Series(unicos.take(pares // base), dtype=codigos.dtype)
+    nome = repasses.coluna("Nome Completo", pares % base - 1)
+    codigo_nome = (
+        codigo.astype(str) + " - " + nome.astype(str)
+    ).str.replace(r"(nan|NaN|None)", "", regex=True).str.strip(" -")
+
+    dados = {}
+    for nome_coluna in esquema.columns:
+        if nome_coluna == "Código Assessor":
+            dados[nome_coluna] = codigo_nome.array.take(par)
+        elif nome_coluna != "Código":
+            # Series com o dtype do esquema: o DataFrame de um ndarray object só com texto viraria str
+            dados[nome_coluna] = pd.Series(coluna(nome_coluna, repetir), dtype=esquema.dtypes[nome_coluna], copy=False)
+    return pd.DataFrame(dados, copy=False)
 
-    soma_valor_direto_A54626 = pj1_final.loc[pj1_final['Cód. Assessor Direto']=='A54626','Valor Assessor Direto'].sum()
-    soma_valor_mesa_rf = pj1_final['Valor Mesa RF'].sum()
-    pj1_group.loc[pj1_group['Cód. Assessor Direto']=='A54626','Valor Assessor PJ1'] = soma_valor_direto_A54626 + soma_valor_mesa_rf
 
-    soma_valor_direto_A39437 = pj1_final.loc[pj1_final['Cód. Assessor Direto']=='A39437','Valor Assessor Direto'].sum()
-    soma_valor_mesa_trader = pj1_final['Valor Mesa Trader'].sum()
-    pj1_group.loc[pj1_group['Cód. Assessor Direto']=='A39437','Valor Assessor PJ1'] = soma_valor_direto_A39437 + soma_valor_mesa_trader
+def consolidar_ramos(ramos: dict[str, dict], tim_rep: pd.DataFrame, regras: RegrasAssessores | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Seções 8–13: junta os ramos em df_final (por assessor) e df_juntar (detalhado)."""
+    regras = regras or carregar_regras()
+    repasses = preparar_repasses(tim_rep)
+    marca = cronometro("consolidar ", sum(len(ramos[f]["group"]) for f in FONTES_RAMOS))
 
     # ======================
     # 8) Monta df_final (merge dos groups)
     # ======================
-    dataframes = [pj1_group, seg_group, cam_group, co_ter_group, co_xpvp_group, cre_group, xpcs_group, lan_man_group, lan_pro_group]
-    chaves = ['Cód. Assessor Direto'] + ['Código Assessor']*8
+    dataframes = [ramos[f]["group"] for f in FONTES_RAMOS]
 
-    df_final = dataframes[0].rename(columns={chaves[0]:'Código Assessor'})
+    df_final = dataframes[0]
     for i in range(1, len(dataframes)):
-        df_temp = dataframes[i].rename(columns={chaves[i]:'Código Assessor'})
-        df_final = df_final.merge(df_temp, on="Código Assessor", how="outer")
+        df_final = df_final.merge(dataframes[i], on="Código Assessor", how="outer")
 
     df_final = df_final.fillna(0)
 
-    # capitão (A70108)
-    soma_valor_seguros = df_final['Valor Capitão Seguro'].sum() + df_final["Valor Capitão Co-Corretagem Terceiras"].sum()
-    df_final["Total Capitão Co-Corretagem"] = df_final["Valor Capitão Co-Corretagem Terceiras"] + df_final["Valor Capitão Seguro"]
-    df_final.loc[df_final["Código Assessor"]=="A70108","Total Capitão Co-Corretagem"] = soma_valor_seguros
+    # capitão (regras.capitao): recebe a soma das colunas de capitão de todos
+    codigos = df_final["Código Assessor"]
+    primeira, *outras = regras.colunas_capitao
+    soma_valor_seguros = df_final[primeira].sum()
+    df_final["Total Capitão Co-Corretagem"] = df_final[primeira]
+    for col in outras:
+        soma_valor_seguros += df_final[col].sum()
+        df_final["Total Capitão Co-Corretagem"] = df_final["Total Capitão Co-Corretagem"] + df_final[col]
+    capitao = (codigos == regras.capitao).to_numpy(dtype=bool)
+    df_final.loc[capitao, "Total Capitão Co-Corretagem"] = soma_valor_seguros
+    marca("8) df_final", df_final)
 
     # ======================
-    # 9) Líder (SEU NOVO: A53030)
+    # 9) Líder (regras.lider)
     # ======================
-    pj1_final = pj1_final.merge(tim_rep[['Código','Repasse Investimento Líder']], left_on='Cód. Assessor Direto', right_on='Código', how='left').drop(columns=["Código"], errors="ignore")
-
-    pj1_final["Valor Lider"] = pj1_final["Sem Imposto"] * pj1_final["Repasse Investimento Líder"]
-    seg_final["Valor Lider"] = seg_final["Sem Imposto"] * seg_final["Repasse Investimento Líder"]
-    cam_final["Valor Lider"] = cam_final["Sem Imposto"] * cam_final["Repasse Investimento Líder"]
-    co_ter_final["Valor Lider"] = co_ter_final["Sem Imposto"] * co_ter_final["Repasse Investimento Líder"]
-    cre_final["Valor Lider"] = cre_final["Sem Imposto"] * cre_final["Repasse Investimento Líder"]
-    xpcs_final["Valor Lider"] = xpcs_final["Sem Imposto"] * xpcs_final["Repasse Investimento Líder"]
-    co_xpvp_final["Valor Lider"] = co_xpvp_final["Sem Imposto"] * co_xpvp_final["Repasse Investimento Líder"]
-
-    lan_pro_filtrado = lan_pro_filtrado[lan_pro_filtrado["Produto"].notna()].copy()
-    lan_pro_filtrado["Valor Lançamentos Produtos"] = pd.to_numeric(lan_pro_filtrado["Valor Lançamentos Produtos"], errors="coerce").fillna(0)
-    lan_pro_filtrado["Valor Lider"] = lan_pro_filtrado["Valor Lançamentos Produtos"] * lan_pro_filtrado["Repasse Investimento Líder"]
-
-    pj1_group_lider = pj1_final.groupby("Cód. Assessor Direto")[["Valor Lider"]].sum().reset_index().rename(columns={"Cód. Assessor Direto":"Código Assessor"})
-    seg_group_lider = seg_final.groupby("Código Assessor")[["Valor Lider"]].sum().reset_index()
-    cam_group_lider = cam_final.groupby("Código Assessor")[["Valor Lider"]].sum().reset_index()
-    co_ter_group_lider = co_ter_final.groupby("Código Assessor")[["Valor Lider"]].sum().reset_index()
-    cre_group_lider = cre_final.groupby("Código Assessor")[["Valor Lider"]].sum().reset_index()
-    xpcs_group_lider = xpcs_final.groupby("Código Assessor")[["Valor Lider"]].sum().reset_index()
-    co_xpvp_group_lider = co_xpvp_final.groupby("Código Assessor")[["Valor Lider"]].sum().reset_index()
-    lan_pro_group_lider = lan_pro_filtrado.groupby("Código do Assessor")[["Valor Lider"]].sum().reset_index().rename(columns={"Código do Assessor":"Código Assessor"})
-
-    atualizacoes_a53030 = {
-        "Valor Assessor PJ1": pj1_group_lider["Valor Lider"].sum(),
-        "Valor Assessor Seguro": seg_group_lider["Valor Lider"].sum(),
-        "Valor Assessor Câmbio": cam_group_lider["Valor Lider"].sum(),
-        "Valor Assessor Co-Corretagem Terceiras": co_ter_group_lider["Valor Lider"].sum(),
-        "Valor Assessor Crédito": cre_group_lider["Valor Lider"].sum(),
-        "Valor Assessor XPCS": xpcs_group_lider["Valor Lider"].sum(),
-        "Valor Assessor Co-Corretagem XPVP": co_xpvp_group_lider["Valor Lider"].sum(),
-        "Valor Lançamentos Produtos": lan_pro_group_lider["Valor Lider"].sum()
-    }
-    for col, v in atualizacoes_a53030.items():
+    lider = (codigos == regras.lider).to_numpy(dtype=bool)
+    for f, col in COLUNAS_LIDER_POR_RAMO.items():
         if col in df_final.columns:
-            df_final.loc[df_final["Código Assessor"]=="A53030", col] += v
+            df_final.loc[lider, col] += ramos[f]["lider"]
 
     # ======================
     # 10) Valor total
     # ======================
-    normal = df_final["Código Assessor"] != "A70108"
-    especial = df_final["Código Assessor"] == "A70108"
+    normal, especial = ~capitao, capitao
 
     df_final.loc[normal, "Valor Total Assessor"] = (
         df_final["Valor Assessor PJ1"] +
@@ -444,130 +1273,21 @@ def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_r
     df_final.loc[especial, "Valor Total Assessor"] = (
         df_final.loc[especial, "Valor Total Assessor"] + soma_valor_seguros
     )
+    marca("9-10) líder + valor total", df_final)
 
     # ======================
     # 11) df_juntar (detalhado) + incluir mesa/líder como no seu novo
     # ======================
-    lan_man["Valor Assessor"] = lan_man["Valor"]
-    valores_debitar = lan_man['Debitar de'].dropna().unique()
-    novas_linhas = []
-    for codigo_debitar in valores_debitar:
-        linhas_mod = lan_man[lan_man['Debitar de'] == codigo_debitar].copy()
-        linhas_mod['Código'] = codigo_debitar
-        linhas_mod['Valor Assessor'] = linhas_mod['Valor negativado']
-        novas_linhas.append(linhas_mod)
-    if novas_linhas:
-        lan_man = pd.concat([lan_man] + novas_linhas, ignore_index=True)
-
-    pj1_juntar = pj1_final[["Cód. Assessor Direto","Categoria","Produto","Cód. Cliente","Receita (R$)","Receita Líquida (R$)","Repasse (%) Escritório","Desconto de Transferência de Clientes Fracionado","Comissão Escritório Tratada","Imposto + Despesa","Valor Imposto","Sem Imposto","percentual tratado","Valor Assessor Direto"]]
-    seg_juntar = seg_final[["Código Assessor","Categoria","Código Cliente","Receita Bruta","Receita Líquida","Comissão (%) Escritório","Comissão Escritório","Imposto + Despesa","Valor Imposto","Sem Imposto","Repasse Investimento Co-Corretagem Capitão","Valor Assessor Seguro"]]
-    cam_juntar = cam_final[["Código Assessor","Categoria","Código Cliente","Receita Bruta","Receita Líquida","Comissão (%) Escritório","Comissão Escritório","Imposto + Despesa","Valor Imposto","Sem Imposto","Repasse Investimento PJ2","Valor Assessor Câmbio"]]
-    co_ter_juntar = co_ter_final[["Código Assessor","Categoria","Código Cliente","Receita Bruta","Receita Líquida","Comissão (%) Escritório","Comissão Escritório","Imposto + Despesa","Valor Imposto","Sem Imposto","Repasse Investimento Co-Corretagem Assessor","Valor Assessor Co-Corretagem Terceiras"]]
-    co_xpvp_juntar = co_xpvp_final[["Código Assessor","Categoria","Código Cliente","Receita Bruta","Receita Líquida","Comissão (%) Escritório","Comissão Escritório","Imposto + Despesa","Valor Imposto","Sem Imposto","Repasse Investimento PJ2","Valor Assessor Co-Corretagem XPVP"]]
-    cre_juntar = cre_final[["Código Assessor","Categoria","Código Cliente","Receita Bruta","Receita Líquida","Comissão (%) Escritório","Comissão Escritório","Imposto + Despesa","Valor Imposto","Sem Imposto","Repasse Investimento PJ2","Valor Assessor Crédito"]]
-    xpcs_juntar = xpcs_final[["Código Assessor","Categoria","Código Cliente","Receita Bruta","Receita Líquida","Comissão (%) Escritório","Comissão Escritório","Imposto + Despesa","Valor Imposto","Sem Imposto","Repasse Investimento PJ2","Valor Assessor XPCS"]]
-    lan_man_juntar = lan_man[["Código","Categoria","Produto","Valor Assessor"]]
-    lan_pro_juntar = lan_pro_filtrado[["Código do Assessor","Categoria","Produto","Cliente","Valor Lançamentos Produtos"]]
-
-    pj1_juntar["Valor Escritório"] = pj1_juntar["Repasse (%) Escritório"] * pj1_juntar["Sem Imposto"]/100
-    seg_juntar["Valor Escritório"] = seg_juntar["Comissão (%) Escritório"] * seg_juntar["Sem Imposto"]
-    cam_juntar["Valor Escritório"] = cam_juntar["Comissão (%) Escritório"] * cam_juntar["Sem Imposto"]
-    co_ter_juntar["Valor Escritório"] = co_ter_juntar["Comissão (%) Escritório"] * co_ter_juntar["Sem Imposto"]
-    co_xpvp_juntar["Valor Escritório"] = co_xpvp_juntar["Comissão (%) Escritório"] * co_xpvp_juntar["Sem Imposto"]
-    cre_juntar["Valor Escritório"] = cre_juntar["Comissão (%) Escritório"] * cre_juntar["Sem Imposto"]
-    xpcs_juntar["Valor Escritório"] = xpcs_juntar["Comissão (%) Escritório"] * xpcs_juntar["Sem Imposto"]
-
-    pj1_juntar = pj1_juntar.rename(columns={
-        "Cód. Assessor Direto":"Código Assessor",
-        "Cód. Cliente":"Código Cliente",
-        "Receita (R$)":"Receita Bruta",
-        "Receita Líquida (R$)":"Receita Líquida",
-        "Repasse (%) Escritório":"Comissão (%) Escritório",
-        "Comissão Escritório Tratada":"Comissão Escritório",
-        "percentual tratado":"percentual",
-        "Valor Assessor Direto":"Valor Assessor"
-    })
-    seg_juntar = seg_juntar.rename(columns={"Repasse Investimento Co-Corretagem Capitão":"percentual","Valor Assessor Seguro":"Valor Assessor"})
-    cam_juntar = cam_juntar.rename(columns={"Repasse Investimento PJ2":"percentual","Valor Assessor Câmbio":"Valor Assessor"})
-    co_ter_juntar = co_ter_juntar.rename(columns={"Repasse Investimento Co-Corretagem Assessor":"percentual","Valor Assessor Co-Corretagem Terceiras":"Valor Assessor"})
-    co_xpvp_juntar = co_xpvp_juntar.rename(columns={"Repasse Investimento PJ2":"percentual","Valor Assessor Co-Corretagem XPVP":"Valor Assessor"})
-    cre_juntar = cre_juntar.rename(columns={"Repasse Investimento PJ2":"percentual","Valor Assessor Crédito":"Valor Assessor"})
-    xpcs_juntar = xpcs_juntar.rename(columns={"Repasse Investimento PJ2":"percentual","Valor Assessor XPCS":"Valor Assessor"})
-    lan_man_juntar = lan_man_juntar.rename(columns={"Código":"Código Assessor"})
-    lan_pro_juntar = lan_pro_juntar.rename(columns={"Código do Assessor":"Código Assessor","Valor Lançamentos Produtos":"Valor Assessor","Cliente":"Código Cliente"})
-
-    df_juntar = pd.concat([pj1_juntar,seg_juntar,cam_juntar,co_ter_juntar,co_xpvp_juntar,cre_juntar,xpcs_juntar,lan_man_juntar,lan_pro_juntar], ignore_index=True)
-
-    # --- adiciona linhas mesa e líder (como seu novo) ---
-    mesa_rf = pj1_final[pj1_final["percentual tratado mesa rf"]!=0].copy()
-    mesa_rv = pj1_final[pj1_final["percentual tratado mesa rv"]!=0].copy()
-    mesa_trader = pj1_final[pj1_final["percentual tratado mesa trader"]!=0].copy()
-    repasse_lider = pj1_final[pj1_final["Repasse Investimento Líder"]!=0].copy()
-
-    def _padroniza_mesa(df, col_perc, col_val, codigo_mesa):
-        base = df[["Cód. Assessor Direto","Categoria","Produto","Cód. Cliente","Receita (R$)","Receita Líquida (R$)","Repasse (%) Escritório","Desconto de Transferência de Clientes Fracionado","Comissão Escritório Tratada","Imposto + Despesa","Valor Imposto","Sem Imposto", col_perc, col_val]].copy()
-        base = base.rename(columns={
-            "Cód. Assessor Direto":"Código Assessor",
-            "Cód. Cliente":"Código Cliente",
-            "Receita (R$)":"Receita Bruta",
-            "Receita Líquida (R$)":"Receita Líquida",
-            "Repasse (%) Escritório":"Comissão (%) Escritório",
-            "Comissão Escritório Tratada":"Comissão Escritório",
-            col_perc:"percentual",
-            col_val:"Valor Assessor"
-        })
-        base["Código Assessor"] = codigo_mesa
-        return base
-
-    mesa_rf = _padroniza_mesa(mesa_rf, "percentual tratado mesa rf", "Valor Mesa RF", "A54626")
-    mesa_rv = _padroniza_mesa(mesa_rv, "percentual tratado mesa rv", "Valor Mesa RV", "A21426")
-    mesa_trader = _padroniza_mesa(mesa_trader, "percentual tratado mesa trader", "Valor Mesa Trader", "A39437")
-
-    repasse_lider = repasse_lider[["Cód. Assessor Direto","Categoria","Produto","Cód. Cliente","Receita (R$)","Receita Líquida (R$)","Repasse (%) Escritório","Desconto de Transferência de Clientes Fracionado","Comissão Escritório Tratada","Imposto + Despesa","Valor Imposto","Sem Imposto","Repasse Investimento Líder","Valor Lider"]].copy()
-    repasse_lider = repasse_lider.rename(columns={
-        "Cód. Assessor Direto":"Código Assessor",
-        "Cód. Cliente":"Código Cliente",
-        "Receita (R$)":"Receita Bruta",
-        "Receita Líquida (R$)":"Receita Líquida",
-        "Repasse (%) Escritório":"Comissão (%) Escritório",
-        "Comissão Escritório Tratada":"Comissão Escritório",
-        "Repasse Investimento Líder":"percentual",
-        "Valor Lider":"Valor Assessor"
-    })
-    repasse_lider["Código Assessor"] = "A53030"
-
-    df_juntar = pd.concat([df_juntar, mesa_rf, mesa_rv, mesa_trader, repasse_lider], ignore_index=True)
+    df_juntar = _montar_df_juntar(ramos, repasses)
+    marca("11) df_juntar", df_juntar)
 
     # ======================
     # 12) Assessor (CÓDIGO - NOME) substituindo "Código Assessor"
     #     -> NÃO cria colunas separadas de código/nome
+    #     (no df_juntar já vem pronto de _montar_df_juntar)
     # ======================
-    # df_juntar
-    df_juntar = df_juntar.merge(
-        tim_rep[["Código", "Nome Completo"]],
-        how="left",
-        left_on="Código Assessor",
-        right_on="Código"
-    )
-
-    df_juntar["Assessor + Nome"] = (
-        df_juntar["Código Assessor"].astype(str) + " - " + df_juntar["Nome Completo"].astype(str)
-    ).str.replace(r"(nan|NaN|None)", "", regex=True).str.strip(" -")
-
-    # 🔥 AQUI é o que você quer:
-    # substitui a coluna "Código Assessor" pelo texto "CÓDIGO - NOME"
-    df_juntar["Código Assessor"] = df_juntar["Assessor + Nome"]
-
-    # remove colunas extras pra não ficar "só código" ou "só nome"
-    df_juntar.drop(columns=["Código", "Nome Completo", "Assessor + Nome"], inplace=True, errors="ignore")
-
     # df_final
-    df_final = df_final.merge(
-        tim_rep[["Código", "Nome Completo"]],
-        how="left",
-        left_on="Código Assessor",
-        right_on="Código"
-    )
+    df_final = _com_nome_completo(df_final, repasses)
 
     df_final["Assessor + Nome"] = (
         df_final["Código Assessor"].astype(str) + " - " + df_final["Nome Completo"].astype(str)
@@ -578,6 +1298,7 @@ def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_r
 
     # remove colunas extras
     df_final.drop(columns=["Código", "Nome Completo", "Assessor + Nome"], inplace=True, errors="ignore")
+    marca("12) código - nome", df_final)
 
     # ======================
     # 13) GARANTIR TIPOS (para gráfico)
@@ -596,5 +1317,6 @@ def calcular_comissoes(pj1, seg, cam, co_ter, co_xpvp, cre, xpcs, lan_man, tim_r
     for c in cols_num_juntar:
         if c in df_juntar.columns:
             df_juntar[c] = pd.to_numeric(df_juntar[c], errors="coerce").fillna(0).round(2)
+    marca("13) tipos", len(df_juntar) + len(df_final))
 
     return df_final, df_juntar
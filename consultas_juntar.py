@@ -0,0 +1,213 @@
+# consultas_juntar.py
+from __future__ import annotations
+
+import pandas as pd
+
+# ordem das colunas na tabela detalhada (mesma do COLUNAS_ORDENADAS do resultado.html)
+COLUNAS_ORDENADAS = [
+    "Código Assessor",
+    "Categoria",
+    "Produto",
+    "Código Cliente",
+    "Receita Bruta",
+    "Receita Líquida",
+    "Comissão (%) Escritório",
+    "Desconto de Transferência de Clientes Fracionado",
+    "Comissão Escritório",
+    "Imposto + Despesa",
+    "Valor Imposto",
+    "Sem Imposto",
+    "percentual",
+    "Valor Assessor",
+    "Valor Escritório",
+]
+
+# colunas auxiliares (calculadas uma vez por df_juntar, nunca vão pro cliente)
+_AUX_ASS = "_ass_busca"
+_AUX_CAT = "_cat_busca"
+_K_ASS = "_k_assessor"
+_K_CAT = "_k_categoria"
+_K_PROD = "_k_produto"
+_AUX = [_AUX_ASS, _AUX_CAT, _K_ASS, _K_CAT, _K_PROD]
+
+
+def _texto(s: pd.Series) -> pd.Series:
+    return s.astype(object).where(s.notna(), "").astype(str)
+
+
+def preparar_df_juntar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adiciona as colunas de busca/agrupamento usadas pelos filtros da árvore.
+    As chaves seguem as regras do dashboard: vazio -> "Sem código" / "Sem categoria" / "Sem produto".
+    """
+    df = df.copy()
+    ass = _texto(df["Código Assessor"]) if "Código Assessor" in df.columns else pd.Series("", index=df.index)
+    cat = _texto(df["Categoria"]) if "Categoria" in df.columns else pd.Series("", index=df.index)
+    prod = _texto(df["Produto"]).str.strip() if "Produto" in df.columns else pd.Series("", index=df.index)
+
+    df[_AUX_ASS] = ass.str.lower()
+    df[_AUX_CAT] = cat.str.lower()
+    df[_K_ASS] = ass.where(ass != "", "Sem código")
+    df[_K_CAT] = cat.where(cat != "", "Sem categoria")
+    df[_K_PROD] = prod.where((prod != "") & (prod.str.lower() != "nan"), "Sem produto")
+    return df
+
+
+def filtrar(df: pd.DataFrame, assessor: str = "", categoria: str = "", produto: str | None = None, exato: bool = False) -> pd.DataFrame:
+    """
+    Filtro da árvore. Normal: "contém", sem diferenciar maiúsculas (igual ao JS antigo).
+    `exato=True`: compara com as chaves de agrupamento (usado ao abrir um nó da tabela hierárquica).
+    """
+    mask = pd.Series(True, index=df.index)
+    if exato:
+        if assessor:
+            mask &= df[_K_ASS] == assessor
+        if categoria:
+            mask &= df[_K_CAT] == categoria
+        if produto:
+            mask &= df[_K_PROD] == produto
+        return df[mask]
+
+    assessor = (assessor or "").strip().lower()
+    categoria = (categoria or "").strip().lower()
+    if assessor:
+        mask &= df[_AUX_ASS].str.contains(assessor, regex=False)
+    if categoria:
+        mask &= df[_AUX_CAT].str.contains(categoria, regex=False)
+    if produto:
+        mask &= df[_K_PROD] == produto
+    return df[mask]
+
+
+def colunas_visiveis(df: pd.DataFrame) -> list[str]:
+    todas = [c for c in df.columns if c not in _AUX]
+    principais = [c for c in COLUNAS_ORDENADAS if c in todas]
+    return principais + [c for c in todas if c not in COLUNAS_ORDENADAS]
+
+
+def paginar(df: pd.DataFrame, pagina: int = 1, por_pagina: int = 100, ordenar: str | None = None, desc: bool = False) -> dict:
+    colunas = colunas_visiveis(df)
+    if ordenar and ordenar in colunas:
+        try:
+            df = df.sort_values(ordenar, ascending=not desc, kind="stable", na_position="last")
+        except TypeError:
+            # coluna object com tipos misturados (ex.: "Código Cliente" com número e texto): ordena pelo texto
+            df = df.sort_values(ordenar, ascending=not desc, kind="stable", na_position="last", key=lambda s: s.astype(str))
+
+    total = len(df)
+    por_pagina = max(1, min(int(por_pagina), 1000))
+    pagina = max(1, int(pagina))
+    pedaco = df.iloc[(pagina - 1) * por_pagina: pagina * por_pagina][colunas]
+
+    # NaN -> null (JSON válido)
+    linhas = pedaco.astype(object).where(pedaco.notna(), None).to_dict(orient="records")
+    return dict(total=total, pagina=pagina, por_pagina=por_pagina, colunas=colunas, linhas=linhas)
+
+
+def _soma(df: pd.DataFrame, col: str) -> float:
+    if col not in df.columns:
+        return 0.0
+    return float(pd.to_numeric(df[col], errors="coerce").sum())
+
+
+def _num(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+
+
+def resumir(df: pd.DataFrame, assessor: str = "", categoria: str = "") -> dict:
+    """
+    Totais pré-agregados do dashboard: árvore, gráficos de categoria/produto,
+    cards de resumo por categoria (só filtro de assessor) e a hierarquia
+    Assessor -> Categoria -> Produto (só totais; as linhas vêm paginadas).
+    """
+    filtrado = filtrar(df, assessor, categoria)
+    valor = _num(filtrado, "Valor Assessor")
+    receita = _num(filtrado, "Receita Bruta")
+
+    por_cat_receita = receita.groupby(filtrado[_K_CAT], sort=False).sum().sort_values(ascending=False, kind="stable")
+    por_cat = valor.groupby(filtrado[_K_CAT], sort=False).sum().sort_values(ascending=False, kind="stable")
+    por_prod = valor.groupby(filtrado[_K_PROD], sort=False).sum().sort_values(ascending=False, kind="stable")
+
+    # mesma regra do JS antigo: linha sem "Comissão Escritório" usa a tratada
+    comissao = _num(filtrado, "Comissão Escritório")
+    if "Comissão Escritório Tratada" in filtrado.columns:
+        if "Comissão Escritório" in filtrado.columns:
+            vazia = filtrado["Comissão Escritório"].isna()
+        else:
+            vazia = pd.Series(True, index=filtrado.index)
+        comissao = comissao.mask(vazia, _num(filtrado, "Comissão Escritório Tratada"))
+
+    arvore = dict(
+        receita_bruta=float(receita.sum()),
+        comissao_escritorio=float(comissao.sum()),
+        valor_imposto=_soma(filtrado, "Valor Imposto"),
+        sem_imposto=_soma(filtrado, "Sem Imposto"),
+        valor_assessor=float(valor.sum()),
+        receita_por_categoria=[[k, float(v)] for k, v in por_cat_receita.items()],
+    )
+
+    # cards: filtra só por assessor, na ordem em que as categorias aparecem
+    so_ass = filtrar(df, assessor, "")
+    cards = pd.DataFrame({
+        "receita": _num(so_ass, "Receita Bruta"),
+        "assessor": _num(so_ass, "Valor Assessor"),
+    }).groupby(so_ass[_K_CAT], sort=False).sum()
+
+    hierarquia = []
+    if len(filtrado):
+        niveis = pd.DataFrame({
+            "ass": filtrado[_K_ASS],
+            "cat": filtrado[_K_CAT],
+            "prod": filtrado[_K_PROD],
+            "valor": valor,
+        })
+        tot_prod = niveis.groupby(["ass", "cat", "prod"])["valor"].agg(["sum", "size"])
+        tot_cat = niveis.groupby(["ass", "cat"])["valor"].sum()
+        tot_ass = niveis.groupby("ass")["valor"].sum()
+
+        for ass, total_ass in tot_ass.items():
+            categorias = []
+            for cat, total_cat in tot_cat.loc[ass].items():
+                prods = tot_prod.loc[(ass, cat)]
+                produtos = [
+                    dict(produto=p, total=float(r["sum"]), linhas=int(r["size"]))
+                    for p, r in prods.iterrows() if p != "Sem produto"
+                ]
+                if "Sem produto" in prods.index:
+                    r = prods.loc["Sem produto"]
+                    produtos.append(dict(produto="Sem produto", total=float(r["sum"]), linhas=int(r["size"])))
+                categorias.append(dict(
+                    categoria=cat,
+                    total=float(total_cat),
+                    linhas=int(prods["size"].sum()),
+                    tem_produto=any(p["produto"] != "Sem produto" for p in produtos),
+                    produtos=produtos,
+                ))
+            hierarquia.append(dict(assessor=ass, total=float(total_ass), categorias=categorias))
+
+    return dict(
+        total_linhas=len(filtrado),
+        arvore=arvore,
+        por_categoria=[[k, float(v)] for k, v in por_cat.items()],
+        por_produto=[[k, float(v)] for k, v in por_prod.items()],
+        resumo_categorias=[dict(categoria=k, receita=float(r["receita"]), assessor=float(r["assessor"])) for k, r in cards.iterrows()],
+        hierarquia=hierarquia,
+    )
+
+
+def opcoes(df: pd.DataFrame, assessor: str = "") -> dict:
+    """Listas do autocomplete: assessores e categorias (do assessor escolhido, se houver)."""
+    ass = sorted(set(df.loc[df[_AUX_ASS] != "", "Código Assessor"].astype(str)))
+
+    cod = (assessor or "").split(" - ")[0].strip().lower()
+    base = df
+    if cod:
+        base = df[df[_AUX_ASS].str.split(" - ").str[0].str.strip() == cod]
+    cats = sorted(set(base.loc[base[_AUX_CAT] != "", "Categoria"].astype(str)))
+    return dict(assessores=ass, categorias=cats)
+
+
+def para_csv(df: pd.DataFrame) -> str:
+    return df[colunas_visiveis(df)].to_csv(sep=";", index=False)
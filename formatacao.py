@@ -0,0 +1,106 @@
+# formatacao.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+# "1,234.56" -> "1.234,56" numa passada só (antes eram três .replace encadeados)
+_TROCA_SEPARADORES = str.maketrans({",": ".", ".": ","})
+
+# acima disso x*100 já não tem precisão de centavo em float64: formata em Python
+_LIMITE_VETORIAL = 2.0 ** 52
+
+
+def numero_brl(valor) -> str:
+    """Um valor no padrão brasileiro: 1234.5 -> "1.234,50" (NaN -> "nan", igual ao f-string)."""
+    return f"{valor:,.2f}".translate(_TROCA_SEPARADORES)
+
+
+def brl(valor) -> str:
+    if pd.isna(valor):
+        valor = 0.0
+    return "R$ " + numero_brl(valor)
+
+
+def _montar_texto(negativo: np.ndarray, centavos: np.ndarray) -> np.ndarray:
+    """
+    Monta "-1.234,56" direto numa matriz de caracteres (uma linha por valor), dígito
+    a dígito, sem chamar str() em cada número. A matriz é lida como strings "U":
+    os caracteres nulos do fim de cada linha somem sozinhos.
+    """
+    n = len(centavos)
+    if n == 0:
+        return np.array([], dtype=str)
+    inteiros = centavos // np.uint64(100)
+    cent = (centavos % np.uint64(100)).astype(np.uint32)
+
+    # quantidade de dígitos da parte inteira (pelo menos 1: "0,50")
+    n_dig = np.ones(n, dtype=np.int64)
+    limite = 10
+    while limite <= int(inteiros.max()):
+        n_dig += inteiros >= np.uint64(limite)
+        limite *= 10
+
+    fim_int = negativo.astype(np.int64) + n_dig + (n_dig - 1) // 3  # posição da vírgula
+    largura = int(fim_int.max()) + 3
+    descarte = largura  # coluna extra que recebe as escritas das linhas com menos dígitos
+
+    buf = np.zeros((n, largura + 1), dtype=np.uint32)
+    linhas = np.arange(n)
+    buf[negativo, 0] = ord("-")
+
+    resto = inteiros.copy()
+    for r in range(int(n_dig.max())):
+        tem = n_dig > r
+        digito = (resto % np.uint64(10)).astype(np.uint32) + ord("0")
+        buf[linhas, np.where(tem, fim_int - 1 - (r + r // 3), descarte)] = digito
+        if r % 3 == 0 and r > 0:
+            buf[linhas, np.where(tem, fim_int - r - r // 3, descarte)] = ord(".")
+        resto //= np.uint64(10)
+
+    buf[linhas, fim_int] = ord(",")
+    buf[linhas, fim_int + 1] = cent // 10 + ord("0")
+    buf[linhas, fim_int + 2] = cent % 10 + ord("0")
+    buf[:, descarte] = 0
+    return np.ascontiguousarray(buf[:, :largura]).view(f"U{largura}").ravel()
+
+
+def formatar_brl_array(valores) -> np.ndarray:
+    """
+    Versão vetorizada de numero_brl para uma coluna inteira.
+    O texto sai idêntico ao f"{x:,.2f}" com os separadores trocados, inclusive
+    "-0,00", "nan", "inf"/"-inf". Valores em que o arredondamento do centavo
+    fica ambíguo em float (meio centavo exato, números enormes) caem no caminho em Python.
+    """
+    v = np.asarray(valores)
+    if v.dtype.kind in "iu":
+        negativo = v < 0
+        fallback = np.abs(v.astype(np.float64)) >= _LIMITE_VETORIAL / 100
+        centavos = np.where(fallback, 0, np.abs(v)).astype(np.uint64) * np.uint64(100)
+        especiais = np.zeros(len(v), dtype=bool)
+    else:
+        v = v.astype(np.float64)
+        negativo = np.signbit(v)
+        especiais = ~np.isfinite(v)
+        a = np.where(especiais, 0.0, np.abs(v))
+        with np.errstate(over="ignore", invalid="ignore"):
+            y = a * 100.0
+            # perto de ,xx5 o produto em float pode ter arredondado pro lado errado
+            fallback = (y >= _LIMITE_VETORIAL) | (np.abs(y - np.floor(y) - 0.5) <= 4 * np.spacing(y))
+        centavos = np.where(fallback | especiais, 0.0, np.rint(y)).astype(np.uint64)
+
+    texto = _montar_texto(negativo, centavos).astype(object)
+
+    for i in np.flatnonzero(fallback | especiais):
+        texto[i] = numero_brl(v[i])
+    return texto
+
+
+def formatar_colunas_brl(df: pd.DataFrame, colunas=None) -> pd.DataFrame:
+    """Cópia do df com as colunas numéricas (ou `colunas`) formatadas como texto em BRL."""
+    df = df.copy()
+    if colunas is None:
+        colunas = df.select_dtypes(include=["number"]).columns
+    for col in colunas:
+        df[col] = pd.Series(formatar_brl_array(df[col].to_numpy()), index=df.index, dtype=object)
+    return df
@@ -0,0 +1,207 @@
+# indice_versoes.py
+# Índice único das versões guardadas no bucket (competência -> versão -> caminhos,
+# tamanhos, linhas, total, datas), num objeto só (indice_versoes.json). As listagens
+# do app (competências, df_final de uma competência, próxima versão) leem daqui, de um
+# cache em memória com validade (INDICE_TTL_S), sem listar o bucket a cada página.
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+CAMINHO_INDICE = "indice_versoes.json"
+VERSAO_INDICE = 1
+
+_RE_VERSAO_V = re.compile(r"^v(\d+)$")
+_RE_VERSAO_TS = re.compile(r"^\d{8}_\d{6}$")
+
+# marcas das últimas gravações guardadas no índice: quem grava confere a sua ao reler
+_HISTORICO_GRAVACOES = 50
+
+
+class IndiceIndisponivel(RuntimeError):
+    """Não deu pra ler o índice (ou as listagens para reconstruí-lo) do bucket: erro de rede/servidor, não 404."""
+
+
+def agora_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def indice_vazio() -> dict:
+    return {"versao": VERSAO_INDICE, "atualizado_em": None, "competencias": {}}
+
+
+def chave_ordem_versao(version_id: str):
+    """vN (numérico) acima dos nomes antigos por data/hora; mesma ordem do bucket de antes."""
+    mv = _RE_VERSAO_V.match(version_id)
+    if mv:
+        return (2, int(mv.group(1)))
+    if _RE_VERSAO_TS.match(version_id):
+        return (1, version_id)
+    return (0, version_id)
+
+
+class IndiceVersoes:
+    """
+    Lê/grava o índice pelo TransferenciasStorage do app. `reconstruir()` monta um índice
+    a partir das listagens do bucket: só quando o objeto não existe (404) ou é ilegível,
+    nunca por falha de rede (aí vale o cache ou IndiceIndisponivel), e deve levantar
+    exceção se alguma listagem falhar.
+
+    Cada gravação relê o índice do bucket, aplica a mudança e sobe o objeto inteiro de
+    uma vez: quem lê vê o índice de antes ou o de depois, nunca pela metade. Gravações
+    da mesma instância são serializadas pelo lock; entre instâncias, quem grava relê o
+    índice e, se outra gravação passou por cima da sua, aplica a mudança de novo.
+    """
+
+    def __init__(self, transferencias, reconstruir, caminho: str = CAMINHO_INDICE, ttl_s: float | None = None):
+        self.transferencias = transferencias
+        self.reconstruir = reconstruir
+        self.caminho = caminho
+        self.ttl_s = ttl_s if ttl_s is not None else float(os.getenv("INDICE_TTL_S", "30"))
+        self._cache: tuple[dict, float] | None = None
+        self._reservadas: dict[str, set[int]] = {}
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------ leitura
+
+    def obter(self, fresco: bool = False) -> dict:
+        """Índice inteiro (não altere o dict devolvido). `fresco` ignora o cache."""
+        with self._lock:
+            if not fresco and self._cache is not None and time.monotonic() - self._cache[1] < self.ttl_s:
+                return self._cache[0]
+            try:
+                indice = self._baixar()
+            except IndiceIndisponivel as e:
+                # leitura: o cache vencido serve até o bucket voltar (gravação precisa do fresco)
+                if fresco or self._cache is None:
+                    raise
+                print("[indice] usando o cache:", e)
+                return self._cache[0]
+            if indice is None:
+                indice = self.reconstruir()
+                print(f"[indice] reconstruído das listagens: {len(indice['competencias'])} competências")
+                self._gravar(indice)
+            self._cache = (indice, time.monotonic())
+            return indice
+
+    def competencias(self) -> list[str]:
+        return sorted(self.obter()["competencias"], reverse=True)
+
+    def versoes(self, comp: str) -> list[str]:
+        """Versões da competência, da mais recente para a mais antiga."""
+        return sorted(self.obter()["competencias"].get(comp, {}), key=chave_ordem_versao, reverse=True)
+
+    def versao(self, comp: str, version_id: str) -> dict | None:
+        return self.obter()["competencias"].get(comp, {}).get(version_id)
+
+    def reservar_versao(self, comp: str) -> int:
+        """
+        Número da próxima vN da competência, lido do índice no bucket. Fica reservado
+        nesta instância até ser gravado (duas tarefas ao mesmo tempo não pegam o mesmo).
+        """
+        with self._lock:
+            usados = {
+                int(m.group(1))
+                for v in self.obter(fresco=True)["competencias"].get(comp, {})
+                if (m := _RE_VERSAO_V.match(v))
+            }
+            reservadas = self._reservadas.setdefault(comp, set())
+            prox = max(usados | reservadas, default=0) + 1
+            reservadas.add(prox)
+            return prox
+
+    # ------------------------------------------------------------------ gravação
+
+    def atualizar(self, funcao, tentativas: int = 3) -> bool:
+        """
+        Aplica funcao(indice) sobre o índice atual do bucket e grava. Depois relê: se a
+        marca desta gravação sumiu (outra instância gravou por cima a partir do índice de
+        antes), aplica de novo sobre o que está lá. False se não gravou.
+        """
+        with self._lock:
+            for _ in range(tentativas):
+                indice = self.obter(fresco=True)
+                indice = json.loads(json.dumps(indice))  # o do cache não muda se a gravação falhar
+                funcao(indice)
+                marca = uuid.uuid4().hex
+                indice["gravacoes"] = (indice.get("gravacoes") or [])[-(_HISTORICO_GRAVACOES - 1):] + [marca]
+                if not self._gravar(indice):
+                    return False
+                try:
+                    relido = self._baixar()
+                except IndiceIndisponivel as e:
+                    print("[indice] gravado, mas não consegui reler para conferir:", e)
+                    return True
+                if relido is not None and marca in (relido.get("gravacoes") or []):
+                    self._cache = (relido, time.monotonic())
+                    return True
+                print("[indice] outra instância gravou por cima, aplicando de novo")
+            return False
+
+    def gravar_versao(self, comp: str, version_id: str, entrada: dict) -> bool:
+        """
+        Cria/atualiza a entrada de uma versão: os campos de `entrada` vão por cima dos que
+        já existem ("fontes" por fonte: só as que vierem mudam).
+        """
+        def aplicar(indice):
+            versoes = indice["competencias"].setdefault(comp, {})
+            atual = versoes.get(version_id) or {"criado_em": agora_iso()}
+            campos = dict(entrada)
+            atual.setdefault("fontes", {}).update(campos.pop("fontes", None) or {})
+            atual.update(campos)
+            atual["atualizado_em"] = agora_iso()
+            atual["revisao"] = atual.get("revisao", 0) + 1
+            versoes[version_id] = atual
+
+        ok = self.atualizar(aplicar)
+        mv = _RE_VERSAO_V.match(version_id)
+        if mv:
+            with self._lock:
+                self._reservadas.get(comp, set()).discard(int(mv.group(1)))
+        return ok
+
+    def invalidar(self):
+        with self._lock:
+            self._cache = None
+
+    # ------------------------------------------------------------------ bucket
+
+    def _baixar(self) -> dict | None:
+        """Índice do bucket; None se ele não existe (404) ou não serve. IndiceIndisponivel em outra falha."""
+        r = self.transferencias.baixar_varios([self.caminho])[self.caminho]
+        if not r.ok and r.status == 404:
+            return None
+        if not r.ok:
+            raise IndiceIndisponivel(f"{self.caminho}: {r.erro}")
+        if not r.dados:
+            return None
+        try:
+            indice = json.loads(r.dados)
+        except ValueError as e:
+            print("[indice] ilegível, reconstruindo:", e)
+            return None
+        if not isinstance(indice, dict) or indice.get("versao") != VERSAO_INDICE:
+            return None
+        return indice
+
+    def _gravar(self, indice: dict) -> bool:
+        indice["atualizado_em"] = agora_iso()
+        conteudo = json.dumps(indice, ensure_ascii=False).encode("utf-8")
+        r = self.transferencias.enviar_varios([(self.caminho, conteudo, "application/json")])[self.caminho]
+        if r.ok:
+            self._cache = (indice, time.monotonic())
+            return True
+        # índice velho no bucket repetiria números de versão: sem ele, a próxima leitura
+        # reconstrói das listagens
+        print("[indice] erro ao gravar, removendo para reconstruir:", r.erro)
+        self._cache = None
+        try:
+            self.transferencias.bucket.remove([self.caminho])
+        except Exception as e:
+            print("[indice] erro ao remover:", e)
+        return False
@@ -0,0 +1,291 @@
+# ingestao.py
+from __future__ import annotations
+
+import multiprocessing
+import os
+import time
+from collections.abc import Iterator
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+# =====================================================================
+# Colunas que o calcular_comissoes realmente usa (por fonte)
+# =====================================================================
+
+_TEXTO = str
+_NUM = "float64"
+
+_COLUNAS_LINHAS = {
+    "Código Assessor": _TEXTO,
+    "Categoria": _TEXTO,
+    "Código Cliente": None,
+    "Receita Bruta": _NUM,
+    "Receita Líquida": _NUM,
+    "Comissão (%) Escritório": _NUM,
+    "Comissão Escritório": _NUM,
+}
+
+# None = lê sem dtype declarado (deixa o pandas inferir)
+COLUNAS_POR_FONTE: dict[str, dict[str, object]] = {
+    "pj1": {
+        "Data": None,
+        "Categoria": _TEXTO,
+        "Produto": _TEXTO,
+        "Cód. Assessor Direto": _TEXTO,
+        "Cód. Cliente": None,
+        "Receita (R$)": _NUM,
+        "Receita Líquida (R$)": _NUM,
+        "Repasse (%) Escritório": _NUM,
+        "Comissão Bruta (R$) Escritório": _NUM,
+        "Comissão (R$) Assessor Direto": _NUM,
+        "Comissão (R$) Assessor Indireto I": _NUM,
+        "Comissão (R$) Assessor Indireto II": _NUM,
+        "Comissão (R$) Assessor Indireto III": _NUM,
+    },
+    "seg": _COLUNAS_LINHAS,
+    "cam": _COLUNAS_LINHAS,
+    "co_ter": _COLUNAS_LINHAS,
+    "co_xpvp": _COLUNAS_LINHAS,
+    "cre": _COLUNAS_LINHAS,
+    "xpcs": _COLUNAS_LINHAS,
+    "lan_man": {
+        "Código": _TEXTO,
+        "Categoria": _TEXTO,
+        "Produto": _TEXTO,
+        "Nome Completo": _TEXTO,
+        "Valor": _NUM,
+        "Debitar de": _TEXTO,
+    },
+    "tim_rep": {
+        "Código": _TEXTO,
+        "Nome Completo": _TEXTO,
+        "Líder": None,
+        "Posição": None,
+        "Imposto + Despesa": _NUM,
+        "Comisssionado": None,
+        "% RV": _NUM,
+        "% RF": _NUM,
+        "% Outros Investimentos": _NUM,
+        "% PJ2": _NUM,
+        "% Líder": _NUM,
+        "% Mesa RV": _NUM,
+        "% Mesa RF": _NUM,
+        "% Co-Corretagem Assessor": _NUM,
+        "% Co-Corretagem Capitão": _NUM,
+        "% Mesa Trader": _NUM,
+        "% Trader Assessor": _NUM,
+    },
+    "lan_pro": {
+        "Código do Assessor": _TEXTO,
+        "Categoria": _TEXTO,
+        "Produto": _TEXTO,
+        "Cliente": None,
+        "Comissão Escritório": _NUM,
+    },
+}
+
+# PJ1 primeiro: é o maior arquivo, então entra no pool antes dos outros
+ORDEM_LEITURA = ["pj1", "seg", "cam", "co_ter", "co_xpvp", "cre", "xpcs", "lan_man", "tim_rep", "lan_pro"]
+
+
+def _usar_coluna(chave: str, colunas: dict, coluna) -> bool:
+    # o tim_rep traz também os % não declarados: uma mesa nova do regras_assessores.json
+    # usa a coluna "% <repasse>" sem mudar o código
+    return coluna in colunas or (chave == "tim_rep" and str(coluna).startswith("% "))
+
+
+def ler_fonte(chave: str, conteudo: bytes) -> tuple[pd.DataFrame, float, bool]:
+    """
+    Lê uma fonte inteira, com todas as colunas (é o df que vai para o gêmeo Parquet e
+    para o dashboard) e com dtypes declarados nas colunas que o cálculo usa. Se faltar
+    alguma dessas colunas (ou o dtype não bater), cai no read_excel sem dtypes de antes.
+    O cálculo recebe só as colunas dele: para_calculo(chave, df).
+    Retorna (df, segundos, usou_dtypes).
+    """
+    inicio = time.perf_counter()
+    colunas = COLUNAS_POR_FONTE.get(chave)
+
+    if colunas:
+        dtypes = {c: t for c, t in colunas.items() if t is not None}
+        try:
+            df = pd.read_excel(BytesIO(conteudo), dtype=dtypes)
+            if all(c in df.columns for c in colunas):
+                return df, time.perf_counter() - inicio, True
+        except (ValueError, TypeError):
+            pass
+
+    df = pd.read_excel(BytesIO(conteudo))
+    return df, time.perf_counter() - inicio, False
+
+
+def para_calculo(chave: str, df):
+    """
+    Só as colunas de `df` que o cálculo usa (COLUNAS_POR_FONTE). Faltando alguma, ou
+    sem df (FonteEmBlocos, que já lê só essas colunas), devolve `df` como veio.
+    """
+    colunas = COLUNAS_POR_FONTE.get(chave)
+    if not colunas or not isinstance(df, pd.DataFrame) or not all(c in df.columns for c in colunas):
+        return df
+    return df[[c for c in df.columns if _usar_coluna(chave, colunas, c)]]
+
+
+# =====================================================================
+# PJ1 em blocos (arquivos grandes)
+# =====================================================================
+
+def pj1_em_blocos(tamanho_bytes: int) -> bool:
+    """PJ1_EM_BLOCOS_MB=N: PJ1 com mais de N MB é lido/calculado em blocos (desligado por padrão)."""
+    limite = os.getenv("PJ1_EM_BLOCOS_MB", "").strip()
+    try:
+        return bool(limite) and tamanho_bytes > float(limite) * 1024 * 1024
+    except ValueError:
+        return False
+
+
+def _valor_celula(cell):
+    # mesma conversão do leitor openpyxl do pandas (read_excel);
+    # "e"/"n" = openpyxl.cell.cell.TYPE_ERROR/TYPE_NUMERIC
+    if cell.value is None:
+        return ""
+    if cell.data_type == "e":
+        return np.nan
+    if cell.data_type == "n":
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+
+class FonteEmBlocos:
+    """
+    Fonte lida aos pedaços direto do .xlsx (openpyxl read-only), só com as colunas de
+    COLUNAS_POR_FONTE: o arquivo inteiro nunca vira um DataFrame. Cada chamada de
+    `blocos()` relê o arquivo do começo (o cálculo em blocos passa duas vezes).
+    Os valores saem como no read_excel: mesma conversão de célula, dtypes declarados,
+    linhas vazias do meio mantidas e as do fim descartadas.
+    """
+
+    def __init__(self, chave: str, conteudo: bytes, linhas_por_bloco: int | None = None):
+        self.chave = chave
+        self.conteudo = conteudo
+        self.linhas_por_bloco = linhas_por_bloco or int(os.getenv("PJ1_BLOCO_LINHAS", "100000"))
+
+    def blocos(self) -> Iterator[pd.DataFrame]:
+        """DataFrames de até `linhas_por_bloco` linhas, com índice contínuo entre os blocos (pelo menos um)."""
+        from openpyxl import load_workbook
+
+        colunas = COLUNAS_POR_FONTE[self.chave]
+        dtypes = {c: t for c, t in colunas.items() if t is not None}
+        livro = load_workbook(BytesIO(self.conteudo), read_only=True, data_only=True, keep_links=False)
+        try:
+            planilha = livro.worksheets[0]
+            planilha.reset_dimensions()
+            linhas = planilha.rows
+
+            cabecalho = [_valor_celula(c) for c in next(linhas, ())]
+            posicoes = {}
+            for i, nome in enumerate(cabecalho):
+                if nome in colunas and nome not in posicoes:
+                    posicoes[nome] = i
+            nomes = list(posicoes)
+            indices = list(posicoes.values())
+
+            def montar(pendentes: list, inicio: int) -> pd.DataFrame:
+                df = TextParser([nomes] + pendentes, header=0, dtype=dtypes, skip_blank_lines=False).read()
+                df.index = pd.RangeIndex(inicio, inicio + len(df))
+                return df
+
+            bloco, vazias, inicio = [], [], 0
+            for linha in linhas:
+                if all(c.value is None or c.value == "" for c in linha):
+                    # só entra se aparecer outra linha com dado depois (o read_excel corta as do fim)
+                    vazias.append([""] * len(indices))
+                    continue
+                bloco += vazias
+                vazias = []
+                bloco.append([_valor_celula(linha[i]) if i < len(linha) else "" for i in indices])
+                if len(bloco) >= self.linhas_por_bloco:
+                    yield montar(bloco, inicio)
+                    inicio += len(bloco)
+                    bloco = []
+            if bloco or not inicio:
+                yield montar(bloco, inicio)
+        finally:
+            livro.close()
+
+
+def _contexto_pool():
+    """
+    O pool sobe de dentro da thread da tarefa (tarefas.FilaTarefas): com fork o filho
+    herdaria locks presos por outras threads. forkserver (filhos saem de um servidor
+    limpo, que já importou este módulo) ou, onde não existe, spawn.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload([__name__])
+        return contexto
+    return multiprocessing.get_context("spawn")
+
+
+def _workers_padrao() -> int:
+    env = os.getenv("INGESTAO_WORKERS")
+    if env and env.isdigit():
+        return max(1, int(env))
+    return max(1, min(len(ORDEM_LEITURA), os.cpu_count() or 1))
+
+
+def ler_fontes(slots: dict, max_workers: int | None = None) -> tuple[dict[str, pd.DataFrame], dict[str, float]]:
+    """
+    Lê as fontes ao mesmo tempo num pool de processos.
+    `slots` é o dict de classificar_arquivos (chave -> arquivo enviado); pode trazer só
+    parte das dez fontes (as outras já vieram de outro lugar) e só essas são lidas.
+    Cada df vem inteiro (ler_fonte); o cálculo recebe para_calculo(chave, df).
+    Com PJ1_EM_BLOCOS_MB, o PJ1 grande volta como FonteEmBlocos (ver pj1_em_blocos).
+    Retorna (dfs, tempos_em_segundos_por_fonte).
+    """
+    chaves = [chave for chave in ORDEM_LEITURA if chave in slots]
+    conteudos = {}
+    for chave in chaves:
+        f = slots[chave]
+        f.seek(0)
+        conteudos[chave] = f.read()
+
+    # PJ1 grande: fica como FonteEmBlocos e é lido aos pedaços durante o cálculo
+    em_blocos = {}
+    if "pj1" in conteudos and pj1_em_blocos(len(conteudos["pj1"])):
+        fonte = em_blocos["pj1"] = FonteEmBlocos("pj1", conteudos.pop("pj1"))
+        print(f"[ingestao] pj1: {len(fonte.conteudo) / 1024 ** 2:.0f} MB, em blocos de {fonte.linhas_por_bloco} linhas (lido no cálculo)")
+
+    # uma fonte só (ou nenhuma) não compensa subir o pool
+    max_workers = min(max_workers or _workers_padrao(), len(conteudos))
+    resultados = {}
+
+    if max_workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=_contexto_pool()) as pool:
+                futuros = {chave: pool.submit(ler_fonte, chave, conteudos[chave]) for chave in conteudos}
+                resultados = {chave: fut.result() for chave, fut in futuros.items()}
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            # ambiente sem multiprocessing (ex.: serverless sem /dev/shm)
+            print("Pool de processos indisponível, lendo em sequência:", e)
+            resultados = {}
+
+    for chave in conteudos:
+        if chave not in resultados:
+            resultados[chave] = ler_fonte(chave, conteudos[chave])
+
+    dfs = {chave: em_blocos[chave] if chave in em_blocos else resultados[chave][0] for chave in chaves}
+    tempos = {chave: r[1] for chave, r in resultados.items()}
+
+    for chave in sorted(tempos, key=tempos.get, reverse=True):
+        df, seg, tipado = resultados[chave]
+        modo = "dtypes declarados" if tipado else "sem dtypes"
+        print(f"[ingestao] {chave}: {seg:.2f}s, {len(df)} linhas ({modo})")
+
+    return dfs, tempos
@@ -0,0 +1,130 @@
+# memo_resultados.py
+# Resultados do cálculo guardados em disco local, pela "impressão digital" das dez
+# entradas + VERSAO_MOTOR + regras de assessores: recalcular com as mesmas entradas
+# (reabrir, substituir pela mesma fonte, deletar e colocar de volta) vira uma leitura.
+# df_final/df_juntar em Parquet; os ramos (pro recálculo incremental) em ramos_salvos.
+# Pasta em CACHE_RESULTADOS_DIR, limite em CACHE_RESULTADOS_MB (0 desliga); passando
+# do limite saem os resultados usados há mais tempo.
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+import pandas as pd
+
+import ramos_salvos
+
+
+def impressao_df(df) -> str:
+    """
+    Impressão digital estável de uma entrada: colunas, dtypes e o hash de cada linha
+    (índice incluído). Fonte em blocos (tem .conteudo) usa o hash dos bytes do arquivo.
+    """
+    h = hashlib.sha256()
+    conteudo = getattr(df, "conteudo", None)
+    if conteudo is not None:
+        h.update(b"bytes:")
+        h.update(conteudo)
+        return h.hexdigest()
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def chave_resultado(impressoes: dict[str, str], versao_motor: str, regras: str) -> str:
+    """Chave do resultado: impressões das entradas (por nome), versão do motor e assinatura das regras."""
+    h = hashlib.sha256(f"{versao_motor}|{regras}".encode("utf-8"))
+    for nome in sorted(impressoes):
+        h.update(f"|{nome}={impressoes[nome]}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _tamanho_pasta(pasta: str) -> int:
+    total = 0
+    for nome in os.listdir(pasta):
+        try:
+            total += os.path.getsize(os.path.join(pasta, nome))
+        except OSError:
+            pass
+    return total
+
+
+class MemoResultados:
+    """obter(chave) -> (df_final, df_juntar, ramos) ou None; guardar(chave, ...)."""
+
+    def __init__(self, pasta: str | None = None, limite_bytes: int | None = None):
+        self.pasta = pasta or os.getenv("CACHE_RESULTADOS_DIR") or os.path.join(tempfile.gettempdir(), "comissoes_resultados")
+        if limite_bytes is None:
+            limite_bytes = int(os.getenv("CACHE_RESULTADOS_MB", "1024")) * 1024 * 1024
+        self.limite_bytes = limite_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def ativo(self) -> bool:
+        return self.limite_bytes > 0
+
+    def obter(self, chave: str):
+        if not self.ativo:
+            return None
+        pasta = os.path.join(self.pasta, chave)
+        try:
+            df_final = pd.read_parquet(os.path.join(pasta, "df_final.parquet"))
+            df_juntar = pd.read_parquet(os.path.join(pasta, "df_juntar.parquet"))
+            with open(os.path.join(pasta, "ramos.zip"), "rb") as f:
+                _, ramos = ramos_salvos.ramos_de_bytes(f.read())
+            os.utime(pasta)  # usado agora: fica por último na fila de despejo
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[memo] resultado {chave[:12]} ilegível, descartando:", e)
+            shutil.rmtree(pasta, ignore_errors=True)
+            return None
+        print(f"[memo] resultado {chave[:12]} lido do disco")
+        return df_final, df_juntar, ramos
+
+    def guardar(self, chave: str, df_final: pd.DataFrame, df_juntar: pd.DataFrame, ramos: dict | None):
+        """Grava numa pasta temporária e renomeia (quem lê nunca vê um resultado pela metade)."""
+        if not self.ativo:
+            return
+        destino = os.path.join(self.pasta, chave)
+        if os.path.isdir(destino):
+            return
+        temp = os.path.join(self.pasta, f".{chave}.{uuid.uuid4().hex}")
+        try:
+            os.makedirs(temp)
+            df_final.to_parquet(os.path.join(temp, "df_final.parquet"))
+            df_juntar.to_parquet(os.path.join(temp, "df_juntar.parquet"))
+            with open(os.path.join(temp, "ramos.zip"), "wb") as f:
+                f.write(ramos_salvos.ramos_para_bytes(ramos, {}))
+            os.rename(temp, destino)
+        except Exception as e:
+            # ex.: coluna com tipos misturados que não vira Parquet; o cálculo segue sem memo
+            print(f"[memo] não consegui guardar o resultado {chave[:12]}:", e)
+            shutil.rmtree(temp, ignore_errors=True)
+            return
+        self._despejar()
+
+    def limpar(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def _despejar(self):
+        with self._lock:
+            itens = []
+            for nome in os.listdir(self.pasta):
+                caminho = os.path.join(self.pasta, nome)
+                if nome.startswith(".") or not os.path.isdir(caminho):
+                    continue
+                try:
+                    itens.append((os.path.getmtime(caminho), _tamanho_pasta(caminho), caminho))
+                except OSError:
+                    continue
+            total = sum(t for _, t, _ in itens)
+            for _, tamanho, caminho in sorted(itens):
+                if total <= self.limite_bytes:
+                    break
+                shutil.rmtree(caminho, ignore_errors=True)
+                total -= tamanho
@@ -0,0 +1,154 @@
+# pacote_zip.py
+# Uma versão inteira (df_final, df_juntar e as dez fontes) num .zip que sai em pedaços
+# enquanto é montado: os objetos são baixados em paralelo (uma janela de alguns à
+# frente da entrada sendo escrita) e cada um vira uma entrada assim que chega, sem o
+# .zip inteiro em memória. As entradas vão sem compressão (ZIP_STORED: o .xlsx já é
+# um zip) e o destino não tem seek (tamanho/CRC no descritor depois dos dados), então
+# o tamanho do .zip só depende dos nomes e tamanhos: tamanho_zip dá o Content-Length
+# antes de baixar qualquer coisa.
+from __future__ import annotations
+
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Iterator, NamedTuple
+
+BLOCO = 1024 * 1024
+
+# data mínima que o formato zip aceita
+_DATA_MINIMA = (1980, 1, 1, 0, 0, 0)
+
+# tamanhos fixos dos registros, como o zipfile os escreve (entradas com descritor)
+_CABECALHO_LOCAL = 30
+_EXTRA_ZIP64_LOCAL = 20  # id + tamanho + file_size e compress_size de 8 bytes
+_DESCRITOR = 16  # assinatura, CRC e os dois tamanhos de 4 bytes
+_DESCRITOR_ZIP64 = 24  # tamanhos de 8 bytes
+_CENTRAL = 46
+_FIM = 22
+_FIM_ZIP64 = 56 + 20  # registro de fim zip64 + localizador
+
+
+class ArquivoZip(NamedTuple):
+    nome: str  # caminho dentro do .zip
+    path: str  # caminho no bucket
+    tamanho: int | None  # bytes esperados (None: desconhecido)
+
+
+class _Saida:
+    """Destino do ZipFile, sem seek: junta o que foi escrito até alguém retirar."""
+
+    def __init__(self):
+        self._partes: list[bytes] = []
+        self._posicao = 0
+
+    def write(self, dados) -> int:
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def retirar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes = []
+        return dados
+
+
+def data_hora_zip(iso: str | None) -> tuple:
+    """Data ISO (a do índice) como date_time de entrada do zip."""
+    try:
+        d = datetime.fromisoformat(iso)
+    except (TypeError, ValueError):
+        return _DATA_MINIMA
+    if d.year < 1980:
+        return _DATA_MINIMA
+    return (d.year, d.month, d.day, d.hour, d.minute, d.second)
+
+
+def _info(nome: str, data_hora: tuple, tamanho: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(nome, date_time=data_hora)
+    info.compress_type = zipfile.ZIP_STORED
+    info.external_attr = 0o644 << 16
+    # o zipfile decide pelo tamanho se a entrada precisa de zip64
+    info.file_size = tamanho
+    return info
+
+
+def tamanho_zip(arquivos: list[ArquivoZip], data_hora: tuple) -> int | None:
+    """
+    Tamanho exato do .zip que gerar_zip monta com esses arquivos (None se algum tamanho
+    for desconhecido): soma os registros que o zipfile escreve para cada entrada, com as
+    mesmas regras de zip64, sem passar o conteúdo por ele.
+    """
+    if any(a.tamanho is None for a in arquivos):
+        return None
+    limite = zipfile.ZIP64_LIMIT
+    posicao = 0  # fim das entradas = início do diretório central
+    central = 0
+    for arq in arquivos:
+        nome = len(_info(arq.nome, data_hora, arq.tamanho).filename.encode("utf-8"))
+        # o zipfile abre a entrada em zip64 com 5% de folga (ZipFile._open_to_write)
+        zip64 = arq.tamanho * 1.05 > limite
+        posicao_local = posicao
+        posicao += _CABECALHO_LOCAL + nome + arq.tamanho
+        posicao += _EXTRA_ZIP64_LOCAL + _DESCRITOR_ZIP64 if zip64 else _DESCRITOR
+
+        # no diretório central o extra zip64 só leva os campos que estouram
+        campos_zip64 = (2 if arq.tamanho > limite else 0) + (1 if posicao_local > limite else 0)
+        central += _CENTRAL + nome + (4 + 8 * campos_zip64 if campos_zip64 else 0)
+
+    fim = _FIM
+    if len(arquivos) > zipfile.ZIP_FILECOUNT_LIMIT or posicao > limite or central > limite:
+        fim += _FIM_ZIP64
+    return posicao + central + fim
+
+
+def gerar_zip(
+    arquivos: list[ArquivoZip],
+    baixar: Callable[[str], bytes],
+    data_hora: tuple,
+    paralelo: int = 4,
+) -> Iterator[bytes]:
+    """
+    Pedaços do .zip com os `arquivos`, na ordem da lista. baixar(path) -> bytes roda em
+    até `paralelo` threads, à frente da entrada sendo escrita. Erro no download, ou
+    tamanho diferente do esperado (o Content-Length já foi), interrompe o .zip.
+    """
+    paralelo = max(1, paralelo)
+    pool = ThreadPoolExecutor(max_workers=paralelo)
+    restantes = iter(arquivos)
+    pendentes = deque()
+
+    def agendar(n: int):
+        for arq in islice(restantes, n):
+            pendentes.append((arq, pool.submit(baixar, arq.path)))
+
+    saida = _Saida()
+    try:
+        agendar(paralelo)
+        with zipfile.ZipFile(saida, "w") as zf:
+            while pendentes:
+                arq, futuro = pendentes.popleft()
+                dados = futuro.result()
+                agendar(1)
+                if arq.tamanho is not None and len(dados) != arq.tamanho:
+                    raise ValueError(f"{arq.path}: {len(dados)} bytes, esperados {arq.tamanho}")
+                vista = memoryview(dados)
+                with zf.open(_info(arq.nome, data_hora, len(dados)), "w") as entrada:
+                    for inicio in range(0, len(dados), BLOCO):
+                        entrada.write(vista[inicio: inicio + BLOCO])
+                        pedaco = saida.retirar()
+                        if pedaco:
+                            yield pedaco
+                del vista, dados
+        # descritor da última entrada e diretório central
+        yield saida.retirar()
+    finally:
+        # cliente desistiu no meio (ou erro): downloads na fila não começam
+        pool.shutdown(wait=False, cancel_futures=True)
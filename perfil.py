@@ -0,0 +1,149 @@
+# perfil.py
+# Perfil opcional por etapa (PERFIL_ETAPAS=1): tempo, linhas que entraram/saíram e
+# variação de memória de cada etapa das rotas (parse, compute, upload, render) e de cada
+# seção do cálculo. As seções de um ramo (ex.: "pj1 4) ...") aparecem antes do total do
+# ramo ("ramos pj1"), que já as inclui.
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# perfil da requisição/cálculo atual (None = desligado: as marcações não custam nada)
+_ATUAL: contextvars.ContextVar["Perfil | None"] = contextvars.ContextVar("perfil_atual", default=None)
+
+# últimos perfis fechados (para o endpoint de debug)
+_RECENTES: deque[dict] = deque(maxlen=int(os.getenv("PERFIL_HISTORICO", "50")))
+_LOCK = threading.Lock()
+
+
+def ativo() -> bool:
+    """Liga com PERFIL_ETAPAS=1 no ambiente (desligado por padrão)."""
+    return os.getenv("PERFIL_ETAPAS", "").strip().lower() in ("1", "true", "sim")
+
+
+def rss_mb() -> float | None:
+    """Memória residente atual do processo (Linux); None onde não há /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _linhas(obj) -> int | None:
+    if obj is None:
+        return None
+    if isinstance(obj, int):
+        return obj
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+
+class Perfil:
+    """Etapas medidas de uma requisição (ou de um cálculo avulso), na ordem em que terminaram."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.etapas: list[dict] = []
+        self.inicio = time.perf_counter()
+        self.rss_inicio = rss_mb()
+        self.extra: dict = {}
+
+    def registrar(self, etapa: str, segundos: float, linhas_entrada, linhas_saida, memoria_mb):
+        self.etapas.append(dict(
+            etapa=etapa,
+            segundos=round(segundos, 4),
+            linhas_entrada=linhas_entrada,
+            linhas_saida=linhas_saida,
+            memoria_mb=None if memoria_mb is None else round(memoria_mb, 1),
+        ))
+
+    def resumo(self) -> dict:
+        rss_fim = rss_mb()
+        return dict(
+            nome=self.nome,
+            total_segundos=round(time.perf_counter() - self.inicio, 4),
+            rss_inicio_mb=None if self.rss_inicio is None else round(self.rss_inicio, 1),
+            rss_fim_mb=None if rss_fim is None else round(rss_fim, 1),
+            **self.extra,
+            etapas=self.etapas,
+        )
+
+
+class Cronometro:
+    """
+    Marca o fim de cada seção de uma função: `marca("4) desconto", df)` registra o tempo
+    e a variação de memória desde a marca anterior, as linhas que entraram (saída da
+    marca anterior) e as que saíram (len do df passado).
+    """
+
+    def __init__(self, perfil: Perfil, prefixo: str, entrada=None):
+        self.perfil = perfil
+        self.prefixo = prefixo
+        self._linhas = _linhas(entrada)
+        self._t = time.perf_counter()
+        self._rss = rss_mb()
+
+    def __call__(self, etapa: str, saida=None):
+        agora, rss = time.perf_counter(), rss_mb()
+        linhas_saida = _linhas(saida)
+        delta = None if rss is None or self._rss is None else rss - self._rss
+        self.perfil.registrar(f"{self.prefixo}{etapa}", agora - self._t, self._linhas, linhas_saida, delta)
+        if linhas_saida is not None:
+            self._linhas = linhas_saida
+        # o tempo da própria marca (ler /proc) não entra na próxima etapa
+        self._t, self._rss = time.perf_counter(), rss
+
+
+def _nada(etapa: str, saida=None):
+    return None
+
+
+def cronometro(prefixo: str = "", entrada=None):
+    """Cronometro ligado ao perfil atual; sem perfil ativo devolve uma função que não faz nada."""
+    perfil = _ATUAL.get()
+    if perfil is None:
+        return _nada
+    return Cronometro(perfil, prefixo, entrada)
+
+
+def iniciar(nome: str) -> contextvars.Token:
+    return _ATUAL.set(Perfil(nome))
+
+
+def finalizar(token: contextvars.Token, **extra) -> dict | None:
+    """Fecha o perfil atual: imprime a linha "[perfil] {json}" e guarda no histórico."""
+    perfil = _ATUAL.get()
+    _ATUAL.reset(token)
+    if perfil is None:
+        return None
+    perfil.extra.update(extra)
+    resumo = perfil.resumo()
+    print("[perfil] " + json.dumps(resumo, ensure_ascii=False))
+    with _LOCK:
+        _RECENTES.append(resumo)
+    return resumo
+
+
+@contextmanager
+def medir(nome: str):
+    """Para uso fora do Flask (scripts, benchmarks): `with perfil.medir("mes") as p: ...`."""
+    token = iniciar(nome)
+    perfil = _ATUAL.get()
+    try:
+        yield perfil
+    finally:
+        finalizar(token)
+
+
+def recentes() -> list[dict]:
+    with _LOCK:
+        return list(_RECENTES)
@@ -0,0 +1,163 @@
+# planilhas.py
+# Escrita dos .xlsx que o app gera (df_final, df_juntar, cópias locais das fontes).
+# Com o xlsxwriter em constant_memory as linhas vão para o arquivo à medida que são
+# escritas, sem montar o modelo de células inteiro do openpyxl (o to_excel de antes).
+# Cada df vira bytes uma vez só: o mesmo conteúdo serve para a cópia local e para o
+# upload. Passando do limite de linhas do Excel, o df continua nas abas seguintes
+# ("Sheet1", "Sheet1 parte 2", ...) e ler_xlsx junta as abas de volta.
+# Sem o xlsxwriter instalado, cai no to_excel (openpyxl), com a mesma divisão em abas.
+from __future__ import annotations
+
+import multiprocessing
+import os
+import re
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+try:
+    import xlsxwriter
+except ImportError:  # opcional: sem ele, to_excel (openpyxl)
+    xlsxwriter = None
+
+# 1.048.576 linhas por aba, uma delas o cabeçalho
+LINHAS_POR_ABA = 1_048_575
+
+ABA = "Sheet1"  # nome padrão do to_excel
+
+# abaixo disso (células somadas) subir o pool custa mais que escrever em sequência
+CELULAS_PARA_POOL = 200_000
+
+# mesmos formatos do to_excel do pandas (datetime_format e o cabeçalho em negrito)
+_FORMATO_DATA = "yyyy-mm-dd hh:mm:ss"
+_FORMATO_CABECALHO = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+
+def _nome_aba(i: int) -> str:
+    return ABA if i == 0 else f"{ABA} parte {i + 1}"
+
+
+def _partes(df: pd.DataFrame, linhas_por_aba: int):
+    """(nome da aba, pedaço do df); df vazio ainda ganha uma aba com o cabeçalho."""
+    for i, inicio in enumerate(range(0, max(len(df), 1), linhas_por_aba)):
+        yield _nome_aba(i), df.iloc[inicio:inicio + linhas_por_aba]
+
+
+def _valores_coluna(serie: pd.Series) -> list:
+    """
+    Valores prontos para o worksheet.write: faltante vira None (célula vazia, o na_rep
+    "" do to_excel) e ±inf vira o texto "inf"/"-inf" (o inf_rep do to_excel).
+    """
+    valores = serie.to_numpy()
+    if valores.dtype.kind in "iub":
+        return valores.tolist()
+    if valores.dtype.kind == "f":
+        saida = valores.astype(object)
+        saida[np.isnan(valores)] = None
+        saida[np.isposinf(valores)] = "inf"
+        saida[np.isneginf(valores)] = "-inf"
+        return saida.tolist()
+
+    saida = serie.astype(object).to_numpy(copy=True)
+    saida[pd.isna(serie).to_numpy()] = None
+    for i in np.flatnonzero([isinstance(v, float) and np.isinf(v) for v in saida]):
+        saida[i] = "inf" if saida[i] > 0 else "-inf"
+    return saida.tolist()
+
+
+def _escrever_xlsxwriter(df: pd.DataFrame, destino, linhas_por_aba: int):
+    livro = xlsxwriter.Workbook(destino, {
+        "constant_memory": True,
+        # texto fica texto (sem virar fórmula, link ou número)
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "strings_to_numbers": False,
+        "default_date_format": _FORMATO_DATA,
+    })
+    try:
+        cabecalho = livro.add_format(_FORMATO_CABECALHO)
+        for nome, parte in _partes(df, linhas_por_aba):
+            aba = livro.add_worksheet(nome)
+            aba.write_row(0, 0, [str(c) if not isinstance(c, (int, float)) else c for c in parte.columns], cabecalho)
+            colunas = [_valores_coluna(parte.iloc[:, j]) for j in range(parte.shape[1])]
+            # constant_memory: as linhas precisam sair em ordem, uma de cada vez
+            for linha, valores in enumerate(zip(*colunas), start=1):
+                aba.write_row(linha, 0, valores)
+    finally:
+        livro.close()
+
+
+def _escrever_openpyxl(df: pd.DataFrame, destino, linhas_por_aba: int):
+    with pd.ExcelWriter(destino, engine="openpyxl") as escritor:
+        for nome, parte in _partes(df, linhas_por_aba):
+            parte.to_excel(escritor, sheet_name=nome, index=False)
+
+
+def xlsx_bytes(df: pd.DataFrame, linhas_por_aba: int = LINHAS_POR_ABA) -> bytes:
+    """O df (sem o índice, como o to_excel(index=False)) como um .xlsx."""
+    buf = BytesIO()
+    if xlsxwriter is not None:
+        _escrever_xlsxwriter(df, buf, linhas_por_aba)
+    else:
+        _escrever_openpyxl(df, buf, linhas_por_aba)
+    return buf.getvalue()
+
+
+def _contexto_pool():
+    """forkserver (ou spawn), nunca fork: o xlsx_varios do /processar roda numa thread da fila de tarefas."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload([__name__])
+        return contexto
+    return multiprocessing.get_context("spawn")
+
+
+def _workers_padrao(n: int) -> int:
+    env = os.getenv("PLANILHAS_WORKERS")
+    if env and env.isdigit():
+        return min(max(1, int(env)), n)
+    return min(n, os.cpu_count() or 1)
+
+
+def xlsx_varios(dfs: dict[str, pd.DataFrame], max_workers: int | None = None) -> dict[str, bytes]:
+    """
+    xlsx_bytes de vários dfs ao mesmo tempo, num pool de processos (o xlsxwriter é
+    Python puro: threads disputariam o GIL). Sem multiprocessing, um de cada vez.
+    """
+    resultados = {}
+    max_workers = max_workers or _workers_padrao(len(dfs))
+    celulas = {k: len(df) * max(df.shape[1], 1) for k, df in dfs.items()}
+    # maiores primeiro: o df_juntar não fica para o fim
+    ordem = sorted(dfs, key=celulas.get, reverse=True)
+
+    if max_workers > 1 and len(dfs) > 1 and sum(celulas.values()) >= CELULAS_PARA_POOL:
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=_contexto_pool()) as pool:
+                futuros = {k: pool.submit(xlsx_bytes, dfs[k]) for k in ordem}
+                resultados = {k: fut.result() for k, fut in futuros.items()}
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            # ambiente sem multiprocessing (ex.: serverless sem /dev/shm)
+            print("[planilhas] pool de processos indisponível, escrevendo em sequência:", e)
+            resultados = {}
+
+    for k in ordem:
+        if k not in resultados:
+            resultados[k] = xlsx_bytes(dfs[k])
+    return {k: resultados[k] for k in dfs}
+
+
+def ler_xlsx(conteudo: bytes) -> pd.DataFrame:
+    """
+    read_excel da primeira aba; um df dividido em abas ("Sheet1", "Sheet1 parte 2", ...)
+    volta inteiro. Outras abas que o arquivo tenha são ignoradas, como antes.
+    """
+    with pd.ExcelFile(BytesIO(conteudo)) as arquivo:
+        primeira, *outras = arquivo.sheet_names
+        continuacao = [n for n in outras if re.fullmatch(rf"{re.escape(primeira)} parte \d+", n)]
+        df = arquivo.parse(primeira)
+        if not continuacao:
+            return df
+        return pd.concat([df] + [arquivo.parse(n) for n in continuacao], ignore_index=True)
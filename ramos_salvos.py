@@ -0,0 +1,108 @@
+# ramos_salvos.py
+# Ramos do cálculo (comissoes_backend.calcular_ramos) num formato só de dados, para
+# guardar fora do processo (bucket do Supabase, MEMO em disco): um .zip com um JSON
+# (cabeçalho, totais do líder, códigos das mesas, dtypes de cada coluna) e um Parquet
+# por DataFrame/array. Ler um arquivo desses não executa nada (o pickle de antes
+# executava o que estivesse no arquivo).
+from __future__ import annotations
+
+import json
+import zipfile
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+VERSAO_FORMATO = 1
+
+_INDICE = "ramos.json"
+
+
+def _parquet(df: pd.DataFrame) -> bytes:
+    buf = BytesIO()
+    df.to_parquet(buf, index=False, compression="zstd")
+    return buf.getvalue()
+
+
+def _dtypes(df: pd.DataFrame) -> dict[str, str]:
+    return {str(c): str(t) for c, t in df.dtypes.items()}
+
+
+def _ler_parquet(zf: zipfile.ZipFile, nome: str, dtypes: dict[str, str]) -> pd.DataFrame:
+    df = pd.read_parquet(BytesIO(zf.read(nome)))
+    if list(df.columns) != list(dtypes):
+        raise ValueError(f"{nome}: colunas diferentes das salvas")
+    # o Parquet não guarda alguns dtypes do pandas (ex.: object só com texto volta str)
+    for col, dtype in dtypes.items():
+        if str(df[col].dtype) != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _escalar(valor):
+    # np.float64/np.int64 -> float/int do Python (o JSON não conhece os do numpy)
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+
+def ramos_para_bytes(ramos: dict[str, dict], cabecalho: dict) -> bytes:
+    """
+    Os ramos (e o `cabecalho`, ex.: versão e regras) num .zip. ValueError/TypeError (ou
+    erro do pyarrow) se algum df não vira Parquet, ex.: coluna com tipos misturados.
+    """
+    indice = {"formato": VERSAO_FORMATO, "cabecalho": cabecalho, "ramos": {}}
+    arquivos = {}
+    for fonte, ramo in ramos.items():
+        salvo = {}
+        for chave, valor in ramo.items():
+            if isinstance(valor, pd.DataFrame):
+                nome = f"{fonte}/{chave}.parquet"
+                arquivos[nome] = _parquet(valor)
+                salvo[chave] = {"parquet": nome, "dtypes": _dtypes(valor)}
+            elif chave == "juntar_extra":
+                # mesas/líder do PJ1 (comissoes_backend._pj1_extra): código + arrays
+                extras = []
+                for i, extra in enumerate(valor):
+                    nome = f"{fonte}/{chave}/{i}.parquet"
+                    df = pd.DataFrame({"linhas": extra["linhas"], "percentual": extra["percentual"], "valor": extra["valor"]})
+                    arquivos[nome] = _parquet(df)
+                    extras.append({"codigo": _escalar(extra["codigo"]), "parquet": nome, "dtypes": _dtypes(df)})
+                salvo[chave] = {"extras": extras}
+            else:
+                salvo[chave] = {"valor": _escalar(valor)}
+        indice["ramos"][fonte] = salvo
+
+    buf = BytesIO()
+    # o Parquet já vem comprimido
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr(_INDICE, json.dumps(indice, ensure_ascii=False))
+        for nome, conteudo in arquivos.items():
+            zf.writestr(nome, conteudo)
+    return buf.getvalue()
+
+
+def ramos_de_bytes(conteudo: bytes) -> tuple[dict, dict[str, dict]]:
+    """(cabeçalho, ramos) de um ramos_para_bytes. ValueError (ou erro do zip/Parquet) se o arquivo não serve."""
+    with zipfile.ZipFile(BytesIO(conteudo)) as zf:
+        indice = json.loads(zf.read(_INDICE))
+        if not isinstance(indice, dict) or indice.get("formato") != VERSAO_FORMATO:
+            raise ValueError("formato de ramos desconhecido")
+        ramos = {}
+        for fonte, salvo in indice["ramos"].items():
+            ramo = {}
+            for chave, item in salvo.items():
+                if "parquet" in item:
+                    ramo[chave] = _ler_parquet(zf, item["parquet"], item["dtypes"])
+                elif "extras" in item:
+                    ramo[chave] = []
+                    for extra in item["extras"]:
+                        df = _ler_parquet(zf, extra["parquet"], extra["dtypes"])
+                        ramo[chave].append(dict(
+                            codigo=extra["codigo"],
+                            linhas=df["linhas"].to_numpy(),
+                            percentual=df["percentual"].array,
+                            valor=df["valor"].array,
+                        ))
+                else:
+                    ramo[chave] = item["valor"]
+            ramos[fonte] = ramo
+    return indice["cabecalho"], ramos
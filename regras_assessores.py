@@ -0,0 +1,100 @@
+# regras_assessores.py
+# Códigos com tratamento especial no cálculo (mesas, líder, capitão, débitos do lan_man),
+# lidos de regras_assessores.json (ou do arquivo em REGRAS_ASSESSORES). Trocar um código
+# ou incluir uma mesa nova é só editar o arquivo: uma mesa nova usa a coluna
+# "% <repasse>" do tim_rep quando o repasse não é um dos tipos já conhecidos.
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+CAMINHO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regras_assessores.json")
+
+
+@dataclass(frozen=True)
+class RegraMesa:
+    """
+    Mesa que recebe um % (coluna `repasse` do tim_rep, pelo assessor da linha) das
+    linhas do PJ1 que passam nos filtros, somado no código da mesa.
+
+    tipos: tipos de repasse da linha que entram (vazio = todos)
+    produto_contem / produto_nao_contem: trecho do Produto (sem diferenciar maiúsculas)
+    zerar_produtos: produtos que entram com % mas com valor zerado
+    zerar_produtos_do_assessor: idem, só nas linhas de um assessor
+    """
+    codigo: str
+    repasse: str
+    tipos: tuple[str, ...] = ()
+    produto_contem: str | None = None
+    produto_nao_contem: str | None = None
+    zerar_produtos: tuple[str, ...] = ()
+    zerar_produtos_do_assessor: tuple[tuple[str, tuple[str, ...]], ...] = ()
+
+    @property
+    def coluna_repasse(self) -> str:
+        return f"% Repasse {self.repasse}"
+
+    @property
+    def coluna_percentual(self) -> str:
+        return f"percentual tratado {self.repasse.lower()}"
+
+    @property
+    def coluna_valor(self) -> str:
+        return f"Valor {self.repasse}"
+
+
+@dataclass(frozen=True)
+class RegrasAssessores:
+    mesas: tuple[RegraMesa, ...]  # na ordem das linhas de mesa no df_juntar
+    lider: str                    # recebe o total líder de cada ramo
+    capitao: str                  # recebe a soma das colunas de capitão
+    colunas_capitao: tuple[str, ...]
+    debitos: tuple[tuple[str, bool], ...]  # (código, soma os próprios lançamentos?)
+    assinatura: str               # muda quando o arquivo muda (ramos salvos com outra ficam velhos)
+
+
+def carregar_regras(caminho: str | None = None) -> RegrasAssessores:
+    """Regras do arquivo, lidas de novo só quando ele muda."""
+    caminho = caminho or os.getenv("REGRAS_ASSESSORES") or CAMINHO_PADRAO
+    return _carregar(os.path.abspath(caminho), os.path.getmtime(caminho))
+
+
+@lru_cache(maxsize=8)
+def _carregar(caminho: str, mtime: float) -> RegrasAssessores:
+    with open(caminho, "rb") as f:
+        conteudo = f.read()
+    try:
+        return _montar(json.loads(conteudo), hashlib.sha1(conteudo).hexdigest()[:12])
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"regras de assessores inválidas em {caminho}: {e!r}") from e
+
+
+def _montar(dados: dict, assinatura: str) -> RegrasAssessores:
+    mesas = tuple(
+        RegraMesa(
+            codigo=str(m["codigo"]),
+            repasse=str(m["repasse"]),
+            tipos=tuple(m.get("tipos", ())),
+            produto_contem=m.get("produto_contem"),
+            produto_nao_contem=m.get("produto_nao_contem"),
+            zerar_produtos=tuple(m.get("zerar_produtos", ())),
+            zerar_produtos_do_assessor=tuple(
+                (str(cod), tuple(produtos)) for cod, produtos in m.get("zerar_produtos_do_assessor", {}).items()
+            ),
+        )
+        for m in dados["mesas"]
+    )
+    colunas = [m.coluna_valor for m in mesas]
+    if len(set(colunas)) != len(colunas):
+        raise ValueError("duas mesas com o mesmo repasse")
+    return RegrasAssessores(
+        mesas=mesas,
+        lider=str(dados["lider"]["codigo"]),
+        capitao=str(dados["capitao"]["codigo"]),
+        colunas_capitao=tuple(dados["capitao"]["colunas"]),
+        debitos=tuple((str(cod), bool(r["proprios"])) for cod, r in dados["debitos"].items()),
+        assinatura=assinatura,
+    )
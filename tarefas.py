@@ -0,0 +1,135 @@
+# tarefas.py
+# Fila local de tarefas longas (o /processar): a requisição só enfileira e devolve o id,
+# um pool de threads roda as etapas e a página acompanha o andamento por
+# /api/tarefas/<id>. O estado fica na memória do processo (substitui uma fila externa
+# enquanto o app roda numa instância só). Com TAREFAS_WORKERS=0 (padrão na Vercel, onde
+# nada continua rodando depois da resposta) a tarefa roda dentro da própria requisição.
+from __future__ import annotations
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import perfil
+
+# estados de uma tarefa
+NA_FILA = "fila"
+RODANDO = "rodando"
+CONCLUIDA = "concluida"
+ERRO = "erro"
+
+
+@dataclass
+class Tarefa:
+    id: str
+    nome: str
+    estado: str = NA_FILA
+    etapa: str = "na fila"
+    percentual: int = 0
+    erro: str | None = None
+    avisos: list[str] = field(default_factory=list)
+    resultado: object = None
+    criada_em: float = field(default_factory=time.time)
+    terminada_em: float | None = None
+
+    def progresso(self, etapa: str, percentual: int):
+        """Chamado pela função da tarefa no começo de cada etapa."""
+        self.etapa = etapa
+        self.percentual = int(percentual)
+
+    def avisar(self, mensagem: str):
+        """Mensagem para o usuário (vira flash quando o resultado é aberto)."""
+        self.avisos.append(mensagem)
+
+    @property
+    def terminou(self) -> bool:
+        return self.estado in (CONCLUIDA, ERRO)
+
+    def resumo(self) -> dict:
+        fim = self.terminada_em or time.time()
+        return dict(
+            id=self.id,
+            nome=self.nome,
+            estado=self.estado,
+            etapa=self.etapa,
+            percentual=self.percentual,
+            erro=self.erro,
+            avisos=list(self.avisos),
+            segundos=round(fim - self.criada_em, 1),
+        )
+
+
+def _workers_padrao() -> int:
+    valor = os.getenv("TAREFAS_WORKERS", "").strip()
+    if valor.isdigit():
+        return int(valor)
+    return 0 if os.getenv("VERCEL") else 2
+
+
+class FilaTarefas:
+    """
+    submeter(nome, funcao, *args) cria a Tarefa e roda funcao(tarefa, *args) num worker;
+    o retorno fica em tarefa.resultado. Guarda as últimas `historico` tarefas, e as
+    terminadas somem depois de `validade_s` segundos.
+    """
+
+    def __init__(self, workers: int | None = None, historico: int | None = None, validade_s: float | None = None):
+        self.workers = _workers_padrao() if workers is None else workers
+        self.historico = historico if historico is not None else int(os.getenv("TAREFAS_HISTORICO", "50"))
+        self.validade_s = validade_s if validade_s is not None else float(os.getenv("TAREFAS_VALIDADE_S", "3600"))
+        self._pool = (
+            ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tarefa") if self.workers > 0 else None
+        )
+        self._tarefas: OrderedDict[str, Tarefa] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submeter(self, nome: str, funcao, *args, **kwargs) -> Tarefa:
+        tarefa = Tarefa(id=uuid.uuid4().hex, nome=nome)
+        with self._lock:
+            self._limpar()
+            self._tarefas[tarefa.id] = tarefa
+        if self._pool is None:
+            self._rodar(tarefa, funcao, args, kwargs)
+        else:
+            self._pool.submit(self._rodar, tarefa, funcao, args, kwargs)
+        return tarefa
+
+    def obter(self, tarefa_id: str) -> Tarefa | None:
+        with self._lock:
+            return self._tarefas.get(tarefa_id)
+
+    def _rodar(self, tarefa: Tarefa, funcao, args, kwargs):
+        tarefa.estado = RODANDO
+        # a tarefa tem o próprio perfil (no worker não há o da requisição)
+        token = perfil.iniciar(f"tarefa {tarefa.nome}") if perfil.ativo() else None
+        estado = ERRO
+        try:
+            tarefa.resultado = funcao(tarefa, *args, **kwargs)
+            tarefa.progresso("pronto", 100)
+            estado = CONCLUIDA
+        except Exception as e:
+            traceback.print_exc()
+            tarefa.erro = str(e) or e.__class__.__name__
+        finally:
+            # terminada_em antes do estado: quem vê a tarefa terminada já tem o horário
+            tarefa.terminada_em = time.time()
+            tarefa.estado = estado
+            print(f"[tarefas] {tarefa.nome} {tarefa.id}: {estado} em {tarefa.terminada_em - tarefa.criada_em:.1f}s")
+            if token is not None:
+                perfil.finalizar(token, tarefa=tarefa.id, estado=estado)
+
+    def _limpar(self):
+        # chamado com o lock: tira as terminadas vencidas e, passando do histórico,
+        # as terminadas mais antigas (as que ainda rodam ficam)
+        agora = time.time()
+        for t in [t for t in self._tarefas.values() if t.terminou and agora - t.terminada_em > self.validade_s]:
+            del self._tarefas[t.id]
+        terminadas = [t.id for t in self._tarefas.values() if t.terminou]
+        excesso = len(self._tarefas) - self.historico + 1
+        for tarefa_id in terminadas[:max(excesso, 0)]:
+            del self._tarefas[tarefa_id]
@@ -0,0 +1,12 @@
+# tests/conftest.py
+# Os módulos do app ficam na raiz do repositório e o gerador de meses sintéticos em
+# benchmarks/ (o mesmo dos benchmarks).
+import os
+import sys
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+# o MEMO em disco não entra nos testes (cada cálculo é feito de verdade)
+os.environ.setdefault("CACHE_RESULTADOS_MB", "0")
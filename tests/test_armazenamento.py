@@ -0,0 +1,113 @@
+# tests/test_armazenamento.py
+"""TransferenciasStorage contra um bucket de mentira (sem rede)."""
+import threading
+
+import pytest
+
+import armazenamento
+from armazenamento import TransferenciasStorage
+
+
+class ErroStorage(Exception):
+    def __init__(self, status):
+        super().__init__(f"status {status}")
+        self.status = status
+
+
+class BucketFalso:
+    """
+    Guarda os objetos num dict. `falhas[path]` é a lista de erros a levantar, um por
+    chamada, antes de dar certo; `barreira` segura cada chamada até todas chegarem.
+    """
+
+    def __init__(self, objetos=None, falhas=None, barreira=None):
+        self.objetos = dict(objetos or {})
+        self.falhas = {p: list(e) for p, e in (falhas or {}).items()}
+        self.barreira = barreira
+        self.chamadas = []
+        self._lock = threading.Lock()
+
+    def _chamada(self, path):
+        with self._lock:
+            self.chamadas.append(path)
+            erros = self.falhas.get(path)
+            erro = erros.pop(0) if erros else None
+        if self.barreira is not None:
+            self.barreira.wait()
+        if erro is not None:
+            raise erro
+
+    def download(self, path):
+        self._chamada(path)
+        if path not in self.objetos:
+            raise ErroStorage(404)
+        return self.objetos[path]
+
+    def upload(self, path, file, file_options):
+        self._chamada(path)
+        assert file_options == {"content-type": "text/csv", "upsert": "true"}
+        self.objetos[path] = file
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    feitas = []
+    monkeypatch.setattr(armazenamento.time, "sleep", feitas.append)
+    return feitas
+
+
+def test_downloads_em_paralelo():
+    paths = [f"2025-03/f{i}.csv" for i in range(4)]
+    # com as chamadas em série a barreira estoura o timeout (BrokenBarrierError)
+    bucket = BucketFalso({p: p.encode() for p in paths}, barreira=threading.Barrier(4, timeout=5))
+    resultados = TransferenciasStorage(bucket, max_paralelo=4).baixar_varios(paths + paths[:1])
+    assert list(resultados) == paths
+    assert all(r.ok and r.dados == p.encode() and r.tentativas == 1 for p, r in resultados.items())
+
+
+def test_uploads_em_paralelo():
+    itens = [(f"2025-03/f{i}.csv", b"x" * i, "text/csv") for i in range(4)]
+    bucket = BucketFalso(barreira=threading.Barrier(4, timeout=5))
+    resultados = TransferenciasStorage(bucket, max_paralelo=4).enviar_varios(itens)
+    assert all(resultados[p].ok and resultados[p].tamanho == len(c) for p, c, _ in itens)
+    assert bucket.objetos == {p: c for p, c, _ in itens}
+
+
+@pytest.mark.parametrize("erro", [ErroStorage(500), ErroStorage(503), TimeoutError("timed out")])
+def test_repete_com_espera_dobrando(esperas, erro):
+    bucket = BucketFalso({"a.csv": b"a"}, falhas={"a.csv": [erro, erro]})
+    r = TransferenciasStorage(bucket, tentativas=3, espera_inicial=0.5).baixar_varios(["a.csv"])["a.csv"]
+    assert r.ok and r.dados == b"a" and r.tentativas == 3
+    assert esperas == [0.5, 1.0]
+
+
+def test_desiste_depois_da_ultima_tentativa(esperas):
+    bucket = BucketFalso(falhas={"a.csv": [ErroStorage(502)] * 3})
+    r = TransferenciasStorage(bucket, tentativas=3).enviar_varios([("a.csv", b"a", "text/csv")])["a.csv"]
+    assert not r.ok and r.tentativas == 3 and "502" in r.erro
+    assert bucket.chamadas == ["a.csv"] * 3
+    assert esperas == [0.5, 1.0]
+
+
+@pytest.mark.parametrize("status", sorted(armazenamento._STATUS_SEM_RETRY))
+def test_sem_retry_para_erro_do_cliente(esperas, status):
+    bucket = BucketFalso({"a.csv": b"a"}, falhas={"a.csv": [ErroStorage(status)]})
+    r = TransferenciasStorage(bucket, tentativas=3).baixar_varios(["a.csv"])["a.csv"]
+    assert not r.ok and r.tentativas == 1 and str(status) in r.erro
+    assert bucket.chamadas == ["a.csv"]
+    assert esperas == []
+
+
+def test_falha_de_um_objeto_nao_derruba_os_outros(esperas):
+    objetos = {"a.csv": b"a", "c.csv": b"c"}
+    bucket = BucketFalso(objetos, falhas={"c.csv": [ErroStorage(500)]})
+    resultados = TransferenciasStorage(bucket, tentativas=2).baixar_varios(["a.csv", "b.csv", "c.csv"])
+    assert resultados["a.csv"].ok and resultados["a.csv"].dados == b"a"
+    assert not resultados["b.csv"].ok and "404" in resultados["b.csv"].erro
+    assert resultados["c.csv"].ok and resultados["c.csv"].tentativas == 2
+
+    itens = [("a.csv", b"1", "text/csv"), ("b.csv", b"22", "text/csv")]
+    bucket = BucketFalso(falhas={"a.csv": [ErroStorage(403)]})
+    resultados = TransferenciasStorage(bucket).enviar_varios(itens)
+    assert not resultados["a.csv"].ok and resultados["a.csv"].tamanho == 1
+    assert resultados["b.csv"].ok and bucket.objetos == {"b.csv": b"22"}
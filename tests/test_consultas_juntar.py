@@ -0,0 +1,22 @@
+# tests/test_consultas_juntar.py
+"""Paginação do df_juntar (/api/df_juntar/linhas)."""
+import numpy as np
+import pandas as pd
+
+import consultas_juntar
+
+
+def test_ordenar_coluna_object_com_tipos_misturados():
+    # "Código Cliente" fica object no df_juntar: números do PJ1 e texto das outras fontes
+    df = consultas_juntar.preparar_df_juntar(pd.DataFrame({
+        "Código Assessor": ["A1", "A2", "A3", "A4"],
+        "Código Cliente": pd.Series([30, "B7", np.nan, 4], dtype=object),
+        "Valor Assessor": [1.0, 2.0, 3.0, 4.0],
+    }))
+    pagina = consultas_juntar.paginar(df, ordenar="Código Cliente")
+    assert [linha["Código Cliente"] for linha in pagina["linhas"]] == [30, 4, "B7", None]
+    pagina = consultas_juntar.paginar(df, ordenar="Código Cliente", desc=True)
+    assert [linha["Código Cliente"] for linha in pagina["linhas"]] == ["B7", 4, 30, None]
+    # coluna sem mistura continua na ordem do valor
+    pagina = consultas_juntar.paginar(df, ordenar="Valor Assessor", desc=True)
+    assert [linha["Valor Assessor"] for linha in pagina["linhas"]] == [4.0, 3.0, 2.0, 1.0]
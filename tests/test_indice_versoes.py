@@ -0,0 +1,179 @@
+# tests/test_indice_versoes.py
+"""Índice de versões e reserva de vN contra um bucket de mentira (sem rede)."""
+import json
+
+import pytest
+
+import app
+import armazenamento
+from armazenamento import TransferenciasStorage
+from indice_versoes import CAMINHO_INDICE, IndiceIndisponivel, IndiceVersoes, indice_vazio
+
+COMP = "2025-03"
+
+
+class ErroStorage(Exception):
+    def __init__(self, status):
+        super().__init__(f"status {status}")
+        self.status = status
+
+
+class BucketFalso:
+    """
+    Objetos num dict (path -> bytes). `falhas[path]` é a lista de erros a levantar no
+    download, um por chamada; `pastas_com_erro` são as pastas cujo list falha;
+    `ao_enviar(path, anterior)` roda depois de cada upload (outra instância gravando).
+    """
+
+    def __init__(self, objetos=None, falhas=None, pastas_com_erro=()):
+        self.objetos = dict(objetos or {})
+        self.falhas = {p: list(e) for p, e in (falhas or {}).items()}
+        self.pastas_com_erro = set(pastas_com_erro)
+        self.enviados = []
+        self.ao_enviar = None
+
+    def download(self, path):
+        erros = self.falhas.get(path)
+        if erros:
+            raise erros.pop(0)
+        if path not in self.objetos:
+            raise ErroStorage(404)
+        return self.objetos[path]
+
+    def upload(self, path, file, file_options):
+        if file_options["upsert"] == "false" and path in self.objetos:
+            raise ErroStorage("409")
+        anterior = self.objetos.get(path)
+        self.objetos[path] = file
+        self.enviados.append(path)
+        if self.ao_enviar is not None:
+            self.ao_enviar(path, anterior)
+
+    def remove(self, paths):
+        for p in paths:
+            self.objetos.pop(p, None)
+
+    def list(self, path, options):
+        if path in self.pastas_com_erro:
+            raise ErroStorage(503)
+        prefixo = f"{path}/" if path else ""
+        nomes = {p[len(prefixo):].split("/")[0] for p in self.objetos if p.startswith(prefixo)}
+        return [
+            {"name": n, "metadata": {"size": 1, "eTag": n}, "updated_at": None}
+            for n in sorted(nomes)
+            if options.get("search", "") in n
+        ]
+
+
+class ClienteFalso:
+    def __init__(self, bucket):
+        self.storage = self
+        self.bucket = bucket
+
+    def from_(self, nome):
+        return self.bucket
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(armazenamento.time, "sleep", lambda s: None)
+
+
+def indice_com(*versoes):
+    indice = indice_vazio()
+    indice["competencias"][COMP] = {v: {"fontes": {}} for v in versoes}
+    return json.dumps(indice).encode()
+
+
+def novo_indice(bucket, reconstruir=None):
+    def nao_reconstroi():
+        pytest.fail("reconstruiu o índice sem ele ter sumido")
+    return IndiceVersoes(TransferenciasStorage(bucket, tentativas=1), reconstruir or nao_reconstroi, ttl_s=0)
+
+
+@pytest.fixture
+def bucket_do_app(monkeypatch):
+    bucket = BucketFalso()
+    monkeypatch.setattr(app, "supabase", ClienteFalso(bucket))
+    monkeypatch.setattr(app, "_transferencias", None)
+    monkeypatch.setattr(app, "_indice", None)
+    return bucket
+
+
+def test_erro_do_servidor_usa_o_cache():
+    bucket = BucketFalso({CAMINHO_INDICE: indice_com("v1", "v2")})
+    idx = novo_indice(bucket)
+    assert idx.versoes(COMP) == ["v2", "v1"]
+    bucket.falhas[CAMINHO_INDICE] = [ErroStorage(503)]
+    assert idx.versoes(COMP) == ["v2", "v1"]
+    assert bucket.enviados == []
+
+
+def test_erro_do_servidor_sem_cache_nao_grava_nada():
+    bucket = BucketFalso({CAMINHO_INDICE: indice_com("v1")}, falhas={CAMINHO_INDICE: [ErroStorage(503)] * 2})
+    idx = novo_indice(bucket)
+    with pytest.raises(IndiceIndisponivel):
+        idx.competencias()
+    with pytest.raises(IndiceIndisponivel):
+        idx.reservar_versao(COMP)
+    assert bucket.enviados == []
+
+
+def test_reconstroi_so_no_404():
+    bucket = BucketFalso()
+    idx = novo_indice(bucket, reconstruir=lambda: json.loads(indice_com("v1", "v4")))
+    assert idx.reservar_versao(COMP) == 5
+    assert bucket.enviados == [CAMINHO_INDICE]
+
+
+def test_gravacao_perdida_e_repetida():
+    bucket = BucketFalso({CAMINHO_INDICE: indice_com("v1")})
+    idx = novo_indice(bucket)
+
+    def outra_instancia(path, anterior):
+        # grava por cima a partir do índice de antes, uma vez só
+        bucket.ao_enviar = None
+        indice = json.loads(anterior)
+        indice["competencias"][COMP]["v2"] = {"fontes": {}}
+        bucket.objetos[path] = json.dumps(indice).encode()
+
+    bucket.ao_enviar = outra_instancia
+    assert idx.gravar_versao(COMP, "v3", {"fontes": {}})
+    assert sorted(json.loads(bucket.objetos[CAMINHO_INDICE])["competencias"][COMP]) == ["v1", "v2", "v3"]
+
+
+def test_reconstrucao_com_listagem_falhando_nao_grava(bucket_do_app):
+    bucket_do_app.objetos[f"{COMP}/df_final_v1.xlsx"] = b"x"
+    bucket_do_app.pastas_com_erro.add(COMP)
+    with pytest.raises(IndiceIndisponivel):
+        app.indice().reservar_versao(COMP)
+    assert app.listar_competencias() == []
+    assert CAMINHO_INDICE not in bucket_do_app.objetos
+
+
+def test_proxima_versao_pula_numero_ja_usado(bucket_do_app):
+    # índice velho (só v1), mas outra instância já criou df_final_v2 e manifesto_v3
+    bucket_do_app.objetos.update({
+        CAMINHO_INDICE: indice_com("v1"),
+        f"{COMP}/df_final_v2.xlsx": b"x",
+        f"{COMP}/manifesto_v3.json": b"{}",
+    })
+    assert app.proxima_versao_da_competencia(COMP) == 4
+    assert f"{COMP}/manifesto_v4.json" in bucket_do_app.objetos
+    assert bucket_do_app.objetos[f"{COMP}/manifesto_v3.json"] == b"{}"
+    assert app.proxima_versao_da_competencia(COMP) == 5
+
+
+def test_manifesto_sem_objeto_e_none(bucket_do_app):
+    assert app.carregar_manifesto(COMP, "v1") is None
+
+
+def test_falha_no_manifesto_nao_grava_manifesto_parcial(bucket_do_app):
+    manifesto = f"{COMP}/manifesto_v1.json"
+    salvo = json.dumps({"versao": app.VERSAO_MANIFESTO, "fontes": {"pj1": "a", "pj2": "b"}}).encode()
+    bucket_do_app.objetos[manifesto] = salvo
+    bucket_do_app.falhas[manifesto] = [ErroStorage(503)] * 3
+    with pytest.raises(RuntimeError):
+        app.enviar_fonte_versao(COMP, "v1", "pj1", b"novo", None)
+    assert bucket_do_app.objetos[manifesto] == salvo
+    assert bucket_do_app.enviados == []
@@ -0,0 +1,56 @@
+# tests/test_pacote_zip.py
+"""tamanho_zip (conta) x tamanho do que gerar_zip realmente escreve."""
+import zipfile
+from io import BytesIO
+
+import pytest
+
+import pacote_zip
+from pacote_zip import ArquivoZip
+
+DATA_HORA = pacote_zip.data_hora_zip("2025-03-31T12:00:00")
+
+
+def _arquivos(tamanhos, nome="f"):
+    return [ArquivoZip(f"2025-03_v1/{nome}{i}.xlsx", f"2025-03/{nome}{i}", t) for i, t in enumerate(tamanhos)]
+
+
+def _gerar(arquivos):
+    conteudos = {a.path: bytes([i % 251]) * a.tamanho for i, a in enumerate(arquivos)}
+    return b"".join(pacote_zip.gerar_zip(arquivos, conteudos.__getitem__, DATA_HORA, paralelo=2)), conteudos
+
+
+@pytest.mark.parametrize("arquivos", [
+    [],
+    _arquivos([0]),
+    _arquivos([1, 0, 5000, pacote_zip.BLOCO + 7]),
+    _arquivos([10, 20], nome="competência_é_"),
+])
+def test_tamanho_igual_ao_gerado(arquivos):
+    gerado, conteudos = _gerar(arquivos)
+    assert pacote_zip.tamanho_zip(arquivos, DATA_HORA) == len(gerado)
+    with zipfile.ZipFile(BytesIO(gerado)) as zf:
+        assert zf.namelist() == [a.nome for a in arquivos]
+        assert all(zf.read(a.nome) == conteudos[a.path] for a in arquivos)
+
+
+@pytest.mark.parametrize("tamanhos", [
+    [960],  # entrada em zip64 pela folga de 5%, sem estourar o limite
+    [1500, 10],  # entrada acima do limite; a seguinte começa depois dele
+    [400, 400, 400, 400],  # offsets e diretório central acima do limite
+])
+def test_tamanho_igual_ao_gerado_com_zip64(monkeypatch, tamanhos):
+    # limite de zip64 baixo para passar por todos os casos com poucos bytes
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1000)
+    arquivos = _arquivos(tamanhos)
+    assert pacote_zip.tamanho_zip(arquivos, DATA_HORA) == len(_gerar(arquivos)[0])
+
+
+def test_tamanho_igual_ao_gerado_com_muitas_entradas(monkeypatch):
+    monkeypatch.setattr(zipfile, "ZIP_FILECOUNT_LIMIT", 3)
+    arquivos = _arquivos([1, 2, 3, 4])
+    assert pacote_zip.tamanho_zip(arquivos, DATA_HORA) == len(_gerar(arquivos)[0])
+
+
+def test_tamanho_desconhecido():
+    assert pacote_zip.tamanho_zip([ArquivoZip("a.xlsx", "a", None)], DATA_HORA) is None
@@ -0,0 +1,22 @@
+# tests/test_partida.py
+"""Partida a frio: `import app` num processo novo não carrega a pilha pesada e cabe no orçamento."""
+import statistics
+
+import bench_partida
+
+RODADAS = 3
+
+
+def test_import_app_em_processo_novo():
+    rodadas = [bench_partida._em_processo_novo() for _ in range(RODADAS)]
+
+    # a checagem roda depois do import e do primeiro GET / e /api/arquivos
+    pesados = sorted({m for r in rodadas for m in r["pesados"]})
+    assert not pesados, f"módulos pesados carregados na partida: {pesados}"
+    for modulo in ("pandas", "comissoes_backend", "supabase"):
+        assert modulo in bench_partida.MODULOS_PESADOS
+
+    importar_ms = statistics.median(r["importar"] for r in rodadas) * 1000
+    assert importar_ms <= bench_partida.ORCAMENTO_MS, (
+        f"import app levou {importar_ms:.0f} ms, acima do orçamento de {bench_partida.ORCAMENTO_MS:.0f} ms"
+    )
@@ -0,0 +1,41 @@
+# tests/test_pool_processos.py
+"""Pools de processos (ingestao, planilhas) subindo de dentro de uma thread, como na fila de tarefas."""
+import threading
+from io import BytesIO
+
+import pandas as pd
+
+import ingestao
+import planilhas
+from dados_sinteticos import gerar_entradas, para_xlsx
+
+
+def _na_thread(funcao):
+    saida = {}
+    thread = threading.Thread(target=lambda: saida.update(resultado=funcao()))
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive()
+    return saida["resultado"]
+
+
+def test_pools_nao_usam_fork():
+    assert ingestao._contexto_pool().get_start_method() != "fork"
+    assert planilhas._contexto_pool().get_start_method() != "fork"
+
+
+def test_pools_numa_thread(monkeypatch, capfd):
+    dados = gerar_entradas(n_pj1=500, n_assessores=20, seed=1)
+    fontes = ("cam", "seg", "tim_rep")
+
+    lidos, _ = _na_thread(lambda: ingestao.ler_fontes({k: BytesIO(para_xlsx(dados[k])) for k in fontes}, max_workers=2))
+    for k in fontes:
+        esperado, _, _ = ingestao.ler_fonte(k, para_xlsx(dados[k]))
+        pd.testing.assert_frame_equal(lidos[k], esperado)
+
+    monkeypatch.setattr(planilhas, "CELULAS_PARA_POOL", 0)
+    gerados = _na_thread(lambda: planilhas.xlsx_varios({k: lidos[k] for k in fontes}, max_workers=2))
+    for k in fontes:
+        pd.testing.assert_frame_equal(pd.read_excel(BytesIO(gerados[k])), pd.read_excel(BytesIO(planilhas.xlsx_bytes(lidos[k]))))
+    # sem cair no caminho sequencial
+    assert "indisponível" not in capfd.readouterr().out
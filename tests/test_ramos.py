@@ -0,0 +1,152 @@
+# tests/test_ramos.py
+"""Recálculo incremental (um ramo + consolidação) x cálculo completo, com os ramos salvos."""
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import comissoes_backend as cb
+import ramos_salvos
+from dados_sinteticos import gerar_entradas
+
+
+@pytest.fixture(scope="module")
+def mes():
+    dados = gerar_entradas(n_pj1=3000, n_assessores=60, seed=3)
+    regras = cb.carregar_regras()
+    return dados, regras, cb.calcular_ramos(**dados, regras=regras)
+
+
+def _como_no_bucket(ramos):
+    cabecalho, salvos = ramos_salvos.ramos_de_bytes(ramos_salvos.ramos_para_bytes(ramos, {"versao": cb.VERSAO_RAMOS}))
+    assert cabecalho == {"versao": cb.VERSAO_RAMOS}
+    return salvos
+
+
+def _conferir_igual(obtido, esperado):
+    for a, b in zip(obtido, esperado):
+        pd.testing.assert_frame_equal(a, b, check_exact=True)
+
+
+@pytest.mark.parametrize("troca", ["substituir", "deletar"])
+@pytest.mark.parametrize("fonte", cb.FONTES_RAMOS)
+def test_recalcular_um_ramo_igual_ao_calculo_completo(mes, fonte, troca):
+    dados, regras, ramos = mes
+    tim_rep = dados["tim_rep"]
+    if troca == "substituir":
+        # outra fonte: metade das linhas, fora de ordem e com o índice original
+        nova = dados[fonte].sample(frac=0.5, random_state=7)
+    else:
+        # o /api/deletar_fonte troca a fonte por ela mesma sem linhas
+        nova = dados[fonte].iloc[0:0].copy()
+
+    novos_ramos = cb.recalcular_ramos(_como_no_bucket(ramos), fonte, nova, tim_rep, regras)
+    incremental = cb.consolidar_ramos(novos_ramos, tim_rep, regras)
+    completo = cb.consolidar_ramos(cb.calcular_ramos(**{**dados, fonte: nova}, regras=regras), tim_rep, regras)
+    _conferir_igual(incremental, completo)
+
+
+def test_ramos_salvos_voltam_iguais(mes):
+    dados, regras, ramos = mes
+    salvos = _como_no_bucket(ramos)
+    assert list(salvos) == list(ramos)
+    for fonte, ramo in ramos.items():
+        assert list(salvos[fonte]) == list(ramo)
+        for chave in ("group", "juntar"):
+            pd.testing.assert_frame_equal(salvos[fonte][chave], ramo[chave].reset_index(drop=True), check_exact=True)
+        if "lider" in ramo:
+            assert salvos[fonte]["lider"] == ramo["lider"]
+    for salvo, extra in zip(salvos["pj1"]["juntar_extra"], ramos["pj1"]["juntar_extra"]):
+        assert salvo["codigo"] == extra["codigo"]
+        assert (salvo["linhas"] == extra["linhas"]).all()
+        pd.testing.assert_extension_array_equal(salvo["percentual"], extra["percentual"])
+        pd.testing.assert_extension_array_equal(salvo["valor"], extra["valor"])
+    _conferir_igual(cb.consolidar_ramos(salvos, dados["tim_rep"], regras), cb.consolidar_ramos(ramos, dados["tim_rep"], regras))
+
+
+class _Explode:
+    def __reduce__(self):
+        return (exec, ("raise SystemExit('executou')",))
+
+
+def test_arquivo_que_nao_e_de_ramos_nao_executa_nada():
+    with pytest.raises(Exception) as erro:
+        ramos_salvos.ramos_de_bytes(pickle.dumps(_Explode()))
+    assert not isinstance(erro.value, SystemExit)
+
+
+@pytest.mark.parametrize("fonte", cb.LINHAS_NEGOCIO)
+def test_comissao_em_coluna_object(mes, fonte):
+    # planilha com célula vazia: a coluna chega object (números e None)
+    dados, regras, _ = mes
+    tim_rep = dados["tim_rep"]
+    df = dados[fonte].copy()
+    df.loc[df.index[:3], "Comissão Escritório"] = np.nan
+    como_object = df.astype({"Comissão Escritório": object})
+    como_object.loc[como_object.index[:3], "Comissão Escritório"] = None
+    assert como_object["Comissão Escritório"].dtype == object
+
+    obtido = cb.recalcular_ramos(cb.calcular_ramos(**dados, regras=regras), fonte, como_object, tim_rep, regras)
+    esperado = cb.recalcular_ramos(cb.calcular_ramos(**dados, regras=regras), fonte, df, tim_rep, regras)
+    pd.testing.assert_frame_equal(obtido[fonte]["group"], esperado[fonte]["group"], check_exact=True)
+    assert obtido[fonte]["lider"] == esperado[fonte]["lider"]
+    colunas = [c for c in esperado[fonte]["juntar"] if c != "Comissão Escritório"]
+    pd.testing.assert_frame_equal(obtido[fonte]["juntar"][colunas], esperado[fonte]["juntar"][colunas], check_exact=True)
+
+
+def _ramo_pj1(dados, regras):
+    return cb._ramo_pj1(dados["pj1"].copy(), cb.preparar_repasses(dados["tim_rep"]), regras)
+
+
+def test_pj1_com_categorical_igual_ao_texto(mes, monkeypatch):
+    # textos vazios no meio: NaN vira código -1 do Categorical
+    dados, regras, _ = mes
+    pj1 = dados["pj1"].copy()
+    for i, col in enumerate(cb._TEXTOS_PJ1):
+        pj1.loc[pj1.index[i::500], col] = np.nan
+    dados = {**dados, "pj1": pj1}
+
+    compacto = _ramo_pj1(dados, regras)
+    monkeypatch.setattr(cb, "_dicionarios_pj1", lambda distintos: {c: None for c in cb._TEXTOS_PJ1})
+    texto = _ramo_pj1(dados, regras)
+
+    for chave in ("group", "juntar"):
+        pd.testing.assert_frame_equal(compacto[chave], texto[chave], check_exact=True)
+        assert not any(isinstance(t, pd.CategoricalDtype) for t in compacto[chave].dtypes)
+    assert compacto["lider"] == texto["lider"]
+    for a, b in zip(compacto["juntar_extra"], texto["juntar_extra"]):
+        assert (a["linhas"] == b["linhas"]).all()
+        pd.testing.assert_extension_array_equal(a["valor"], b["valor"])
+
+
+def test_lan_man_em_centavos(mes, monkeypatch):
+    dados, regras, _ = mes
+    lan_man = dados["lan_man"].copy()
+    lan_man.loc[lan_man.index[:2], "Valor"] = [0.1, 0.2]
+    lan_man.loc[lan_man.index[:2], "Código"] = lan_man["Código"].iloc[2]
+    lan_man.loc[lan_man.index[3], "Valor"] = np.nan
+    assert cb._centavos(lan_man["Valor"])[1] == 100
+    assert cb._centavos(pd.Series([0.1, 0.005]))[1] == 1
+
+    centavos = cb._ramo_lan_man(lan_man.copy(), regras)
+    monkeypatch.setattr(cb, "_centavos", lambda valores: (valores, 1))
+    em_float = cb._ramo_lan_man(lan_man.copy(), regras)
+
+    pd.testing.assert_frame_equal(centavos["juntar"], em_float["juntar"], check_exact=True)
+    pd.testing.assert_frame_equal(centavos["group"], em_float["group"], check_exact=False, rtol=0, atol=1e-9)
+    # 0.1 + 0.2 somados em centavos dão 0.3 exatos
+    esperado = round(lan_man.loc[lan_man["Código"] == lan_man["Código"].iloc[2], "Valor"].sum(), 2)
+    soma = centavos["group"].set_index("Código Assessor")["Valor Lançamentos Manuais"][lan_man["Código"].iloc[2]]
+    assert soma == esperado
+
+
+def test_df_juntar_com_texto_object(mes):
+    # PJ1 lido sem dtypes: os textos chegam object e o df_juntar mantém o dtype do concat
+    dados, regras, _ = mes
+    pj1 = dados["pj1"].astype({c: object for c in cb._TEXTOS_PJ1})
+    ramos = cb.calcular_ramos(**{**dados, "pj1": pj1}, regras=regras)
+    concat = pd.concat([ramos[f]["juntar"] for f in cb.FONTES_RAMOS], ignore_index=True)
+    _, df_juntar = cb.consolidar_ramos(ramos, dados["tim_rep"], regras)
+    for col in ("Categoria", "Produto"):
+        assert df_juntar[col].dtype == concat[col].dtype == object